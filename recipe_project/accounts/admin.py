@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from .models import CustomUser
+from .models import CustomUser, OutgoingEmail
 
 
 class CustomUserAdmin(UserAdmin):
@@ -36,4 +37,19 @@ class CustomUserAdmin(UserAdmin):
             return False
         return super().has_delete_permission(request, obj)
 
-admin.site.register(CustomUser, CustomUserAdmin)
\ No newline at end of file
+admin.site.register(CustomUser, CustomUserAdmin)
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'to')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    actions = ['requeue']
+
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f"{updated} писем возвращено в очередь.")
+
+    requeue.short_description = "Повторить отправку"
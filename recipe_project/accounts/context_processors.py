@@ -0,0 +1,8 @@
+from functools import partial
+
+from .roles import is_moderator
+
+
+def roles(request):
+    # Вычисляется лениво: только если шаблон действительно обращается к переменной.
+    return {'is_moderator': partial(is_moderator, request.user)}
@@ -1,6 +1,8 @@
 from django import forms
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
+from django.template import loader
 from .models import CustomUser
+from .outbox import enqueue_email
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -46,3 +48,16 @@ class ProfileEditForm(forms.ModelForm):
         if commit:
             user.save()
         return user
+
+
+class OutboxPasswordResetForm(PasswordResetForm):
+    """Письмо сброса пароля ставится в очередь вместо отправки в запросе."""
+
+    def send_mail(self, subject_template_name, email_template_name, context, from_email, to_email,
+                  html_email_template_name=None):
+        subject = ''.join(loader.render_to_string(subject_template_name, context).splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_message = None
+        if html_email_template_name is not None:
+            html_message = loader.render_to_string(html_email_template_name, context)
+        enqueue_email(subject, body, [to_email], html_message=html_message, from_email=from_email)
@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди OutgoingEmail с повторами и экспоненциальной задержкой.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=5.0, help='Пауза между опросами пустой очереди, сек.')
+        parser.add_argument('--once', action='store_true', help='Разобрать очередь один раз и завершиться.')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = drain_outbox(batch_size=options['batch_size'])
+            if processed:
+                self.stdout.write(f'Обработано писем: {processed}')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
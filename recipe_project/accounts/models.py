@@ -1,10 +1,46 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class CustomUser(AbstractUser):
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    avatar_variants = models.JSONField(default=list, blank=True, editable=False)
     unconfirmed_email = models.EmailField(max_length=254, blank=True, null=True)
 
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+
+class OutgoingEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Не доставлено'),
+    ]
+
+    subject = models.CharField(max_length=255, verbose_name="Тема")
+    body = models.TextField(verbose_name="Текст")
+    html_body = models.TextField(blank=True, verbose_name="HTML")
+    from_email = models.CharField(max_length=254, verbose_name="Отправитель")
+    to = models.JSONField(default=list, verbose_name="Получатели")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Отправлено")
+
+    class Meta:
+        verbose_name = "Исходящее письмо"
+        verbose_name_plural = "Исходящие письма"
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at', 'id'],
+                condition=models.Q(status='pending'),
+                name='outgoing_email_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.to)}'
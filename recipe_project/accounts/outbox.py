@@ -0,0 +1,109 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(subject, body, recipient_list, html_message=None, from_email=None):
+    """Кладёт письмо в очередь; отправит его воркер ``manage.py send_outbox``.
+
+    Запись создаётся в текущей транзакции, поэтому письмо уходит только вместе с изменением пользователя.
+    """
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_message or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(
+        settings.OUTBOX_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+        settings.OUTBOX_RETRY_MAX_DELAY,
+    ))
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject, email.body, email.from_email, email.to, connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def mark_failed(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)[:2000]
+    if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        email.status = 'failed'
+        logger.error('Письмо #%s не доставлено после %s попыток: %s', email.pk, email.attempts, error)
+    else:
+        email.next_attempt_at = now + retry_delay(email.attempts)
+
+
+def deliver_batch(connection, batch_size):
+    """Отправляет одну пачку писем через уже открытое SMTP-соединение.
+
+    Строки блокируются ``FOR UPDATE SKIP LOCKED``, поэтому несколько воркеров не берут одно письмо.
+    Возвращает число обработанных писем.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        try:
+            connection.open()
+        except Exception as error:
+            for email in batch:
+                mark_failed(email, error, now)
+        else:
+            for email in batch:
+                try:
+                    build_message(email, connection).send()
+                except Exception as error:
+                    mark_failed(email, error, now)
+                    # После ошибки SMTP соединение может быть в неопределённом состоянии.
+                    connection.close()
+                else:
+                    email.status = 'sent'
+                    email.attempts += 1
+                    email.sent_at = timezone.now()
+                    email.last_error = ''
+
+        OutgoingEmail.objects.bulk_update(
+            batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'],
+        )
+    return len(batch)
+
+
+def drain_outbox(batch_size=None, max_batches=None):
+    """Отправляет письма пачками через одно переиспользуемое соединение, пока очередь не опустеет."""
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    connection = get_connection(fail_silently=False)
+    processed = batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            count = deliver_batch(connection, batch_size)
+            if not count:
+                break
+            processed += count
+            batches += 1
+    finally:
+        connection.close()
+    return processed
@@ -0,0 +1,58 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from recipe_project.db_router import use_primary
+
+MODERATORS_GROUP = 'Moderators'
+
+
+def roles_cache_key(user_id):
+    return f'accounts:roles:{user_id}'
+
+
+def get_roles(user):
+    """Возвращает множество названий групп пользователя.
+
+    Результат запоминается на объекте пользователя (то есть на время запроса) и в кэше между
+    запросами; кэш сбрасывается сигналами при изменении состава групп. Запись в кэше живёт без
+    срока, поэтому при промахе группы читаются с основной базы, а не с отстающей реплики.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_cached_roles', None)
+    if roles is None:
+        key = roles_cache_key(user.pk)
+        roles = cache.get(key)
+        if roles is None:
+            with use_primary():
+                roles = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, roles, None)
+        user._cached_roles = roles
+    return roles
+
+
+async def aget_roles(user):
+    """Асинхронный вариант ``get_roles`` с тем же кэшем."""
+    if not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_cached_roles', None)
+    if roles is None:
+        key = roles_cache_key(user.pk)
+        roles = await cache.aget(key)
+        if roles is None:
+            with use_primary():
+                roles = frozenset([name async for name in user.groups.values_list('name', flat=True)])
+            await cache.aset(key, roles, None)
+        user._cached_roles = roles
+    return roles
+
+
+def is_moderator(user):
+    return user.is_authenticated and (user.is_superuser or MODERATORS_GROUP in get_roles(user))
+
+
+def invalidate_roles(user_ids):
+    """Сбрасывает кэш ролей после фиксации транзакции, чтобы параллельный запрос не закэшировал старые."""
+    keys = [roles_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,28 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import CustomUser
+from .roles import invalidate_roles
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def invalidate_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # После очистки состав группы уже не узнать, поэтому запоминаем его заранее.
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_roles([instance.pk])
+    elif action == 'post_clear':
+        invalidate_roles(instance.__dict__.pop('_cleared_user_ids', []))
+    else:
+        invalidate_roles(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_roles_on_group_change(sender, instance, **kwargs):
+    invalidate_roles(instance.user_set.values_list('pk', flat=True))
@@ -1,3 +1,199 @@
-from django.test import TestCase
+import socketserver
+import threading
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import CustomUser, OutgoingEmail
+from .outbox import drain_outbox, enqueue_email
+from .roles import MODERATORS_GROUP, get_roles
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-сервер: принимает письма и складывает их в ``server.messages``."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 localhost ready')
+        data, envelope = None, {'to': []}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if data is not None:
+                if line in (b'.\r\n', b'.\n'):
+                    self.server.messages.append({**envelope, 'data': b''.join(data)})
+                    data, envelope = None, {'to': []}
+                    self.reply('250 OK')
+                else:
+                    data.append(line)
+                continue
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif verb == 'RCPT' and self.server.reject_recipients:
+                self.reply('550 No such user')
+            elif verb in ('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP'):
+                if verb == 'RCPT':
+                    envelope['to'].append(command.split(':', 1)[1].strip('<> '))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                data = []
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.reject_recipients = False
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.smtp = LocalSMTPServer()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        smtp_settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+        )
+        smtp_settings.enable()
+        self.addCleanup(smtp_settings.disable)
+
+    def test_register_enqueues_activation_email(self):
+        response = self.client.post(reverse('register'), {
+            'username': 'cook',
+            'email': 'cook@example.com',
+            'password1': 'a-Strong-pass-123',
+            'password2': 'a-Strong-pass-123',
+        })
+        self.assertRedirects(response, reverse('login'))
+        self.assertFalse(CustomUser.objects.get(username='cook').is_active)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.to, ['cook@example.com'])
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(self.smtp.messages, [])
+
+    def test_drain_sends_batches_over_one_connection(self):
+        for i in range(5):
+            enqueue_email(f'Письмо {i}', 'Текст', [f'user{i}@example.com'], html_message='<p>Текст</p>')
+
+        self.assertEqual(drain_outbox(batch_size=2), 5)
+
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(len(self.smtp.messages), 5)
+        self.assertEqual(OutgoingEmail.objects.filter(status='sent').count(), 5)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_BASE_DELAY=60)
+    def test_failed_delivery_backs_off_and_dead_letters(self):
+        email = enqueue_email('Письмо', 'Текст', ['nobody@example.com'])
+        self.smtp.reject_recipients = True
+
+        before = timezone.now()
+        drain_outbox()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertGreaterEqual(email.next_attempt_at, before + timedelta(seconds=60))
+        self.assertIn('550', email.last_error)
+
+        # Письмо ещё не созрело для повтора.
+        self.assertEqual(drain_outbox(), 0)
+
+        OutgoingEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        with self.assertLogs('accounts.outbox', 'ERROR'):
+            drain_outbox()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 2))
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class RolesCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('user', 'user@example.com', 'pass')
+        cls.group = Group.objects.create(name=MODERATORS_GROUP)
+
+    def setUp(self):
+        cache.clear()
+
+    def roles(self):
+        return get_roles(CustomUser.objects.get(pk=self.user.pk))
+
+    def test_roles_are_cached_across_requests(self):
+        self.assertEqual(self.roles(), frozenset())
+        user = CustomUser.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_roles(user), frozenset())
+            get_roles(user)
+
+    def test_membership_changes_invalidate_after_commit(self):
+        self.roles()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.groups.add(self.group)
+            self.assertEqual(self.roles(), frozenset())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.roles(), {MODERATORS_GROUP})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.user_set.clear()
+        self.assertEqual(self.roles(), frozenset())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.user_set.add(self.user)
+        self.assertEqual(self.roles(), {MODERATORS_GROUP})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.clear()
+        self.assertEqual(self.roles(), frozenset())
+
+    def test_rolled_back_change_keeps_cache(self):
+        self.roles()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.user.groups.add(self.group)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.roles(), frozenset())
+
+    def test_group_rename_and_delete(self):
+        self.user.groups.add(self.group)
+        self.roles()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.name = 'Editors'
+            self.group.save()
+        self.assertEqual(self.roles(), {'Editors'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.delete()
+        self.assertEqual(self.roles(), frozenset())
@@ -4,14 +4,14 @@ from django.contrib.auth.decorators import login_required
 from django.urls import reverse_lazy
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
+from django.db import transaction
 from django.template.loader import render_to_string
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.tokens import default_token_generator
 
-from .forms import CustomUserCreationForm, ProfileEditForm
+from .forms import CustomUserCreationForm, ProfileEditForm, OutboxPasswordResetForm
 from .models import CustomUser
+from .outbox import enqueue_email
 
 User = get_user_model()
 
@@ -27,21 +27,19 @@ def register(request):
         if form.is_valid():
             user = form.save(commit=False)
             user.is_active = False
-            user.save()
 
             current_site = request.get_host()
             subject = 'Активация аккаунта на RecipeBook'
 
-            uid = urlsafe_base64_encode(force_bytes(user.pk))
-            token = default_token_generator.make_token(user)
+            with transaction.atomic():
+                user.save()
+                uid = urlsafe_base64_encode(force_bytes(user.pk))
+                token = default_token_generator.make_token(user)
 
-            context = {'user': user, 'domain': current_site, 'uid': uid, 'token': token}
-            email_message = render_to_string('accounts/account_activation_email.html', context)
+                context = {'user': user, 'domain': current_site, 'uid': uid, 'token': token}
+                email_message = render_to_string('accounts/account_activation_email.html', context)
 
-            send_mail(
-                subject, email_message, settings.DEFAULT_FROM_EMAIL, [user.email],
-                html_message=email_message, fail_silently=False,
-            )
+                enqueue_email(subject, email_message, [user.email], html_message=email_message)
 
             messages.info(request, 'Аккаунт успешно создан! Проверьте Email для активации.')
             return redirect('login')
@@ -92,8 +90,7 @@ def resend_activation_email(request):
     context = {'user': user, 'domain': current_site, 'uid': uid, 'token': token}
     email_message = render_to_string('accounts/account_activation_email.html', context)
 
-    send_mail(subject, email_message, settings.DEFAULT_FROM_EMAIL, [user.email],
-              html_message=email_message, fail_silently=False)
+    enqueue_email(subject, email_message, [user.email], html_message=email_message)
 
     messages.success(request, f'Письмо для активации отправлено повторно на {user.email}.')
     return redirect('recipe_list')
@@ -118,20 +115,20 @@ def profile(request):
             user = form.save(commit=False)
 
             if user.unconfirmed_email:
-                user.save()
-
                 new_email = user.unconfirmed_email
                 current_site = request.get_host()
                 subject = 'Подтверждение смены Email на RecipeBook'
 
-                uid = urlsafe_base64_encode(force_bytes(user.pk))
-                token = default_token_generator.make_token(user)
+                with transaction.atomic():
+                    user.save()
+
+                    uid = urlsafe_base64_encode(force_bytes(user.pk))
+                    token = default_token_generator.make_token(user)
 
-                context = {'user': user, 'domain': current_site, 'uid': uid, 'token': token, 'new_email': new_email}
-                email_message = render_to_string('accounts/email_change_email.html', context)
+                    context = {'user': user, 'domain': current_site, 'uid': uid, 'token': token, 'new_email': new_email}
+                    email_message = render_to_string('accounts/email_change_email.html', context)
 
-                send_mail(subject, email_message, settings.DEFAULT_FROM_EMAIL, [new_email],
-                          html_message=email_message, fail_silently=False)
+                    enqueue_email(subject, email_message, [new_email], html_message=email_message)
 
                 messages.info(request, f'Письмо отправлено на {new_email} для подтверждения смены Email.')
                 return redirect('profile')
@@ -187,8 +184,7 @@ def resend_email_change_email(request):
     context = {'user': user, 'domain': current_site, 'uid': uid, 'token': token, 'new_email': new_email}
 
     email_message = render_to_string('accounts/email_change_email.html', context)
-    send_mail(subject, email_message, settings.DEFAULT_FROM_EMAIL, [new_email],
-              html_message=email_message, fail_silently=False)
+    enqueue_email(subject, email_message, [new_email], html_message=email_message)
 
     messages.success(request, f'Письмо отправлено повторно на {new_email}.')
     return redirect('profile')
@@ -220,6 +216,7 @@ class CustomPasswordChangeView(auth_views.PasswordChangeView):
 
 class CustomPasswordResetView(auth_views.PasswordResetView):
     template_name = 'accounts/password_reset_form.html'
+    form_class = OutboxPasswordResetForm
     email_template_name = 'accounts/password_reset_email.html'
     subject_template_name = 'accounts/password_reset_subject.txt'
     success_url = reverse_lazy('password_reset_done')
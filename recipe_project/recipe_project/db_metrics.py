@@ -0,0 +1,70 @@
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import JsonResponse
+
+_lock = threading.Lock()
+_checkouts = {}
+
+
+class CheckoutStats:
+    def __init__(self, window=1000):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.slowest = max(self.slowest, seconds)
+        self.recent.append(seconds)
+
+    def as_dict(self):
+        recent = sorted(self.recent)
+        return {
+            'checkouts': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0,
+            'p95_ms': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 3) if recent else 0,
+            'max_ms': round(self.slowest * 1000, 3),
+        }
+
+
+def record_checkout(alias, seconds):
+    """Запоминает время получения соединения: установка нового или выдача из пула с ожиданием."""
+    with _lock:
+        _checkouts.setdefault(alias, CheckoutStats()).add(seconds)
+
+
+def connection_metrics():
+    """Метрики соединений этого процесса по каждой базе: задержка выдачи и состояние пула."""
+    metrics = {}
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        with _lock:
+            stats = _checkouts.get(alias)
+            checkout = stats.as_dict() if stats else CheckoutStats().as_dict()
+        pool = getattr(connections[alias], 'pool', None)
+        metrics[alias] = {
+            'mode': 'pool' if pool is not None else 'persistent' if settings_dict['CONN_MAX_AGE'] else 'per-request',
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'server_side_cursors': not settings_dict.get('DISABLE_SERVER_SIDE_CURSORS', False),
+            **checkout,
+        }
+        if pool is not None:
+            # pool_size, pool_available, requests_waiting, requests_wait_ms, connections_ms и т. д.
+            metrics[alias]['pool'] = pool.get_stats()
+    return metrics
+
+
+@staff_member_required
+def db_metrics(request):
+    return JsonResponse({
+        'process': os.getpid(),
+        'replicas': settings.DATABASE_REPLICAS,
+        'databases': connection_metrics(),
+    })
@@ -0,0 +1,80 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class RoutingState:
+    """Состояние маршрутизации в рамках одного HTTP-запроса."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+        # Число открытых блоков ``use_primary``: они могут пересекаться в параллельных задачах запроса.
+        self.primary_reads = 0
+        # Реплика выбирается один раз, чтобы запросы страницы видели одно и то же состояние данных.
+        self.replica = None
+
+
+_routing_state = ContextVar('db_routing_state', default=None)
+
+
+@contextmanager
+def routing_scope(pinned=False):
+    """Включает чтение с реплик в пределах блока; после первой записи чтение идёт с основной базы."""
+    state = RoutingState(pinned)
+    token = _routing_state.set(state)
+    try:
+        yield state
+    finally:
+        _routing_state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Принудительно читает с основной базы, например при заполнении кэша без срока жизни."""
+    state = _routing_state.get()
+    if state is None:
+        yield
+        return
+    state.primary_reads += 1
+    try:
+        yield
+    finally:
+        state.primary_reads -= 1
+
+
+class PrimaryReplicaRouter:
+    """Запись — в основную базу, чтение — с реплик из ``DATABASE_REPLICAS``.
+
+    С реплик читаются только запросы внутри ``routing_scope`` (его открывает
+    ``PrimaryPinningMiddleware``), вне транзакции, вне ``use_primary`` и до первой записи; все они
+    идут на одну реплику. Команды и фоновые потоки всегда работают с основной базой.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or state is None or state.pinned or state.primary_reads:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = random.choice(replicas)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
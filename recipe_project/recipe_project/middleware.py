@@ -0,0 +1,193 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+import sqlparse
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .db_router import routing_scope
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))+\s*\)')
+_log_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def normalize_sql(sql):
+    """Приводит запрос к шаблону: литералы заменяются на ``?``, списки IN сворачиваются."""
+    parts = []
+    for statement in sqlparse.parse(sql):
+        for token in statement.flatten():
+            if token.ttype in sqlparse.tokens.Literal and token.ttype not in sqlparse.tokens.String.Symbol:
+                parts.append('?')
+            elif token.is_whitespace:
+                parts.append(' ')
+            else:
+                parts.append(token.value)
+    normalized = re.sub(r'\s+', ' ', ''.join(parts)).strip()
+    return IN_LIST_RE.sub('(...)', normalized)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, repr(params), time.perf_counter() - start))
+
+    def summary(self, top):
+        exact = Counter((sql, params) for sql, params, _ in self.queries)
+        patterns = Counter(normalize_sql(sql) for sql, _, _ in self.queries)
+        slowest = sorted(self.queries, key=lambda query: query[2], reverse=True)[:top]
+        return {
+            'queries': len(self.queries),
+            'db_time_ms': round(sum(duration for _, _, duration in self.queries) * 1000, 3),
+            'duplicates': sum(count - 1 for count in exact.values()),
+            'repeated': [
+                {'sql': sql, 'count': count} for sql, count in patterns.most_common(top) if count > 1
+            ],
+            'slowest': [
+                {'sql': normalize_sql(sql), 'ms': round(duration * 1000, 3)} for sql, _, duration in slowest
+            ],
+        }
+
+
+class QueryInstrumentationMiddleware:
+    """Считает SQL-запросы каждого запроса и сверяет их с бюджетом ``QUERY_BUDGETS``.
+
+    Подключается только при ``QUERY_INSTRUMENTATION=True``. Сводка пишется строкой JSON в
+    ``QUERY_INSTRUMENTATION_LOG``; ``manage.py query_report`` агрегирует её по представлениям.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with self.recording(recorder):
+            response = self.get_response(request)
+        self.finish(request, response, recorder, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        # Соединения у каждого потока свои, а ORM асинхронных представлений работает в потоке
+        # sync_to_async(thread_sensitive=True): обёртку ставим и снимаем именно там.
+        recording = await sync_to_async(self.recording)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.close)()
+        elapsed = time.perf_counter() - start
+        await sync_to_async(self.finish, thread_sensitive=False)(request, response, recorder, elapsed)
+        return response
+
+    def recording(self, recorder):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        return stack
+
+    def finish(self, request, response, recorder, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else None
+        record = {
+            'time': timezone.now().isoformat(),
+            'view': view,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'total_ms': round(elapsed * 1000, 3),
+            **recorder.summary(settings.QUERY_INSTRUMENTATION_TOP),
+        }
+        self.write(record)
+        self.check_budget(record)
+
+    def write(self, record):
+        path = settings.QUERY_INSTRUMENTATION_LOG
+        if not path:
+            return
+        line = json.dumps(record, ensure_ascii=False)
+        with _log_lock, open(path, 'a', encoding='utf-8') as log:
+            log.write(line + '\n')
+
+    def check_budget(self, record):
+        budget = settings.QUERY_BUDGETS.get(record['view'])
+        if budget is None or record['queries'] <= budget:
+            return
+        message = (
+            f"{record['view']} ({record['method']} {record['path']}): "
+            f"{record['queries']} запросов при бюджете {budget}, повторов {record['duplicates']}"
+        )
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class PrimaryPinningMiddleware:
+    """Открывает маршрутизацию чтения на реплики и закрепляет сессию за основной базой после записи.
+
+    Если запрос что-то записал (комментарий, избранное, правка рецепта, вход), браузер получает
+    cookie, и ещё ``REPLICA_PIN_SECONDS`` все его чтения идут с основной базы: пользователь видит
+    свои изменения, даже пока реплика отстаёт.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing_scope(pinned=self.is_pinned(request)) as state:
+            response = self.get_response(request)
+        return self.pin(response, state)
+
+    async def __acall__(self, request):
+        with routing_scope(pinned=self.is_pinned(request)) as state:
+            response = await self.get_response(request)
+        return self.pin(response, state)
+
+    def is_pinned(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        return pinned_until > time.time()
+
+    def pin(self, response, state):
+        if state.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,16 @@
+import time
+
+from django.db.backends.postgresql import base
+
+from recipe_project.db_metrics import record_checkout
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Стандартный бэкенд PostgreSQL, который замеряет время получения соединения."""
+
+    def get_new_connection(self, conn_params):
+        start = time.perf_counter()
+        try:
+            return super().get_new_connection(conn_params)
+        finally:
+            record_checkout(self.alias, time.perf_counter() - start)
@@ -14,12 +14,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'accounts',
     'recipes',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'recipe_project.middleware.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -28,6 +30,24 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+QUERY_INSTRUMENTATION = config('QUERY_INSTRUMENTATION', default=False, cast=bool)
+QUERY_INSTRUMENTATION_LOG = config('QUERY_INSTRUMENTATION_LOG', default=str(BASE_DIR / 'query_log.jsonl'))
+QUERY_INSTRUMENTATION_TOP = config('QUERY_INSTRUMENTATION_TOP', default=5, cast=int)
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=False, cast=bool)
+QUERY_BUDGETS = {
+    'home': 3,
+    'recipe_list': 4,
+    'recipe_detail': 9,
+    'favorite_list': 6,
+    'recipes_by_ingredients': 2,
+    'recipe_suggest': 2,
+    'moderation_queue': 6,
+    'profile': 4,
+}
+
+if QUERY_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, 'recipe_project.middleware.QueryInstrumentationMiddleware')
+
 ROOT_URLCONF = 'recipe_project.urls'
 
 TEMPLATES = [
@@ -40,6 +60,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'accounts.context_processors.roles',
             ],
         },
     },
@@ -47,14 +68,60 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'recipe_project.wsgi.application'
 
+# DB_POOL включает пул соединений Django (psycopg-pool ставится с psycopg[pool]), иначе соединения
+# переиспользуются в пределах DB_CONN_MAX_AGE секунд. DB_BOUNCER_MODE — для PgBouncer в режиме
+# transaction pooling: без серверных курсоров и подготовленных выражений.
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+DB_BOUNCER_MODE = config('DB_BOUNCER_MODE', default=False, cast=bool)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'recipe_project.postgres',
         'NAME': config('DB_NAME'),
         'USER': config('DB_USER'),
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': DB_BOUNCER_MODE,
+        'OPTIONS': {},
+    }
+}
+
+if DB_POOL:
+    # Соединение проверяется при выдаче из пула, так как включён CONN_HEALTH_CHECKS.
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+        'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+        'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=1800, cast=float),
+    }
+    if DB_BOUNCER_MODE:
+        DATABASES['default']['OPTIONS']['prepare_threshold'] = None
+
+# Реплики только для чтения: DB_REPLICA_HOSTS=host1,host2:5433 (остальные параметры как у default).
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv())):
+    host, _, port = replica_host.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'OPTIONS': {**DATABASES['default']['OPTIONS']},
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['recipe_project.db_router.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+REPLICA_PIN_COOKIE = 'primary_pin'
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
     }
 }
 
@@ -79,13 +146,45 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+IMAGE_VARIANT_WIDTHS = config('IMAGE_VARIANT_WIDTHS', default='160,480,1200', cast=Csv(int))
+IMAGE_VARIANTS_ASYNC = config('IMAGE_VARIANTS_ASYNC', default=True, cast=bool)
+IMAGE_VARIANT_WORKERS = config('IMAGE_VARIANT_WORKERS', default=2, cast=int)
+
+RECIPE_FULLTEXT_SEARCH = config('RECIPE_FULLTEXT_SEARCH', default=True, cast=bool)
+RECIPE_PAGINATION = config('RECIPE_PAGINATION', default='offset')
+# Асинхронные главная, список и страница рецепта — для запуска через ASGI (recipe_project.asgi).
+# Под ASGI постоянные соединения не переиспользуются: задайте DB_CONN_MAX_AGE=0 или DB_POOL=True.
+RECIPE_ASYNC_VIEWS = config('RECIPE_ASYNC_VIEWS', default=False, cast=bool)
+# Популярность: веса событий затухают вдвое за TRENDING_HALF_LIFE_HOURS часов.
+TRENDING_HALF_LIFE_HOURS = config('TRENDING_HALF_LIFE_HOURS', default=24, cast=float)
+TRENDING_WEIGHTS = {
+    'favorite': config('TRENDING_FAVORITE_WEIGHT', default=3.0, cast=float),
+    'comment': config('TRENDING_COMMENT_WEIGHT', default=2.0, cast=float),
+    'view': config('TRENDING_VIEW_WEIGHT', default=0.1, cast=float),
+}
+TRENDING_MIN_SCORE = 0.01
+SIMILAR_RECIPES_COUNT = config('SIMILAR_RECIPES_COUNT', default=6, cast=int)
+# Подсказки поиска: ответы для горячих префиксов хранятся в LRU-кэше процесса.
+SUGGEST_MIN_LENGTH = 2
+SUGGEST_MAX_LENGTH = 50
+SUGGEST_LIMIT = config('SUGGEST_LIMIT', default=8, cast=int)
+SUGGEST_CACHE_SIZE = config('SUGGEST_CACHE_SIZE', default=1024, cast=int)
+SUGGEST_CACHE_SECONDS = config('SUGGEST_CACHE_SECONDS', default=60, cast=int)
+MODERATION_BATCH_SIZE = config('MODERATION_BATCH_SIZE', default=20, cast=int)
+MODERATION_LEASE_MINUTES = config('MODERATION_LEASE_MINUTES', default=15, cast=int)
+
 LOGIN_REDIRECT_URL = 'recipe_list'
 LOGOUT_REDIRECT_URL = 'home'
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
-EMAIL_HOST_USER = config('EMAIL_HOST_USER')
-EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
-DEFAULT_FROM_EMAIL = config('EMAIL_HOST_USER')
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default=EMAIL_HOST_USER or 'webmaster@localhost')
+
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=50, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+OUTBOX_RETRY_BASE_DELAY = config('OUTBOX_RETRY_BASE_DELAY', default=30, cast=int)
+OUTBOX_RETRY_MAX_DELAY = config('OUTBOX_RETRY_MAX_DELAY', default=6 * 60 * 60, cast=int)
@@ -3,8 +3,11 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .db_metrics import db_metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/db/', db_metrics, name='db_metrics'),
     path('accounts/', include('accounts.urls')),
     path('', include('recipes.urls')),
 ]
@@ -1,6 +1,11 @@
 from django.contrib import admin, messages
+from django.db import transaction
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Recipe, Category, Comment
+from accounts.roles import is_moderator
+from .models import Recipe, Category, Comment, Ingredient
+from .cache import invalidate_home_cache, bump_recipe_versions
+from .facets import recipes_changed
 
 
 @admin.register(Recipe)
@@ -34,36 +39,62 @@ class RecipeAdmin(admin.ModelAdmin):
 
     status_colored.short_description = 'Статус'
 
+    def moderate(self, request, queryset, status, comment):
+        """Меняет статус выбранных рецептов, которые ждут модерации.
+
+        Строки блокируются до конца транзакции, поэтому счётчики категорий сдвигаются ровно для тех
+        рецептов, статус которых изменён, даже если параллельно их модерирует кто-то ещё.
+        """
+        now = timezone.now()
+        changes = {
+            'status': status,
+            'moderator': request.user,
+            'moderator_comment': comment,
+            'moderated_at': now,
+            'updated_at': now,
+            'claimed_by': None,
+            'claim_expires_at': None,
+        }
+        if status == 'approved':
+            changes['favorites_changed_at'] = now
+        with transaction.atomic():
+            recipe_ids = list(
+                Recipe.objects.select_for_update()
+                .filter(pk__in=queryset.values('pk'), status='pending')
+                .values_list('pk', flat=True)
+            )
+            updated = Recipe.objects.filter(pk__in=recipe_ids).update(**changes)
+            if updated:
+                if status == 'approved':
+                    recipes_changed(recipe_ids)
+                invalidate_home_cache()
+                bump_recipe_versions(recipe_ids)
+        return updated
+
     def approve_recipes(self, request, queryset):
-        updated = queryset.filter(status='pending').update(
-            status='approved',
-            moderator=request.user,
-            moderator_comment='Одобрено модератором через массовое действие.'
-        )
+        updated = self.moderate(request, queryset, 'approved', 'Одобрено модератором через массовое действие.')
         self.message_user(request, f"{updated} рецептов успешно одобрено.", messages.SUCCESS)
 
     approve_recipes.short_description = "Одобрить выбранные рецепты"
 
     def reject_recipes(self, request, queryset):
-        updated = queryset.filter(status='pending').update(
-            status='rejected',
-            moderator=request.user,
-            moderator_comment='Отклонено модератором через массовое действие.'
-        )
+        updated = self.moderate(request, queryset, 'rejected', 'Отклонено модератором через массовое действие.')
         self.message_user(request, f"{updated} рецептов успешно отклонено.", messages.WARNING)
 
     reject_recipes.short_description = "Отклонить выбранные рецепты"
 
     def get_readonly_fields(self, request, obj=None):
-        is_moderator = request.user.is_superuser or request.user.groups.filter(name='Moderators').exists()
-        if not is_moderator:
+        if not is_moderator(request.user):
             return self.readonly_fields + ('status', 'moderator_comment',)
         return self.readonly_fields
 
     def save_model(self, request, obj, form, change):
-        is_moderator = request.user.is_superuser or request.user.groups.filter(name='Moderators').exists()
-        if is_moderator and not obj.moderator:
+        if is_moderator(request.user) and not obj.moderator:
             obj.moderator = request.user
+        if change and 'status' in form.changed_data and obj.status in ('approved', 'rejected'):
+            obj.moderated_at = timezone.now()
+            obj.claimed_by = None
+            obj.claim_expires_at = None
         super().save_model(request, obj, form, change)
 
 
@@ -73,6 +104,12 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 
+@admin.register(Ingredient)
+class IngredientAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+
+
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe', 'short_text', 'created_at')
@@ -0,0 +1,174 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Count
+from django.test import AsyncClient, Client
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from accounts.roles import MODERATORS_GROUP
+from recipe_project.middleware import QueryRecorder
+from .models import Comment, Recipe
+
+ROLES = ('anonymous', 'user', 'moderator')
+
+# Эти адреса меняют данные или отправляют письма даже при GET (или завершают сессию) —
+# в замеры они не попадают.
+SKIPPED_URLS = {'favorite_toggle', 'logout', 'resend_activation_email', 'resend_email_change_email'}
+
+
+def named_urls(patterns=None, prefix=''):
+    """Все именованные маршруты сайта (без пространств имён вроде admin) и имена их параметров."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for entry in patterns:
+        if isinstance(entry, URLResolver):
+            if entry.namespace:
+                continue
+            yield from named_urls(entry.url_patterns, prefix)
+        elif isinstance(entry, URLPattern) and entry.name:
+            yield entry.name, sorted(getattr(entry.pattern, 'converters', {}))
+
+
+def build_url(name, params, samples):
+    """Подставляет в маршрут значения из ``samples``; ``None``, если подходящих данных нет."""
+    kwargs = {}
+    for param in params:
+        value = samples.get((name, param), samples.get(param))
+        if value is None:
+            return None
+        kwargs[param] = value
+    return reverse(name, kwargs=kwargs)
+
+
+def resolve_users(username=None, moderator_name=None):
+    """Пользователь (по умолчанию — самый активный автор) и модератор для обхода сайта."""
+    User = get_user_model()
+    if username:
+        user = User.objects.filter(username=username).first()
+    else:
+        author = (
+            Recipe.objects.filter(status='approved', author__is_active=True)
+            .values('author').order_by().annotate(total=Count('id')).order_by('-total')
+            .values_list('author', flat=True).first()
+        )
+        user = User.objects.filter(pk=author).first()
+    if moderator_name:
+        moderator = User.objects.filter(username=moderator_name).first()
+    else:
+        moderator = User.objects.filter(groups__name=MODERATORS_GROUP, is_active=True).order_by('pk').first()
+    return {'user': user, 'moderator': moderator}
+
+
+def sample_kwargs(user):
+    """Значения параметров маршрутов: рецепт и комментарий пользователя, если они есть."""
+    recipes = Recipe.objects.filter(status='approved').order_by('-comment_count', 'pk')
+    recipe = (recipes.filter(author=user).first() if user else None) or recipes.first()
+    comments = Comment.objects.order_by('pk')
+    comment = (comments.filter(user=user).first() if user else None) or comments.first()
+    samples = {}
+    if recipe:
+        samples.update({'pk': recipe.pk, 'recipe_id': recipe.pk, 'category': recipe.category_id})
+    if comment:
+        samples[('comment_delete', 'pk')] = comment.pk
+    return samples
+
+
+def percentile(values, percent):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+def measure(client, url, iterations, warmup=1):
+    """Выполняет GET-запросы и возвращает статус, перцентили времени ответа (мс) и число SQL."""
+    for _ in range(warmup):
+        client.get(url)
+    timings, queries, status = [], [], None
+    for _ in range(iterations):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            start = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(recorder.queries))
+        status = response.status_code
+    return {
+        'status': status,
+        'p50': round(percentile(timings, 50), 3),
+        'p95': round(percentile(timings, 95), 3),
+        'p99': round(percentile(timings, 99), 3),
+        'mean': round(statistics.fmean(timings), 3),
+        'queries': max(queries),
+    }
+
+
+def summarize(results, elapsed):
+    """Сводка нагрузочного прогона: пропускная способность и перцентили задержки (мс)."""
+    timings = sorted(timing for worker_timings, _ in results for timing in worker_timings)
+    return {
+        'requests': len(timings),
+        'errors': sum(errors for _, errors in results),
+        'rps': round(len(timings) / elapsed, 1),
+        'p50': round(percentile(timings, 50), 3),
+        'p95': round(percentile(timings, 95), 3),
+        'p99': round(percentile(timings, 99), 3),
+        'mean': round(statistics.fmean(timings), 3),
+    }
+
+
+def load_wsgi(urls, concurrency, requests, user=None):
+    """Нагрузка на синхронный обработчик: ``concurrency`` потоков, как у многопоточного WSGI-сервера.
+
+    Каждый поток делает ``requests`` запросов, перебирая ``urls`` по кругу.
+    """
+    def worker(index):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        timings, errors = [], 0
+        try:
+            for number in range(requests):
+                start = time.perf_counter()
+                response = client.get(urls[(index + number) % len(urls)])
+                timings.append((time.perf_counter() - start) * 1000)
+                errors += response.status_code >= 400
+        finally:
+            connections.close_all()
+        return timings, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(worker, range(concurrency)))
+    return summarize(results, time.perf_counter() - start)
+
+
+def load_asgi(urls, concurrency, requests, user=None):
+    """Та же нагрузка на асинхронный обработчик: ``concurrency`` задач в одном цикле событий."""
+    async def worker(index):
+        client = AsyncClient()
+        if user is not None:
+            await client.aforce_login(user)
+        timings, errors = [], 0
+        for number in range(requests):
+            start = time.perf_counter()
+            response = await client.get(urls[(index + number) % len(urls)])
+            timings.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code >= 400
+        return timings, errors
+
+    async def run():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(worker(index) for index in range(concurrency)))
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(run())
+    return summarize(results, elapsed)
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from recipe_project.db_router import use_primary
+from .facets import as_categories, top_categories, top_category_counts
+from .models import Comment, Recipe
+from .trending import trending_recipes
+
+HOME_VERSION_KEY = 'recipes:home:version'
+
+
+def home_cache_version():
+    """Текущая версия данных главной страницы; меняется при каждой инвалидации."""
+    return cache.get_or_set(HOME_VERSION_KEY, time.time_ns, None)
+
+
+async def ahome_cache_version():
+    return await cache.aget_or_set(HOME_VERSION_KEY, time.time_ns, None)
+
+
+async def alist(queryset):
+    """Асинхронный аналог ``list(queryset)``."""
+    return [obj async for obj in queryset]
+
+
+def latest_recipes():
+    return (
+        Recipe.objects.filter(status='approved').select_related('author')
+        .defer('search_vector').order_by('-created_at')[:6]
+    )
+
+
+def home_trending_recipes():
+    return trending_recipes().filter(trending_score__gt=0).select_related('author').defer('search_vector')[:6]
+
+
+def get_home_data(version):
+    key = f'recipes:home:data:{version}'
+    data = cache.get(key)
+    if data is None:
+        # Запись живёт без срока, поэтому данные для неё читаются с основной базы: отстающая реплика
+        # закрепила бы под новой версией состояние до изменения.
+        with use_primary():
+            data = {
+                'categories': top_categories(),
+                'latest_recipes': list(latest_recipes()),
+                'trending_recipes': list(home_trending_recipes()),
+            }
+        cache.set(key, data, None)
+    return data
+
+
+async def aget_home_data(version):
+    key = f'recipes:home:data:{version}'
+    data = await cache.aget(key)
+    if data is None:
+        with use_primary():
+            counts, recipes, trending = await asyncio.gather(
+                alist(top_category_counts()), alist(latest_recipes()), alist(home_trending_recipes()),
+            )
+        data = {'categories': as_categories(counts), 'latest_recipes': recipes, 'trending_recipes': trending}
+        await cache.aset(key, data, None)
+    return data
+
+
+def _bump_home_version():
+    cache.set(HOME_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_home_cache():
+    """Сбрасывает кэш главной страницы после фиксации текущей транзакции."""
+    transaction.on_commit(_bump_home_version)
+
+
+def recipe_version_key(recipe_id):
+    return f'recipes:recipe:{recipe_id}:version'
+
+
+def recipe_cache_version(recipe_id):
+    """Версия отрисовки рецепта; входит в ключи фрагментов ``recipe_detail.html``."""
+    return cache.get_or_set(recipe_version_key(recipe_id), time.time_ns, None)
+
+
+async def arecipe_cache_version(recipe_id):
+    return await cache.aget_or_set(recipe_version_key(recipe_id), time.time_ns, None)
+
+
+def commenters(recipe_id):
+    return Comment.objects.filter(recipe_id=recipe_id).values_list('user_id', flat=True)
+
+
+def recipe_commenter_ids(recipe_id, version):
+    """Авторы комментариев рецепта; как и фрагменты страницы, читаются с основной базы."""
+    key = f'recipes:recipe:{recipe_id}:commenters:{version}'
+    commenter_ids = cache.get(key)
+    if commenter_ids is None:
+        with use_primary():
+            commenter_ids = set(commenters(recipe_id))
+        cache.set(key, commenter_ids, None)
+    return commenter_ids
+
+
+async def arecipe_commenter_ids(recipe_id, version):
+    key = f'recipes:recipe:{recipe_id}:commenters:{version}'
+    commenter_ids = await cache.aget(key)
+    if commenter_ids is None:
+        with use_primary():
+            commenter_ids = {user_id async for user_id in commenters(recipe_id)}
+        await cache.aset(key, commenter_ids, None)
+    return commenter_ids
+
+
+def bump_recipe_versions(recipe_ids):
+    """Сбрасывает кэш отрисовки рецептов после фиксации текущей транзакции."""
+    recipe_ids = list(recipe_ids)
+
+    def bump():
+        version = time.time_ns()
+        cache.set_many({recipe_version_key(recipe_id): version for recipe_id in recipe_ids}, None)
+
+    if recipe_ids:
+        transaction.on_commit(bump)
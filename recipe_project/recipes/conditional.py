@@ -0,0 +1,105 @@
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages import get_messages
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from accounts.roles import get_roles
+from .models import Recipe
+
+
+def touch_recipes(recipe_ids):
+    """Отмечает рецепты изменёнными, чтобы их страницы получили новые ETag и Last-Modified."""
+    Recipe.objects.filter(pk__in=list(recipe_ids)).update(updated_at=timezone.now())
+
+
+def version_time(version):
+    """Время сброса кэша: версии кэша — это ``time.time_ns()`` в момент инвалидации."""
+    return datetime.fromtimestamp(version / 1e9, tz=dt_timezone.utc)
+
+
+def viewer_key(request):
+    """Всё, что в разметке зависит от посетителя: меню, роли, ссылки автора и CSRF-токен форм."""
+    user = request.user
+    csrf_cookie = request.META.get('CSRF_COOKIE', '')
+    if not user.is_authenticated:
+        return f'guest:{csrf_cookie}'
+    return ':'.join([
+        str(user.pk), user.username, user.avatar.name or '', str(user.is_staff), str(user.is_superuser),
+        ','.join(sorted(get_roles(user))), csrf_cookie,
+    ])
+
+
+async def aresolve_user(request):
+    """Загружает пользователя, не блокируя цикл событий, и подставляет его в ``request.user``.
+
+    После этого шаблоны и синхронный код в ``sync_to_async`` не читают сессию и пользователя повторно.
+    """
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+def conditional_page(page_state):
+    """Отвечает 304 на повторный GET, пока страница не изменилась.
+
+    ``page_state(request, *args, **kwargs)`` возвращает ``(ключ, время изменения)``, посчитанные по
+    индексированным полям и версиям кэша, или ``None``, если страницу нужно отрисовать. ETag
+    дополнительно зависит от посетителя; Last-Modified различать пользователей не может, поэтому
+    отдаётся только гостям. Пока в сессии есть неотображённые сообщения, страница рисуется заново.
+
+    Подходит и для асинхронных представлений: пользователь загружается через ``request.auser()``,
+    а проверки, которые читают сессию и базу, выполняются в ``sync_to_async``.
+    """
+    def validators(request, *args, **kwargs):
+        if not hasattr(request, '_page_validators'):
+            request._page_validators = None
+            if request.method in ('GET', 'HEAD') and not len(get_messages(request)):
+                state = page_state(request, *args, **kwargs)
+                if state is not None:
+                    key, modified = state
+                    etag = hashlib.md5(f'{key}|{viewer_key(request)}'.encode()).hexdigest()
+                    private = request.user.is_authenticated
+                    request._page_validators = (etag, None if private else modified, private)
+        return request._page_validators
+
+    def etag_func(request, *args, **kwargs):
+        state = validators(request, *args, **kwargs)
+        return state[0] if state else None
+
+    def last_modified_func(request, *args, **kwargs):
+        state = validators(request, *args, **kwargs)
+        return state[1] if state else None
+
+    def add_cache_control(request, response):
+        state = getattr(request, '_page_validators', None)
+        if state:
+            # Браузер должен каждый раз переспрашивать сервер, а не угадывать срок свежести.
+            if state[2]:
+                patch_cache_control(response, no_cache=True, private=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+        return response
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_inner(request, *args, **kwargs):
+                await aresolve_user(request)
+                await sync_to_async(validators)(request, *args, **kwargs)
+                response = await conditional_view(request, *args, **kwargs)
+                return add_cache_control(request, response)
+            return async_inner
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            return add_cache_control(request, response)
+        return inner
+    return decorator
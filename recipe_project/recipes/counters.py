@@ -0,0 +1,79 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Recipe, Comment, Favorite
+from .trending import COUNTER_EVENTS, event_changes, event_weight, score_changes
+
+COUNTERS = {
+    'comment_count': Comment,
+    'favorite_count': Favorite,
+}
+
+
+def change_counter(recipe_id, field, delta, happened_at=None):
+    """Атомарно изменяет счётчик рецепта одним UPDATE, не опускаясь ниже нуля.
+
+    Счётчики выводятся на страницах, поэтому тем же запросом сдвигается ``updated_at``. Тем же
+    запросом меняется оценка популярности (``happened_at`` — время удаляемого события), а изменение
+    избранного отмечает рецепт для пересчёта похожих рецептов.
+    """
+    now = timezone.now()
+    changes = {
+        field: Greatest(F(field) + delta, 0),
+        'updated_at': now,
+        **event_changes(COUNTER_EVENTS[field], delta, happened_at or now, now),
+    }
+    if field == 'favorite_count':
+        changes['favorites_changed_at'] = now
+    Recipe.objects.filter(pk=recipe_id).update(**changes)
+
+
+def remove_counter_events(events):
+    """Вычитает пачку удалённых событий ``{recipe_id: {поле: [время события, ...]}}``.
+
+    На каждый рецепт — один UPDATE со всеми счётчиками и суммарным вкладом в популярность, поэтому
+    каскадное удаление пользователя не обновляет рецепт отдельно на каждый его комментарий.
+    """
+    now = timezone.now()
+    for recipe_id, fields in events.items():
+        changes = {'updated_at': now}
+        contribution = 0.0
+        for field, times in fields.items():
+            changes[field] = Greatest(F(field) - len(times), 0)
+            contribution += sum(event_weight(COUNTER_EVENTS[field], -1, happened_at, now) for happened_at in times)
+        if 'favorite_count' in fields:
+            changes['favorites_changed_at'] = now
+        changes.update(score_changes(contribution, now))
+        Recipe.objects.filter(pk=recipe_id).update(**changes)
+
+
+def actual_counts():
+    """Аннотации с фактическими значениями счётчиков, посчитанными по исходным таблицам."""
+    return {
+        f'actual_{field}': Coalesce(
+            Subquery(
+                model.objects.filter(recipe=OuterRef('pk'))
+                .order_by().values('recipe').annotate(total=Count('pk')).values('total')
+            ),
+            Value(0),
+        )
+        for field, model in COUNTERS.items()
+    }
+
+
+def reconcile_counters(queryset):
+    """Исправляет расхождения счётчиков в пачке рецептов, возвращает исправленные рецепты."""
+    drifted = []
+    for recipe in queryset.only('pk', *COUNTERS).annotate(**actual_counts()):
+        changed = False
+        for field in COUNTERS:
+            actual = getattr(recipe, f'actual_{field}')
+            if getattr(recipe, field) != actual:
+                setattr(recipe, field, actual)
+                changed = True
+        if changed:
+            drifted.append(recipe)
+    if drifted:
+        Recipe.objects.bulk_update(drifted, list(COUNTERS))
+    return drifted
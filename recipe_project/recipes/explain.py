@@ -0,0 +1,126 @@
+from contextlib import ExitStack
+
+from django.apps import apps
+from django.db import connections, transaction
+
+from .benchmark import SKIPPED_URLS, build_url, named_urls
+
+# Справочники, которые страницы читают целиком (список категорий в фильтре): для них полный
+# просмотр таблицы — лучший план при любом объёме данных.
+FULL_SCAN_TABLES = {'recipes_category'}
+
+# Условие, которое сужает чтение индекса. Без него узел обходит индекс целиком: с выключенным
+# Seq Scan планировщик так подменяет полный просмотр таблицы проходом по любому индексу.
+INDEX_CONDITIONS = {'Index Scan': 'Index Cond', 'Index Only Scan': 'Index Cond', 'Bitmap Heap Scan': 'Recheck Cond'}
+
+# Варианты адресов с параметрами: у этих страниц запросы зависят от фильтров и сортировки.
+URL_VARIANTS = {
+    'recipe_list': ['?category={category}', '?category={category}&sort=trending', '?sort=trending', '?q=суп'],
+    'favorite_list': ['?category={category}', '?q=суп'],
+    'recipe_suggest': ['?q=су'],
+    'recipes_by_ingredients': ['?ingredients=соль,мука'],
+}
+
+
+class PlanRecorder:
+    """Запоминает SELECT-запросы со всех соединений, чтобы потом выполнить для них EXPLAIN."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((context['connection'].alias, sql, params))
+        return execute(sql, params, many, context)
+
+    def recording(self):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+
+def explain(alias, sql, params):
+    """План запроса (корневой узел EXPLAIN в формате JSON) при запрещённом последовательном чтении.
+
+    С ``enable_seqscan = off`` планировщик выбирает Seq Scan, только если подходящего индекса нет,
+    поэтому проверка не зависит от того, насколько мала тестовая таблица.
+    """
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        # Откат возвращает настройку и в тестах, где всё выполняется внутри одной транзакции.
+        transaction.set_rollback(True, using=alias)
+    return plan[0]['Plan']
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def partial_indexes():
+    """Имена частичных индексов: их строки уже отобраны условием индекса, и обход целиком не читает лишнего."""
+    return {
+        index.name
+        for model in apps.get_models()
+        for index in [*model._meta.indexes, *model._meta.constraints]
+        if getattr(index, 'condition', None) is not None
+    }
+
+
+def is_full_scan(node, partial):
+    if node['Node Type'] == 'Seq Scan':
+        return True
+    condition = INDEX_CONDITIONS.get(node['Node Type'])
+    return condition is not None and condition not in node and node.get('Index Name') not in partial
+
+
+def full_scans(plan, allowed=FULL_SCAN_TABLES):
+    """Таблицы, которые план читает целиком: Seq Scan или обход полного индекса без условия."""
+    partial = partial_indexes()
+    return sorted({
+        node['Relation Name'] for node in plan_nodes(plan)
+        if is_full_scan(node, partial) and node['Relation Name'] not in allowed
+    })
+
+
+def check_url(client, url, allowed=FULL_SCAN_TABLES):
+    """Открывает ``url`` и возвращает запросы страницы, план которых читает таблицы целиком.
+
+    Элементы — ``(sql, [таблицы])``; одинаковые запросы проверяются один раз.
+    """
+    recorder = PlanRecorder()
+    with recorder.recording():
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    problems, seen = [], set()
+    for alias, sql, params in recorder.queries:
+        key = (sql, repr(params))
+        if key in seen:
+            continue
+        seen.add(key)
+        tables = full_scans(explain(alias, sql, params), allowed)
+        if tables:
+            problems.append((sql, tables))
+    return problems
+
+
+def view_urls(samples):
+    """Адреса всех именованных страниц с подставленными ``samples`` и вариантами из ``URL_VARIANTS``."""
+    values = {key: value for key, value in samples.items() if isinstance(key, str) and value is not None}
+    for name, params in named_urls():
+        if name in SKIPPED_URLS:
+            continue
+        url = build_url(name, params, samples)
+        if url is None:
+            continue
+        yield name, url
+        for variant in URL_VARIANTS.get(name, []):
+            try:
+                yield name, url + variant.format(**values)
+            except KeyError:
+                continue
@@ -0,0 +1,151 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, FilteredRelation, Q
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Category, CategoryCount, Favorite, Recipe
+
+
+def shift_counts(deltas):
+    """Сдвигает счётчики ``{(category_id, user_id): delta}``; ``user_id=None`` — одобренные рецепты.
+
+    Недостающие строки создаются через INSERT ... ON CONFLICT DO NOTHING, затем счётчики с одинаковым
+    сдвигом меняются одним UPDATE, поэтому параллельные изменения не теряются.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta and key[0] is not None}
+    if not deltas:
+        return
+    CategoryCount.objects.bulk_create(
+        [CategoryCount(category_id=category_id, user_id=user_id) for (category_id, user_id), delta in deltas.items()
+         if delta > 0],
+        ignore_conflicts=True,
+    )
+    groups = defaultdict(Q)
+    for (category_id, user_id), delta in deltas.items():
+        if user_id is None:
+            groups[delta] |= Q(category_id=category_id, user__isnull=True)
+        else:
+            groups[delta] |= Q(category_id=category_id, user_id=user_id)
+    for delta, condition in groups.items():
+        CategoryCount.objects.filter(condition).update(count=Greatest(F('count') + delta, 0))
+
+
+def recipe_deltas(recipe_ids, category_id=None, delta=1, favorites=True):
+    """Сдвиги счётчиков для рецептов, которые стали одобренными (``delta=1``) или перестали ими быть.
+
+    Вместе со счётчиком категории сдвигается избранное всех, кто добавил эти рецепты. Если
+    ``category_id`` не задан, категории берутся из базы.
+    """
+    recipe_ids = list(recipe_ids)
+    deltas = Counter()
+    if not recipe_ids:
+        return deltas
+    if category_id is None:
+        for category, total in (
+            Recipe.objects.filter(pk__in=recipe_ids).values_list('category_id').annotate(total=Count('pk')).order_by()
+        ):
+            deltas[category, None] += total * delta
+    else:
+        deltas[category_id, None] += len(recipe_ids) * delta
+    if favorites:
+        rows = Favorite.objects.filter(recipe_id__in=recipe_ids).order_by()
+        if category_id is None:
+            pairs = rows.values_list('recipe__category_id', 'user_id')
+        else:
+            pairs = ((category_id, user_id) for user_id in rows.values_list('user_id', flat=True))
+        for category, user_id in pairs:
+            deltas[category, user_id] += delta
+    return deltas
+
+
+def recipes_changed(recipe_ids, category_id=None, delta=1, favorites=True):
+    """Применяет ``recipe_deltas`` — для массовых одобрений и импорта, которые не шлют сигналы."""
+    shift_counts(recipe_deltas(recipe_ids, category_id, delta, favorites))
+
+
+def favorites_removed(pairs):
+    """Вычитает пачку удалённых избранных ``[(recipe_id, user_id), ...]`` одним запросом категорий."""
+    if not pairs:
+        return
+    categories = dict(
+        Recipe.objects.filter(pk__in={recipe_id for recipe_id, _ in pairs}, status='approved')
+        .values_list('pk', 'category_id')
+    )
+    deltas = Counter()
+    for recipe_id, user_id in pairs:
+        if recipe_id in categories:
+            deltas[categories[recipe_id], user_id] -= 1
+    shift_counts(deltas)
+
+
+def favorite_changed(favorite, delta):
+    """Сдвигает счётчик избранного пользователя в категории рецепта, если рецепт одобрен."""
+    if Favorite.recipe.is_cached(favorite):
+        recipe = favorite.recipe
+        category_id = recipe.category_id if recipe.status == 'approved' else None
+    else:
+        category_id = (
+            Recipe.objects.filter(pk=favorite.recipe_id, status='approved').values_list('category_id', flat=True).first()
+        )
+    shift_counts({(category_id, favorite.user_id): delta})
+
+
+def rebuild_counts(category_ids=None):
+    """Пересчитывает счётчики по исходным таблицам (после массовой загрузки или для сверки)."""
+    recipes = Recipe.objects.filter(status='approved', category__isnull=False)
+    favorites = Favorite.objects.filter(recipe__status='approved', recipe__category__isnull=False)
+    counts = CategoryCount.objects.all()
+    if category_ids is not None:
+        recipes = recipes.filter(category_id__in=category_ids)
+        favorites = favorites.filter(recipe__category_id__in=category_ids)
+        counts = counts.filter(category_id__in=category_ids)
+    rows = [
+        CategoryCount(category_id=category_id, count=total)
+        for category_id, total in recipes.values_list('category_id').annotate(total=Count('pk')).order_by()
+    ]
+    rows += [
+        CategoryCount(category_id=category_id, user_id=user_id, count=total)
+        for category_id, user_id, total in (
+            favorites.values_list('recipe__category_id', 'user_id').annotate(total=Count('pk')).order_by()
+        )
+    ]
+    with transaction.atomic():
+        counts.delete()
+        CategoryCount.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def categories_with_counts(user=None):
+    """Все категории с полем ``recipe_count``: одобренные рецепты или избранное ``user``.
+
+    Счётчик подтягивается одним LEFT JOIN к ``CategoryCount``, без агрегации.
+    """
+    if user is None:
+        condition = Q(counts__user__isnull=True)
+    else:
+        condition = Q(counts__user=user)
+    return Category.objects.annotate(
+        facet=FilteredRelation('counts', condition=condition),
+    ).annotate(recipe_count=Coalesce(F('facet__count'), 0)).order_by('name')
+
+
+def top_category_counts(limit=5):
+    """Строки ``CategoryCount`` самых больших категорий — по индексу ``category_count_top_idx``."""
+    return (
+        CategoryCount.objects.filter(user__isnull=True, count__gt=0)
+        .select_related('category').order_by('-count', 'category_id')[:limit]
+    )
+
+
+def as_categories(rows):
+    """Категории из строк ``top_category_counts`` с полем ``recipe_count``."""
+    categories = []
+    for row in rows:
+        row.category.recipe_count = row.count
+        categories.append(row.category)
+    return categories
+
+
+def top_categories(limit=5):
+    return as_categories(top_category_counts(limit))
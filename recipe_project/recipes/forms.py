@@ -1,6 +1,8 @@
 from django import forms
+from .images import schedule_variants
+from .media import image_files, tombstone_files
 from .models import Recipe, Comment, Step
-from django.forms.models import inlineformset_factory
+from django.forms.models import BaseInlineFormSet, inlineformset_factory
 
 
 class RecipeForm(forms.ModelForm):
@@ -15,10 +17,61 @@ class StepForm(forms.ModelForm):
         fields = ['instruction', 'image']
 
 
+class BaseStepFormSet(BaseInlineFormSet):
+    def save_steps(self):
+        """Сохраняет шаги за постоянное число запросов и нумерует их по порядку форм.
+
+        Новые шаги добавляются через bulk_create, изменённые и перенумерованные — через bulk_update,
+        удалённые — одним DELETE. Сигналы при этом не отправляются, поэтому замена изображений
+        (удаление старых файлов и генерация уменьшенных копий) обрабатывается здесь же.
+        """
+        image_field = Step._meta.get_field('image')
+        deleted = set(self.deleted_forms)
+        to_create, to_update, to_delete, with_new_image, replaced = [], [], [], [], []
+        number = 0
+        for form in self.forms:
+            if form in deleted:
+                if form.instance.pk:
+                    to_delete.append(form.instance.pk)
+                continue
+            if form.instance.pk is None and not form.has_changed():
+                continue
+            number += 1
+            step = form.save(commit=False)
+            step.recipe = self.instance
+            image_changed = 'image' in form.changed_data
+            if step.pk is None:
+                step.step_number = number
+                to_create.append(step)
+            elif form.has_changed() or step.step_number != number:
+                if image_changed:
+                    if step._loaded_image_name:
+                        replaced.extend(image_files(step._loaded_image_name, step.image_variants))
+                    step.image_variants = []
+                    # bulk_update не вызывает pre_save: загруженный файл сохраняем в хранилище сами.
+                    image_field.pre_save(step, add=False)
+                step.step_number = number
+                to_update.append(step)
+            if image_changed and step.image:
+                with_new_image.append(step)
+
+        if to_delete:
+            Step.objects.filter(recipe=self.instance, pk__in=to_delete).delete()
+        if to_create:
+            Step.objects.bulk_create(to_create)
+        if to_update:
+            Step.objects.bulk_update(to_update, ['step_number', 'instruction', 'image', 'image_variants'])
+        tombstone_files(replaced)
+        for step in with_new_image:
+            schedule_variants(step, 'image', 'image_variants')
+        return to_create + to_update
+
+
 StepFormSet = inlineformset_factory(
     Recipe,
     Step,
     form=StepForm,
+    formset=BaseStepFormSet,
     fields=['instruction', 'image'],
     extra=1,
     can_delete=True
@@ -0,0 +1,101 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+_executor = None
+
+# Отправляется после сохранения списка вариантов: закэшированная разметка должна обновиться.
+image_variants_ready = Signal()
+
+
+def variant_name(name, width, extension):
+    root, _ = os.path.splitext(name)
+    return f'{root}_{width}w.{extension}'
+
+
+def variant_names(name, widths):
+    return [variant_name(name, width, extension) for width in widths for extension, _, _ in VARIANT_FORMATS]
+
+
+def generate_variants(name, storage=default_storage):
+    """Создаёт уменьшенные копии изображения в WebP и JPEG, возвращает список их ширин.
+
+    Изображение не увеличивается: если оригинал уже самого малого варианта, берётся его ширина.
+    """
+    with storage.open(name, 'rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    widths = [width for width in settings.IMAGE_VARIANT_WIDTHS if width < image.width] or [image.width]
+    for width in widths:
+        resized = image.copy()
+        resized.thumbnail((width, width * 10), Image.Resampling.LANCZOS)
+        for extension, image_format, options in VARIANT_FORMATS:
+            frame = resized
+            if image_format == 'JPEG' and frame.mode == 'RGBA':
+                frame = Image.new('RGB', resized.size, 'white')
+                frame.paste(resized, mask=resized.getchannel('A'))
+            buffer = BytesIO()
+            frame.save(buffer, image_format, **options)
+            target = variant_name(name, width, extension)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+    return widths
+
+
+def process_instance_image(model, pk, field_name, variants_field):
+    """Генерирует варианты для изображения записи и сохраняет список ширин.
+
+    Обновление выполняется, только если в записи всё ещё то же изображение.
+    """
+    try:
+        name = model.objects.filter(pk=pk).values_list(field_name, flat=True).first()
+        if not name:
+            return
+        widths = generate_variants(name)
+        if model.objects.filter(pk=pk, **{field_name: name}).update(**{variants_field: widths}):
+            image_variants_ready.send(sender=model, pks=[pk])
+    except Exception:
+        logger.exception('Не удалось создать варианты изображения %s.%s #%s', model.__name__, field_name, pk)
+
+
+def _process_in_worker(*args):
+    try:
+        process_instance_image(*args)
+    finally:
+        connection.close()
+
+
+def schedule_variants(instance, field_name, variants_field):
+    """Ставит генерацию вариантов в фоновый пул после фиксации транзакции."""
+    args = (type(instance), instance.pk, field_name, variants_field)
+
+    def submit():
+        global _executor
+        if not settings.IMAGE_VARIANTS_ASYNC:
+            process_instance_image(*args)
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix='image-variants')
+        _executor.submit(_process_in_worker, *args)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,83 @@
+import re
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Ingredient
+
+# Количества, единицы измерения и пояснения, которые не входят в название ингредиента.
+UNITS = {
+    'г', 'гр', 'грамм', 'граммов', 'кг', 'мл', 'л', 'литр', 'литра', 'шт', 'штук', 'штуки',
+    'ст', 'ст.л', 'ч.л', 'стакан', 'стакана', 'стаканов', 'щепотка', 'щепотки', 'зубчик',
+    'зубчика', 'зубчиков', 'пучок', 'пучка', 'по', 'вкусу', 'ложка', 'ложки', 'ложек',
+}
+LINE_SPLIT_RE = re.compile(r'[\n;,]+')
+BRACKETS_RE = re.compile(r'\([^)]*\)')
+QUANTITY_RE = re.compile(r'[\d½¼¾/.,]+')
+WORD_RE = re.compile(r'[a-zа-я.-]+')
+
+
+def normalize_ingredient(name):
+    """Приводит название ингредиента к каноническому виду: «Картофель — 3 шт.» -> «картофель»."""
+    name = BRACKETS_RE.sub(' ', name.lower().replace('ё', 'е'))
+    name = re.split(r'\s[-–—:]\s|:', name, maxsplit=1)[0]
+    name = QUANTITY_RE.sub(' ', name)
+    words = [word.strip('.-') for word in WORD_RE.findall(name)]
+    words = [word for word in words if word and word not in UNITS]
+    return ' '.join(words)[:100]
+
+
+def parse_ingredients(text):
+    """Возвращает множество канонических названий из свободного текста поля ``Recipe.ingredients``."""
+    names = set()
+    for line in LINE_SPLIT_RE.split(text or ''):
+        name = normalize_ingredient(line.lstrip('-•*– '))
+        if name:
+            names.add(name)
+    return names
+
+
+def resolve_ingredient_ids(names):
+    """Возвращает id ингредиентов каталога, создавая недостающие записи."""
+    if not names:
+        return {}
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name) for name in names],
+        ignore_conflicts=True,
+    )
+    return dict(Ingredient.objects.filter(name__in=names).values_list('name', 'id'))
+
+
+def index_recipe_ingredients(recipe):
+    names = parse_ingredients(recipe.ingredients)
+    with transaction.atomic():
+        recipe.ingredient_index.set(resolve_ingredient_ids(names).values())
+
+
+def index_recipes(recipes):
+    """Пересобирает индекс для пачки рецептов за постоянное число запросов."""
+    parsed = {recipe.pk: parse_ingredients(recipe.ingredients) for recipe in recipes}
+    ids = resolve_ingredient_ids(set().union(*parsed.values()))
+    Through = Ingredient.recipes.through
+    with transaction.atomic():
+        Through.objects.filter(recipe_id__in=parsed).delete()
+        Through.objects.bulk_create([
+            Through(recipe_id=recipe_id, ingredient_id=ids[name])
+            for recipe_id, names in parsed.items()
+            for name in names
+        ])
+    return len(parsed)
+
+
+def rank_by_ingredients(queryset, names):
+    """Сортирует рецепты по числу совпавших ингредиентов.
+
+    Пересечение считается по индексу ``recipes_recipe_ingredient_index`` (ingredient_id -> recipe_id),
+    текст рецептов при этом не читается.
+    """
+    ids = list(Ingredient.objects.filter(name__in=names).values_list('id', flat=True))
+    return queryset.filter(
+        ingredient_index__in=ids
+    ).annotate(
+        matched_ingredients=Count('ingredient_index')
+    ).order_by('-matched_ingredients', '-created_at')
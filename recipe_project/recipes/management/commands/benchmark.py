@@ -0,0 +1,93 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from recipes.benchmark import ROLES, SKIPPED_URLS, build_url, measure, named_urls, resolve_users, sample_kwargs
+
+
+class Command(BaseCommand):
+    help = (
+        'Обходит все именованные адреса сайта от имени гостя, пользователя и модератора и выводит '
+        'p50/p95/p99 времени ответа и число SQL-запросов. Запросы выполняются в процессе, без сети.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--roles', default=','.join(ROLES), help='Через запятую: ' + ', '.join(ROLES))
+        parser.add_argument('--url', action='append', dest='urls', help='Замерять только эти имена маршрутов.')
+        parser.add_argument('--user', help='Имя пользователя (по умолчанию — самый активный автор).')
+        parser.add_argument('--moderator', help='Имя модератора (по умолчанию — первый из группы модераторов).')
+        parser.add_argument('--output', help='Файл результатов (по умолчанию benchmarks/<время>.json).')
+        parser.add_argument('--compare', help='Файл прошлого прогона для сравнения.')
+
+    def handle(self, *args, **options):
+        roles = [role.strip() for role in options['roles'].split(',') if role.strip()]
+        unknown = set(roles) - set(ROLES)
+        if unknown:
+            raise CommandError(f'Неизвестные роли: {", ".join(sorted(unknown))}')
+
+        users = resolve_users(options['user'], options['moderator'])
+        samples = sample_kwargs(users.get('user'))
+        results = []
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for role in roles:
+                client = Client()
+                if role != 'anonymous':
+                    if users.get(role) is None:
+                        self.stderr.write(f'{role}: подходящий пользователь не найден, пропускаю.')
+                        continue
+                    client.force_login(users[role])
+                for name, params in named_urls():
+                    if name in SKIPPED_URLS or (options['urls'] and name not in options['urls']):
+                        continue
+                    url = build_url(name, params, samples)
+                    if url is None:
+                        continue
+                    stats = measure(client, url, options['iterations'], options['warmup'])
+                    results.append({'role': role, 'name': name, 'url': url, **stats})
+
+        previous = self.load_previous(options['compare'])
+        self.report(results, previous)
+        path = self.save(results, options)
+        self.stdout.write(self.style.SUCCESS(f'Результаты сохранены в {path}'))
+
+    def load_previous(self, path):
+        if not path:
+            return {}
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            raise CommandError(f'Файл {path} не найден.')
+        return {(row['role'], row['name']): row for row in data['results']}
+
+    def report(self, results, previous):
+        self.stdout.write(f'{"роль":<10} {"адрес":<26} {"код":>4} {"p50":>8} {"p95":>8} {"p99":>8} {"SQL":>4}')
+        for row in results:
+            line = (
+                f'{row["role"]:<10} {row["name"]:<26} {row["status"]:>4} '
+                f'{row["p50"]:>8.1f} {row["p95"]:>8.1f} {row["p99"]:>8.1f} {row["queries"]:>4}'
+            )
+            before = previous.get((row['role'], row['name']))
+            if before:
+                line += f'   p95 {row["p95"] - before["p95"]:+.1f} мс, SQL {row["queries"] - before["queries"]:+d}'
+            self.stdout.write(line)
+
+    def save(self, results, options):
+        path = Path(options['output'] or settings.BASE_DIR / 'benchmarks' / f'{timezone.now():%Y%m%d-%H%M%S}.json')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            'created_at': timezone.now().isoformat(),
+            'iterations': options['iterations'],
+            'database': settings.DATABASES['default']['NAME'],
+            'cache': settings.CACHES['default']['BACKEND'],
+            'results': results,
+        }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+        return path
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import RecipeNeighbor
+from recipes.similar import rebuild_neighbors, refresh_neighbors
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие рецепты по общему избранному. По умолчанию обрабатываются только рецепты, '
+        'затронутые изменениями избранного с прошлого запуска; --full пересчитывает всё.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Полный пересчёт.')
+        parser.add_argument('--k', type=int, help='Сколько похожих рецептов хранить (по умолчанию SIMILAR_RECIPES_COUNT).')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options['full'] or not RecipeNeighbor.objects.exists():
+            built = rebuild_neighbors(options['k'], options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Полный пересчёт: обработано рецептов {built}.'))
+        else:
+            refreshed = refresh_neighbors(options['k'], options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Инкрементальный пересчёт: затронуто рецептов {refreshed}.'))
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from recipes.benchmark import ROLES, resolve_users, sample_kwargs
+from recipes.explain import FULL_SCAN_TABLES, check_url, view_urls
+
+
+class Command(BaseCommand):
+    help = (
+        'Открывает все страницы сайта от имени гостя, пользователя и модератора, выполняет EXPLAIN для '
+        'их SELECT-запросов и сообщает о планах, читающих таблицу или индекс целиком. Запускайте на '
+        'заполненной базе (manage.py seed_data) после изменения запросов или индексов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', dest='urls', help='Проверять только эти имена маршрутов.')
+        parser.add_argument('--allow', action='append', default=[], help='Таблица, которую можно читать целиком.')
+        parser.add_argument('--user', help='Имя пользователя (по умолчанию — самый активный автор).')
+        parser.add_argument('--moderator', help='Имя модератора (по умолчанию — первый из группы модераторов).')
+
+    def handle(self, *args, **options):
+        users = resolve_users(options['user'], options['moderator'])
+        samples = sample_kwargs(users.get('user'))
+        allowed = FULL_SCAN_TABLES | set(options['allow'])
+        checked, failed = 0, 0
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for role in ROLES:
+                client = Client()
+                if role != 'anonymous':
+                    if users.get(role) is None:
+                        self.stderr.write(f'{role}: подходящий пользователь не найден, пропускаю.')
+                        continue
+                    client.force_login(users[role])
+                for name, url in view_urls(samples):
+                    if options['urls'] and name not in options['urls']:
+                        continue
+                    checked += 1
+                    for sql, tables in check_url(client, url, allowed):
+                        failed += 1
+                        self.stdout.write(f'{role} {url}: полное чтение {", ".join(tables)}\n    {sql}')
+        if failed:
+            raise CommandError(f'Планов с полным чтением: {failed} (проверено страниц: {checked}).')
+        self.stdout.write(self.style.SUCCESS(f'Проверено страниц: {checked}, полного чтения нет.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import iter_ndjson
+
+
+class Command(BaseCommand):
+    help = 'Выгружает одобренные рецепты с шагами в NDJSON (одна строка — один рецепт), не загружая всё в память.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-', help='Файл для записи; «-» — стандартный вывод.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.write(self.stdout, options['chunk_size'])
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            total = self.write(output, options['chunk_size'])
+        self.stderr.write(f'Выгружено рецептов: {total}')
+
+    def write(self, output, chunk_size):
+        total = 0
+        for line in iter_ndjson(chunk_size=chunk_size):
+            output.write(line)
+            total += 1
+        return total
@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipes.images import generate_variants, image_variants_ready
+from recipes.models import Recipe, Step
+
+
+def _generate(name):
+    try:
+        return name, generate_variants(name), None
+    except Exception as exc:
+        return name, None, exc
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии для уже загруженных изображений рецептов, шагов и аватаров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--force', action='store_true', help='Пересоздать варианты, даже если они уже есть.')
+
+    def handle(self, *args, **options):
+        targets = (
+            (Recipe, 'image', 'image_variants'),
+            (Step, 'image', 'image_variants'),
+            (get_user_model(), 'avatar', 'avatar_variants'),
+        )
+        # Дочерние процессы не должны унаследовать открытые соединения с БД.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for model, field_name, variants_field in targets:
+                done = self.process_model(pool, model, field_name, variants_field, options)
+                self.stdout.write(f'{model._meta.verbose_name_plural}: обработано {done}')
+        self.stdout.write(self.style.SUCCESS('Готово.'))
+
+    def process_model(self, pool, model, field_name, variants_field, options):
+        queryset = model.objects.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+        if not options['force']:
+            queryset = queryset.filter(**{variants_field: []})
+        rows = queryset.order_by('pk').values_list('pk', field_name)
+
+        done, last_pk = 0, 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                return done
+            last_pk = batch[-1][0]
+            pks_by_name = {}
+            for pk, name in batch:
+                pks_by_name.setdefault(name, []).append(pk)
+            ready = []
+            for name, widths, error in pool.map(_generate, pks_by_name):
+                if error is not None:
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                if model.objects.filter(pk__in=pks_by_name[name], **{field_name: name}).update(**{variants_field: widths}):
+                    ready.extend(pks_by_name[name])
+                done += len(pks_by_name[name])
+            # Фрагменты и ETag кэшируются без срока жизни: сбрасываем их один раз на пачку.
+            if ready:
+                image_variants_ready.send(sender=model, pks=ready)
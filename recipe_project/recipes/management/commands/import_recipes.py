@@ -0,0 +1,40 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import import_ndjson
+
+
+class Command(BaseCommand):
+    help = 'Загружает рецепты из NDJSON, созданного export_recipes, пачками через bulk_create.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON; «-» — стандартный ввод.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--author', help='Пользователь, которому отдать рецепты неизвестных авторов.')
+        parser.add_argument('--status', default='approved', choices=['approved', 'pending'])
+
+    def handle(self, *args, **options):
+        default_author = None
+        if options['author']:
+            default_author = get_user_model().objects.filter(username=options['author']).first()
+            if default_author is None:
+                raise CommandError(f'Пользователь {options["author"]} не найден.')
+
+        if options['path'] == '-':
+            result = self.load(sys.stdin, default_author, options)
+        else:
+            with open(options['path'], encoding='utf-8') as source:
+                result = self.load(source, default_author, options)
+
+        for line_number, reason in result.skipped:
+            self.stderr.write(f'Строка {line_number}: {reason}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {result.created}, пропущено строк: {len(result.skipped)}'
+        ))
+
+    def load(self, source, default_author, options):
+        return import_ndjson(
+            source, batch_size=options['batch_size'], default_author=default_author, status=options['status'],
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.ingredients import index_recipes
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Заполняет индекс ингредиентов из текстового поля рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipes = Recipe.objects.only('id', 'ingredients').order_by('pk')
+        batch, total = [], 0
+        for recipe in recipes.iterator(chunk_size=batch_size):
+            batch.append(recipe)
+            if len(batch) >= batch_size:
+                total += index_recipes(batch)
+                batch = []
+        if batch:
+            total += index_recipes(batch)
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано рецептов: {total}'))
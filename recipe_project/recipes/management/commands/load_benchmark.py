@@ -0,0 +1,105 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils import timezone
+
+from recipes.benchmark import build_url, load_asgi, load_wsgi
+from recipes.models import Recipe
+
+HANDLERS = {'wsgi': load_wsgi, 'asgi': load_asgi}
+DEFAULT_URLS = ('home', 'recipe_list', 'recipe_detail')
+
+
+class Command(BaseCommand):
+    help = (
+        'Параллельная нагрузка на главную, список и страницу рецепта через синхронный (WSGI) или '
+        'асинхронный (ASGI) обработчик Django: запросов в секунду и p50/p95/p99. Для сравнения '
+        'запустите команду с --handler wsgi, затем с RECIPE_ASYNC_VIEWS=True и --handler asgi --compare.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--handler', choices=sorted(HANDLERS),
+                            help='По умолчанию asgi при RECIPE_ASYNC_VIEWS, иначе wsgi.')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=50, help='Запросов на одного клиента.')
+        parser.add_argument('--url', action='append', dest='urls', help='Имена маршрутов (по умолчанию все три).')
+        parser.add_argument('--user', help='Выполнять запросы от имени этого пользователя.')
+        parser.add_argument('--output', help='Файл результатов (по умолчанию benchmarks/load-<время>.json).')
+        parser.add_argument('--compare', help='Файл прошлого прогона для сравнения.')
+
+    def handle(self, *args, **options):
+        handler = options['handler'] or ('asgi' if settings.RECIPE_ASYNC_VIEWS else 'wsgi')
+        database = settings.DATABASES['default']
+        if handler == 'asgi' and database['CONN_MAX_AGE'] and 'pool' not in database['OPTIONS']:
+            self.stderr.write(
+                'Под ASGI каждый запрос работает в своём потоке, и постоянные соединения не переиспользуются: '
+                'задайте DB_CONN_MAX_AGE=0 или включите DB_POOL.'
+            )
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'Пользователь {options["user"]} не найден.')
+
+        recipe = Recipe.objects.filter(status='approved').order_by('-comment_count', 'pk').first()
+        samples = {'pk': recipe.pk} if recipe else {}
+        params = {'recipe_detail': ['pk']}
+        urls = [build_url(name, params.get(name, []), samples) for name in options['urls'] or DEFAULT_URLS]
+        urls = [url for url in urls if url]
+        if not urls:
+            raise CommandError('Нет данных для замера: заполните базу командой seed_data.')
+
+        load = HANDLERS[handler]
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            load(urls, 1, len(urls), user)
+            result = load(urls, options['concurrency'], options['requests'], user)
+
+        run = {
+            'created_at': timezone.now().isoformat(),
+            'handler': handler,
+            'async_views': settings.RECIPE_ASYNC_VIEWS,
+            'concurrency': options['concurrency'],
+            'urls': urls,
+            'user': options['user'],
+            'result': result,
+        }
+        self.report(run, self.load_previous(options['compare']))
+        path = self.save(run, options)
+        self.stdout.write(self.style.SUCCESS(f'Результаты сохранены в {path}'))
+
+    def load_previous(self, path):
+        if not path:
+            return None
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            raise CommandError(f'Файл {path} не найден.')
+
+    def report(self, run, previous):
+        result = run['result']
+        self.stdout.write(
+            f'{run["handler"]} (асинхронные представления: {"да" if run["async_views"] else "нет"}), '
+            f'клиентов {run["concurrency"]}: {result["requests"]} запросов, ошибок {result["errors"]}'
+        )
+        self.stdout.write(
+            f'{result["rps"]:.1f} запросов/с, p50 {result["p50"]:.1f} мс, '
+            f'p95 {result["p95"]:.1f} мс, p99 {result["p99"]:.1f} мс'
+        )
+        if previous:
+            before = previous['result']
+            self.stdout.write(
+                f'по сравнению с {previous["handler"]}: {result["rps"] - before["rps"]:+.1f} запросов/с, '
+                f'p95 {result["p95"] - before["p95"]:+.1f} мс, p99 {result["p99"] - before["p99"]:+.1f} мс'
+            )
+
+    def save(self, run, options):
+        path = Path(options['output'] or settings.BASE_DIR / 'benchmarks' / f'load-{timezone.now():%Y%m%d-%H%M%S}.json')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(run, file, ensure_ascii=False, indent=2)
+        return path
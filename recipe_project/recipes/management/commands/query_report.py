@@ -0,0 +1,59 @@
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Сводка по журналу QueryInstrumentationMiddleware: число запросов и время БД по представлениям.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=None, help='Путь к журналу (по умолчанию QUERY_INSTRUMENTATION_LOG).')
+        parser.add_argument('--view', default=None, help='Показать только указанное представление.')
+        parser.add_argument('--top', type=int, default=3)
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.QUERY_INSTRUMENTATION_LOG
+        stats = defaultdict(lambda: {'queries': [], 'db_time': [], 'duplicates': 0, 'repeated': Counter()})
+        try:
+            with open(path, encoding='utf-8') as log:
+                for line in log:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if options['view'] and record['view'] != options['view']:
+                        continue
+                    view = stats[record['view'] or record['path']]
+                    view['queries'].append(record['queries'])
+                    view['db_time'].append(record['db_time_ms'])
+                    view['duplicates'] += record['duplicates']
+                    for query in record['repeated']:
+                        view['repeated'][query['sql']] += query['count']
+        except FileNotFoundError:
+            raise CommandError(f'Журнал {path} не найден.')
+
+        if not stats:
+            self.stdout.write('Журнал пуст.')
+            return
+
+        ordered = sorted(stats.items(), key=lambda item: max(item[1]['queries']), reverse=True)
+        for name, view in ordered:
+            budget = settings.QUERY_BUDGETS.get(name)
+            over = sum(1 for count in view['queries'] if budget is not None and count > budget)
+            line = (
+                f'{name}: обращений {len(view["queries"])}, '
+                f'SQL в среднем {sum(view["queries"]) / len(view["queries"]):.1f}, '
+                f'p95 {percentile(view["queries"], 0.95)}, максимум {max(view["queries"])}, '
+                f'время БД p95 {percentile(view["db_time"], 0.95):.1f} мс, повторов {view["duplicates"]}'
+            )
+            if budget is not None:
+                line += f', бюджет {budget}, превышений {over}'
+            self.stdout.write(self.style.WARNING(line) if over else line)
+            for sql, count in view['repeated'].most_common(options['top']):
+                self.stdout.write(f'    {count} × {sql}')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cache import invalidate_home_cache
+from recipes.facets import rebuild_counts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики рецептов по категориям и избранного пользователей по категориям.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', type=int, action='append', dest='categories',
+                            help='Пересчитать только указанные категории (можно несколько раз).')
+
+    def handle(self, *args, **options):
+        rows = rebuild_counts(options['categories'])
+        invalidate_home_cache()
+        self.stdout.write(self.style.SUCCESS(f'Записано счётчиков: {rows}'))
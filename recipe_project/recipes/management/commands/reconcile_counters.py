@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import reconcile_counters
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Сверяет comment_count и favorite_count рецептов с фактическими данными и исправляет расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk, checked, fixed = 0, 0, 0
+        while True:
+            pks = list(
+                Recipe.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            with transaction.atomic():
+                batch = Recipe.objects.select_for_update().filter(pk__in=pks)
+                drifted = reconcile_counters(batch)
+            for recipe in drifted:
+                self.stdout.write(
+                    f'Рецепт {recipe.pk}: comment_count={recipe.comment_count}, favorite_count={recipe.favorite_count}'
+                )
+            checked += len(pks)
+            fixed += len(drifted)
+            last_pk = pks[-1]
+        self.stdout.write(self.style.SUCCESS(f'Проверено рецептов: {checked}, исправлено: {fixed}'))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.media import find_orphans, iter_media_chunks, media_sources, tombstone_files
+
+
+class Command(BaseCommand):
+    help = 'Сверяет файлы в MEDIA_ROOT с БД и отмечает к удалению файлы без ссылок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--min-age-hours', type=int, default=24,
+                            help='Пропускать файлы моложе указанного возраста.')
+        parser.add_argument('--dry-run', action='store_true', help='Только вывести найденные файлы.')
+
+    def handle(self, *args, **options):
+        min_age = timedelta(hours=options['min_age_hours'])
+        found = 0
+        for directory, model, field_name in media_sources():
+            for chunk in iter_media_chunks(directory, options['chunk_size'], min_age):
+                orphans = find_orphans(chunk, model, field_name)
+                found += len(orphans)
+                if options['dry_run']:
+                    for path in orphans:
+                        self.stdout.write(path)
+                    continue
+                with transaction.atomic():
+                    tombstone_files(orphans)
+        action = 'найдено' if options['dry_run'] else 'отмечено к удалению'
+        self.stdout.write(self.style.SUCCESS(f'Файлов без ссылок {action}: {found}'))
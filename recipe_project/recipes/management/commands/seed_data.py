@@ -0,0 +1,208 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.roles import MODERATORS_GROUP
+from recipes.cache import invalidate_home_cache
+from recipes.counters import reconcile_counters
+from recipes.facets import rebuild_counts
+from recipes.images import generate_variants
+from recipes.ingredients import index_recipes
+from recipes.models import Category, Comment, Favorite, Recipe, Step
+from recipes.similar import build_neighbors
+from recipes.trending import rebuild_scores
+
+CATEGORIES = [
+    'Супы', 'Салаты', 'Выпечка', 'Десерты', 'Горячее', 'Закуски', 'Завтраки', 'Напитки',
+    'Соусы', 'Гарниры', 'Вегетарианское', 'Рыба', 'Мясо', 'Каши', 'Заготовки',
+]
+INGREDIENTS = [
+    'картофель', 'морковь', 'лук репчатый', 'чеснок', 'свёкла', 'капуста', 'помидоры', 'огурцы',
+    'перец болгарский', 'мука', 'сахар', 'соль', 'яйца', 'молоко', 'сливочное масло', 'сметана',
+    'сыр', 'творог', 'рис', 'гречка', 'говядина', 'свинина', 'курица', 'лосось', 'треска',
+    'укроп', 'петрушка', 'лимон', 'яблоки', 'мёд', 'грибы', 'фасоль', 'горох', 'оливковое масло',
+]
+DISHES = ['Борщ', 'Пирог', 'Салат', 'Рагу', 'Суп', 'Запеканка', 'Котлеты', 'Каша', 'Оладьи', 'Плов']
+ADJECTIVES = ['домашний', 'быстрый', 'бабушкин', 'праздничный', 'летний', 'сытный', 'постный', 'острый']
+WORDS = (
+    'взять нарезать обжарить добавить перемешать довести кипятить посолить поперчить оставить '
+    'настояться подавать горячим мелко крупно до золотистой корочки на среднем огне минут'
+).split()
+
+
+def zipf_weights(count, exponent=1.1):
+    """Веса с «длинным хвостом»: первые элементы выбираются намного чаще остальных."""
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def sentence(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize() + '.'
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, рецептами, шагами, изображениями, комментариями '
+        'и избранным для нагрузочного тестирования. Авторство и популярность распределены неравномерно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--moderators', type=int, default=3)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--max-steps', type=int, default=8)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--favorites', type=int, default=5000)
+        parser.add_argument('--images', type=int, default=10,
+                            help='Сколько разных изображений сгенерировать; рецепты используют их повторно.')
+        parser.add_argument('--image-ratio', type=float, default=0.7, help='Доля рецептов с изображением.')
+        parser.add_argument('--prefix', default='bench', help='Префикс имён создаваемых пользователей.')
+        parser.add_argument('--password', default='bench-pass')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить ранее созданных пользователей с этим префиксом вместе с их данными.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        User = get_user_model()
+        prefix = options['prefix']
+
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=f'{prefix}_').delete()
+            self.stdout.write(f'Удалено записей: {deleted}')
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Пользователи с префиксом «{prefix}_» уже есть; используйте --clear или --prefix.')
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+
+        images = self.create_images(rng, options['images'])
+        with transaction.atomic():
+            users, moderators = self.create_users(prefix, options)
+            categories = self.create_categories()
+            recipes = self.create_recipes(rng, users, moderators, categories, images, options)
+            self.create_steps(rng, recipes, options['max_steps'])
+            approved = [recipe for recipe in recipes if recipe.status == 'approved']
+            self.create_comments(rng, users + moderators, approved, options['comments'])
+            self.create_favorites(rng, users, approved, options['favorites'])
+
+            for start in range(0, len(recipes), self.batch_size):
+                batch = recipes[start:start + self.batch_size]
+                index_recipes(batch)
+                reconcile_counters(Recipe.objects.filter(pk__in=[recipe.pk for recipe in batch]))
+                build_neighbors([recipe.pk for recipe in batch])
+            rebuild_scores()
+            rebuild_counts()
+            invalidate_home_cache()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(users)}, модераторов {len(moderators)}, рецептов {len(recipes)}, '
+            f'комментариев {Comment.objects.filter(user__username__startswith=f"{prefix}_").count()}, '
+            f'избранного {Favorite.objects.filter(user__username__startswith=f"{prefix}_").count()}. '
+            f'Пароль пользователей: {options["password"]}'
+        ))
+
+    def create_images(self, rng, count):
+        """Генерирует изображения и их уменьшенные копии один раз; рецепты ссылаются на общие файлы."""
+        images = []
+        for i in range(count):
+            image = Image.new('RGB', (1600, 1067), tuple(rng.randint(40, 220) for _ in range(3)))
+            draw = ImageDraw.Draw(image)
+            for _ in range(12):
+                x, y = rng.randint(0, 1500), rng.randint(0, 960)
+                size = rng.randint(60, 400)
+                draw.ellipse((x, y, x + size, y + size), fill=tuple(rng.randint(0, 255) for _ in range(3)))
+            buffer = BytesIO()
+            image.save(buffer, 'JPEG', quality=85)
+            name = default_storage.save(f'recipes/seed_{i}.jpg', ContentFile(buffer.getvalue()))
+            images.append((name, generate_variants(name)))
+        return images
+
+    def create_users(self, prefix, options):
+        User = get_user_model()
+        password = make_password(options['password'])
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}_user_{i}', email=f'{prefix}_user_{i}@example.com', password=password)
+            for i in range(options['users'])
+        ], batch_size=self.batch_size)
+        moderators = User.objects.bulk_create([
+            User(username=f'{prefix}_moderator_{i}', email=f'{prefix}_moderator_{i}@example.com',
+                 password=password, is_staff=True)
+            for i in range(options['moderators'])
+        ], batch_size=self.batch_size)
+        group, _ = Group.objects.get_or_create(name=MODERATORS_GROUP)
+        group.user_set.add(*moderators)
+        return users, moderators
+
+    def create_categories(self):
+        existing = {category.name: category for category in Category.objects.filter(name__in=CATEGORIES)}
+        Category.objects.bulk_create([Category(name=name) for name in CATEGORIES if name not in existing])
+        return list(Category.objects.filter(name__in=CATEGORIES))
+
+    def create_recipes(self, rng, users, moderators, categories, images, options):
+        now = timezone.now()
+        count = options['recipes']
+        authors = rng.choices(users, weights=zipf_weights(len(users)), k=count)
+        recipe_categories = rng.choices(categories, weights=zipf_weights(len(categories), exponent=0.8), k=count)
+        recipes = []
+        for author, category in zip(authors, recipe_categories):
+            status = rng.choices(['approved', 'pending', 'rejected'], weights=[85, 10, 5])[0]
+            image, variants = rng.choice(images) if images and rng.random() < options['image_ratio'] else (None, [])
+            ingredients = rng.sample(INGREDIENTS, rng.randint(3, 10))
+            recipes.append(Recipe(
+                title=f'{rng.choice(DISHES)} {rng.choice(ADJECTIVES)}'[:100],
+                description=' '.join(sentence(rng, 6, 14) for _ in range(rng.randint(1, 4))),
+                ingredients='\n'.join(f'{name} — {rng.randint(1, 500)} г' for name in ingredients),
+                category=category,
+                author=author,
+                status=status,
+                moderator=rng.choice(moderators) if moderators and status != 'pending' else None,
+                moderated_at=now if status != 'pending' else None,
+                image=image,
+                image_variants=variants,
+            ))
+        recipes = Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+
+        # auto_now_add проставляет всем одно время; растягиваем публикации на год назад.
+        for recipe in recipes:
+            recipe.created_at = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        Recipe.objects.bulk_update(recipes, ['created_at'], batch_size=self.batch_size)
+        return recipes
+
+    def create_steps(self, rng, recipes, max_steps):
+        Step.objects.bulk_create((
+            Step(recipe=recipe, step_number=number, instruction=sentence(rng, 8, 24))
+            for recipe in recipes
+            for number in range(1, rng.randint(1, max(max_steps, 1)) + 1)
+        ), batch_size=self.batch_size)
+
+    def create_comments(self, rng, users, recipes, count):
+        if not recipes:
+            return
+        targets = rng.choices(recipes, weights=zipf_weights(len(recipes)), k=count)
+        authors = rng.choices(users, weights=zipf_weights(len(users), exponent=0.9), k=count)
+        Comment.objects.bulk_create((
+            Comment(recipe=recipe, user=user, text=sentence(rng, 3, 20))
+            for recipe, user in zip(targets, authors)
+        ), batch_size=self.batch_size)
+
+    def create_favorites(self, rng, users, recipes, count):
+        if not recipes:
+            return
+        targets = rng.choices(recipes, weights=zipf_weights(len(recipes)), k=count)
+        fans = rng.choices(users, weights=zipf_weights(len(users), exponent=0.9), k=count)
+        pairs = {(user.pk, recipe.pk) for user, recipe in zip(fans, targets)}
+        Favorite.objects.bulk_create(
+            [Favorite(user_id=user_id, recipe_id=recipe_id) for user_id, recipe_id in pairs],
+            batch_size=self.batch_size, ignore_conflicts=True,
+        )
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from recipes.media import sweep_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из хранилища файлы удалённых записей пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--grace-minutes', type=int, default=5,
+                            help='Не трогать отметки моложе указанного времени.')
+
+    def handle(self, *args, **options):
+        grace = timedelta(minutes=options['grace_minutes'])
+        total = 0
+        while True:
+            swept = sweep_tombstones(batch_size=options['batch_size'], grace=grace)
+            if not swept:
+                break
+            total += swept
+        self.stdout.write(self.style.SUCCESS(f'Обработано файлов: {total}'))
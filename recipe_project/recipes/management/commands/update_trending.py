@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cache import invalidate_home_cache
+from recipes.trending import decay_scores, flush_views, rebuild_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит накопленные просмотры в оценки популярности и приводит оценки к текущему моменту. '
+        'Запускайте по расписанию, например раз в 10 минут; --rebuild пересчитывает оценки с нуля.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Пересчитать по избранному и комментариям.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            updated = rebuild_scores()
+            self.stdout.write(f'Пересчитано оценок: {updated}')
+        views = flush_views(options['batch_size'])
+        decayed = decay_scores()
+        # Порядок на главной и в сортировке «Популярные сейчас» изменился.
+        invalidate_home_cache()
+        self.stdout.write(self.style.SUCCESS(f'Учтено просмотров: {views}, обновлено оценок: {decayed}'))
@@ -0,0 +1,101 @@
+import os
+import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .images import variant_names
+from .models import MediaTombstone, Recipe, Step
+
+VARIANT_RE = re.compile(r'^(?P<root>.+)_\d+w\.(webp|jpg)$')
+
+
+def media_sources():
+    """Каталоги MEDIA_ROOT и поля моделей, которые на них ссылаются."""
+    return (
+        ('recipes', Recipe, 'image'),
+        ('recipe_steps', Step, 'image'),
+        ('avatars', get_user_model(), 'avatar'),
+    )
+
+
+def image_files(name, variants):
+    """Оригинал и все его уменьшенные копии."""
+    return [name, *variant_names(name, variants or [])]
+
+
+def tombstone_files(paths):
+    """Отмечает файлы к удалению в текущей транзакции: при откате файлы останутся на месте."""
+    MediaTombstone.objects.bulk_create(MediaTombstone(path=path) for path in paths if path)
+
+
+def referenced_paths(paths):
+    """Возвращает пути из ``paths``, на которые всё ещё ссылается какая-либо запись."""
+    paths = list(paths)
+    referenced = set()
+    for _, model, field_name in media_sources():
+        referenced.update(
+            model.objects.filter(**{f'{field_name}__in': paths}).values_list(field_name, flat=True)
+        )
+    return referenced
+
+
+def sweep_tombstones(batch_size=500, grace=timedelta(minutes=5), storage=default_storage):
+    """Удаляет из хранилища одну пачку файлов, отмеченных к удалению. Возвращает размер пачки."""
+    with transaction.atomic():
+        batch = list(
+            MediaTombstone.objects.select_for_update(skip_locked=True)
+            .filter(created_at__lte=timezone.now() - grace)
+            .order_by('created_at', 'id')[:batch_size]
+        )
+        if not batch:
+            return 0
+        still_used = referenced_paths(tombstone.path for tombstone in batch)
+        for tombstone in batch:
+            if tombstone.path not in still_used:
+                storage.delete(tombstone.path)
+        MediaTombstone.objects.filter(pk__in=[tombstone.pk for tombstone in batch]).delete()
+    return len(batch)
+
+
+def iter_media_chunks(directory, chunk_size, min_age, storage=default_storage):
+    """Выдаёт файлы каталога пачками, пропуская свежие: их запись могла ещё не зафиксироваться."""
+    root = storage.path(directory)
+    if not os.path.isdir(root):
+        return
+    cutoff = (timezone.now() - min_age).timestamp()
+    chunk = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                chunk.append(f'{directory}/{entry.name}')
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def find_orphans(chunk, model, field_name):
+    """Находит в пачке файлы без ссылок из БД.
+
+    Уменьшенная копия считается нужной, пока используется её оригинал с тем же именем.
+    """
+    roots = {path: match['root'] for path in chunk if (match := VARIANT_RE.match(path))}
+    referenced = set(
+        model.objects.filter(**{f'{field_name}__in': chunk}).values_list(field_name, flat=True)
+    )
+    referenced_roots = set()
+    if roots:
+        pattern = r'^(%s)\.[^./]+$' % '|'.join(re.escape(root) for root in set(roots.values()))
+        referenced_roots = {
+            os.path.splitext(name)[0]
+            for name in model.objects.filter(**{f'{field_name}__regex': pattern}).values_list(field_name, flat=True)
+        }
+    return [
+        path for path in chunk
+        if path not in referenced and roots.get(path) not in referenced_roots
+    ]
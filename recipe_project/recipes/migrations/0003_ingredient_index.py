@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Ингредиент')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент',
+                'verbose_name_plural': 'Ингредиенты',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_index',
+            field=models.ManyToManyField(blank=True, related_name='recipes', to='recipes.ingredient', verbose_name='Индекс ингредиентов'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Comment = apps.get_model('recipes', 'Comment')
+    Favorite = apps.get_model('recipes', 'Favorite')
+
+    def count_of(model):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(recipe=OuterRef('pk'))
+                .order_by().values('recipe').annotate(total=Count('pk')).values('total')
+            ),
+            Value(0),
+        )
+
+    Recipe.objects.update(comment_count=count_of(Comment), favorite_count=count_of(Favorite))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_ingredient_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество добавлений в избранное'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Ширины уменьшенных копий'),
+        ),
+        migrations.AddField(
+            model_name='step',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Ширины уменьшенных копий'),
+        ),
+    ]
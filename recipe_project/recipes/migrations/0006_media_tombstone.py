@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, verbose_name='Путь к файлу')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата удаления записи')),
+            ],
+            options={
+                'verbose_name': 'Файл к удалению',
+                'verbose_name_plural': 'Файлы к удалению',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_media_tombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='claim_expires_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Бронь до'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_recipes', to=settings.AUTH_USER_MODEL, verbose_name='Взят в работу модератором'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='moderated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата модерации'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at', 'id'], name='recipe_pending_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('moderated_at__isnull', False)), fields=['moderated_at'], name='recipe_moderated_at_idx'),
+        ),
+    ]
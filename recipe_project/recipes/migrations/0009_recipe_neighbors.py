@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('source', models.CharField(choices=[('favorites', 'Общее избранное'), ('category', 'Та же категория')], max_length=10, verbose_name='Источник')),
+            ],
+            options={
+                'verbose_name': 'Похожий рецепт',
+                'verbose_name_plural': 'Похожие рецепты',
+                'ordering': ['recipe', 'rank'],
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Избранное изменено после расчёта похожих рецептов'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('favorites_changed_at__isnull', False)), fields=['favorites_changed_at'], name='recipe_favorites_changed_idx'),
+        ),
+        migrations.AddField(
+            model_name='recipeneighbor',
+            name='neighbor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Похожий рецепт'),
+        ),
+        migrations.AddField(
+            model_name='recipeneighbor',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recipeneighbor',
+            unique_together={('recipe', 'rank')},
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:54
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_neighbors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Момент, к которому приведена популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность сейчас'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('status', 'approved')), fields=['-trending_score', '-id'], name='recipe_trending_idx'),
+        ),
+    ]
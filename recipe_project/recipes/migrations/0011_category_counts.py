@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_category_counts(apps, schema_editor):
+    CategoryCount = apps.get_model('recipes', 'CategoryCount')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    approved = (
+        Recipe.objects.filter(status='approved', category__isnull=False)
+        .values('category').annotate(total=models.Count('pk')).order_by()
+    )
+    favorites = (
+        Favorite.objects.filter(recipe__status='approved', recipe__category__isnull=False)
+        .values('user', 'recipe__category').annotate(total=models.Count('pk')).order_by()
+    )
+    CategoryCount.objects.bulk_create(
+        [CategoryCount(category_id=row['category'], count=row['total']) for row in approved]
+        + [CategoryCount(category_id=row['recipe__category'], user_id=row['user'], count=row['total']) for row in favorites],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_trending'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counts', to='recipes.category', verbose_name='Категория')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Счётчик категории',
+                'verbose_name_plural': 'Счётчики категорий',
+                'indexes': [models.Index(condition=models.Q(('user__isnull', True)), fields=['-count'], name='category_count_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'category'), name='category_count_unique', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunPython(fill_category_counts, migrations.RunPython.noop),
+    ]
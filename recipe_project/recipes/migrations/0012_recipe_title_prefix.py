@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:00
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_category_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(django.db.models.functions.comparison.Cast('title', models.TextField())), name='text_pattern_ops'), condition=models.Q(('status', 'approved')), name='recipe_title_prefix_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_title_prefix'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['recipe', 'created_at', 'id'], name='comment_recipe_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-id'], name='favorite_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('status', 'approved')), fields=['-created_at', '-id'], name='recipe_approved_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('status', 'approved')), fields=['category', '-created_at', '-id'], name='recipe_category_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-created_at'], name='recipe_author_created_idx'),
+        ),
+    ]
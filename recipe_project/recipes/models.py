@@ -2,6 +2,12 @@ import os
 import uuid
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db.models.functions import Cast, Upper
+from django.utils import timezone
+
+SEARCH_CONFIG = 'russian'
 
 def recipe_image_path(instance, filename):
     ext = filename.split('.')[-1]
@@ -25,6 +31,18 @@ class Category(models.Model):
         return self.name
 
 
+class Ingredient(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name="Ингредиент")
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Ингредиент"
+        verbose_name_plural = "Ингредиенты"
+
+    def __str__(self):
+        return self.name
+
+
 class Recipe(models.Model):
     STATUS_CHOICES = [
         ('draft', 'Черновик'),
@@ -52,13 +70,95 @@ class Recipe(models.Model):
         blank=True,
         verbose_name="Комментарий модератора/Причина отклонения"
     )
+    moderated_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Дата модерации")
+    claimed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='claimed_recipes',
+        verbose_name="Взят в работу модератором"
+    )
+    claim_expires_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Бронь до")
     title = models.CharField(max_length=100, verbose_name="Название рецепта")
     description = models.TextField(verbose_name="Описание")
     ingredients = models.TextField(verbose_name="Ингредиенты")
+    ingredient_index = models.ManyToManyField(
+        Ingredient,
+        blank=True,
+        related_name='recipes',
+        verbose_name="Индекс ингредиентов"
+    )
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, verbose_name="Категория")
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name="Автор")
     image = models.ImageField(upload_to=recipe_image_path, blank=True, null=True, verbose_name="Изображение (опционально)")
+    image_variants = models.JSONField(default=list, blank=True, editable=False, verbose_name="Ширины уменьшенных копий")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+    comment_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество комментариев")
+    favorite_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество добавлений в избранное")
+    trending_score = models.FloatField(default=0, editable=False, verbose_name="Популярность сейчас")
+    trending_at = models.DateTimeField(
+        default=timezone.now, editable=False, verbose_name="Момент, к которому приведена популярность"
+    )
+    favorites_changed_at = models.DateTimeField(
+        null=True, blank=True, editable=False, verbose_name="Избранное изменено после расчёта похожих рецептов"
+    )
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+            + SearchVector('ingredients', weight='C', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        verbose_name="Поисковый документ"
+    )
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='recipe_search_vector_gin'),
+            # Главная и список рецептов: новые одобренные, в том числе внутри категории.
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(status='approved'),
+                name='recipe_approved_new_idx',
+            ),
+            models.Index(
+                fields=['category', '-created_at', '-id'],
+                condition=models.Q(status='approved'),
+                name='recipe_category_new_idx',
+            ),
+            models.Index(fields=['author', '-created_at'], name='recipe_author_created_idx'),
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(status='pending'),
+                name='recipe_pending_queue_idx',
+            ),
+            models.Index(fields=['status', 'updated_at'], name='recipe_status_updated_idx'),
+            models.Index(
+                fields=['moderated_at'],
+                condition=models.Q(moderated_at__isnull=False),
+                name='recipe_moderated_at_idx',
+            ),
+            models.Index(
+                fields=['-trending_score', '-id'],
+                condition=models.Q(status='approved'),
+                name='recipe_trending_idx',
+            ),
+            models.Index(
+                fields=['favorites_changed_at'],
+                condition=models.Q(favorites_changed_at__isnull=False),
+                name='recipe_favorites_changed_idx',
+            ),
+            # Выражение совпадает с тем, что строит title__istartswith: UPPER("title"::text) LIKE 'ПРЕФИКС%'.
+            models.Index(
+                OpClass(Upper(Cast('title', models.TextField())), name='text_pattern_ops'),
+                condition=models.Q(status='approved'),
+                name='recipe_title_prefix_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -74,6 +174,7 @@ class Step(models.Model):
     step_number = models.PositiveIntegerField(default=1, verbose_name="Номер шага")
     instruction = models.TextField(verbose_name="Инструкция")
     image = models.ImageField(upload_to=step_image_path, blank=True, null=True, verbose_name="Изображение (опционально)")
+    image_variants = models.JSONField(default=list, blank=True, editable=False, verbose_name="Ширины уменьшенных копий")
 
     class Meta:
         ordering = ['step_number']
@@ -93,6 +194,9 @@ class Comment(models.Model):
     class Meta:
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        indexes = [
+            models.Index(fields=['recipe', 'created_at', 'id'], name='comment_recipe_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.title}'
@@ -108,6 +212,70 @@ class Favorite(models.Model):
         unique_together = ('user', 'recipe')
         verbose_name = "Избранный рецепт"
         verbose_name_plural = "Избранные рецепты"
+        indexes = [
+            models.Index(fields=['user', '-id'], name='favorite_user_recent_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.title}'
+
+
+class CategoryCount(models.Model):
+    """Фасетные счётчики категорий: одобренные рецепты (``user`` пуст) и избранное пользователя."""
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='counts', verbose_name="Категория")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Пользователь"
+    )
+    count = models.PositiveIntegerField(default=0, verbose_name="Количество")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], nulls_distinct=False, name='category_count_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['-count'], condition=models.Q(user__isnull=True), name='category_count_top_idx'),
+        ]
+        verbose_name = "Счётчик категории"
+        verbose_name_plural = "Счётчики категорий"
+
+    def __str__(self):
+        return f'{self.category_id}/{self.user_id}: {self.count}'
+
+
+class RecipeNeighbor(models.Model):
+    SOURCE_CHOICES = [
+        ('favorites', 'Общее избранное'),
+        ('category', 'Та же категория'),
+    ]
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='neighbors', verbose_name="Рецепт")
+    neighbor = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='+', verbose_name="Похожий рецепт")
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+    score = models.FloatField(verbose_name="Сходство")
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, verbose_name="Источник")
+
+    class Meta:
+        ordering = ['recipe', 'rank']
+        unique_together = ('recipe', 'rank')
+        verbose_name = "Похожий рецепт"
+        verbose_name_plural = "Похожие рецепты"
+
+    def __str__(self):
+        return f'{self.recipe_id} -> {self.neighbor_id}'
+
+
+class MediaTombstone(models.Model):
+    path = models.CharField(max_length=255, verbose_name="Путь к файлу")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата удаления записи")
+
+    class Meta:
+        verbose_name = "Файл к удалению"
+        verbose_name_plural = "Файлы к удалению"
+
+    def __str__(self):
+        return self.path
@@ -0,0 +1,105 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .cache import bump_recipe_versions, invalidate_home_cache
+from .facets import recipes_changed
+from .models import Recipe
+
+DECISIONS = {
+    'approve': ('approved', 'Одобрено модератором через очередь модерации.'),
+    'reject': ('rejected', 'Отклонено модератором через очередь модерации.'),
+}
+
+
+def claimed_recipes(moderator):
+    """Рецепты, забронированные модератором и ещё не освобождённые по сроку."""
+    return Recipe.objects.filter(
+        status='pending', claimed_by=moderator, claim_expires_at__gte=timezone.now()
+    ).select_related('author', 'category').order_by('created_at', 'id')
+
+
+def claim_batch(moderator, size=None):
+    """Бронирует пачку ожидающих рецептов за модератором.
+
+    Строки выбираются ``FOR UPDATE SKIP LOCKED``: параллельные модераторы получают разные рецепты.
+    Бронь продлевается на ``MODERATION_LEASE_MINUTES``; просроченные брони можно забрать.
+    """
+    size = size or settings.MODERATION_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        held = Recipe.objects.filter(status='pending', claimed_by=moderator, claim_expires_at__gte=now).count()
+        pks = list(
+            Recipe.objects.filter(status='pending')
+            .filter(Q(claimed_by__isnull=True) | Q(claim_expires_at__lt=now))
+            .select_for_update(skip_locked=True)
+            .order_by('created_at', 'id')
+            .values_list('pk', flat=True)[:max(size - held, 0)]
+        )
+        expires = now + timedelta(minutes=settings.MODERATION_LEASE_MINUTES)
+        Recipe.objects.filter(
+            Q(pk__in=pks) | Q(status='pending', claimed_by=moderator, claim_expires_at__gte=now)
+        ).update(claimed_by=moderator, claim_expires_at=expires)
+    return claimed_recipes(moderator)
+
+
+def release_claims(moderator):
+    return Recipe.objects.filter(status='pending', claimed_by=moderator).update(claimed_by=None, claim_expires_at=None)
+
+
+def decide_batch(moderator, recipe_ids, decision, comment=''):
+    """Одобряет или отклоняет забронированные модератором рецепты одной транзакцией.
+
+    Рецепты с истёкшей или чужой бронью пропускаются. Возвращает число изменённых рецептов.
+    """
+    status, default_comment = DECISIONS[decision]
+    now = timezone.now()
+    with transaction.atomic():
+        pks = list(
+            Recipe.objects.select_for_update().filter(
+                pk__in=recipe_ids, status='pending', claimed_by=moderator, claim_expires_at__gte=now,
+            ).values_list('pk', flat=True)
+        )
+        changes = {
+            'status': status,
+            'moderator': moderator,
+            'moderator_comment': comment or default_comment,
+            'moderated_at': now,
+            'updated_at': now,
+            'claimed_by': None,
+            'claim_expires_at': None,
+        }
+        if status == 'approved':
+            # Одобренный рецепт получит список похожих при ближайшем refresh_neighbors.
+            changes['favorites_changed_at'] = now
+        updated = Recipe.objects.filter(pk__in=pks).update(**changes)
+        if updated:
+            if status == 'approved':
+                recipes_changed(pks)
+            invalidate_home_cache()
+            bump_recipe_versions(pks)
+    return updated
+
+
+def queue_stats():
+    """Глубина очереди, активные брони и пропускная способность модерации."""
+    now = timezone.now()
+    pending = Recipe.objects.filter(status='pending').aggregate(
+        depth=Count('pk'),
+        claimed=Count('pk', filter=Q(claimed_by__isnull=False, claim_expires_at__gte=now)),
+        oldest=Min('created_at'),
+    )
+    moderated = Recipe.objects.filter(moderated_at__gte=now - timedelta(hours=24)).aggregate(
+        last_hour=Count('pk', filter=Q(moderated_at__gte=now - timedelta(hours=1))),
+        last_day=Count('pk'),
+    )
+    return {
+        'depth': pending['depth'],
+        'claimed': pending['claimed'],
+        'oldest_pending_seconds': int((now - pending['oldest']).total_seconds()) if pending['oldest'] else 0,
+        'moderated_last_hour': moderated['last_hour'],
+        'moderated_last_day': moderated['last_day'],
+    }
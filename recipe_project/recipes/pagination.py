@@ -0,0 +1,161 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'recipes.pagination.cursor'
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    @property
+    def next_cursor(self):
+        if not self.has_next_page:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous_page:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], 'prev')
+
+
+class CursorPaginator:
+    """Keyset-пагинация: страница выбирается условием по ключу сортировки, без COUNT и OFFSET.
+
+    ``ordering`` — поля по убыванию, последнее поле должно быть уникальным (обычно ``id``).
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id')):
+        if not all(field.startswith('-') for field in ordering):
+            raise ValueError('CursorPaginator поддерживает только сортировку по убыванию.')
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [field[1:] for field in ordering]
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for field in self.fields:
+            value = obj
+            for part in field.split('__'):
+                value = getattr(value, part)
+            values.append(value.isoformat() if isinstance(value, datetime) else value)
+        return signing.dumps([direction, values], salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None, None
+        if direction not in ('next', 'prev') or len(values) != len(self.fields):
+            return None, None
+        return direction, values
+
+    def _keyset_filter(self, values, lookup):
+        condition = Q()
+        for i, field in enumerate(self.fields):
+            step = Q(**{f'{field}__{lookup}': values[i]})
+            for prev_field, prev_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{prev_field: prev_value})
+            condition |= step
+        return condition
+
+    def page(self, cursor=None):
+        direction, values = self.decode_cursor(cursor) if cursor else (None, None)
+        queryset = self.queryset.order_by(*self.ordering)
+        if direction == 'prev':
+            queryset = self.queryset.filter(self._keyset_filter(values, 'gt')).order_by(*self.fields)
+        elif direction == 'next':
+            queryset = queryset.filter(self._keyset_filter(values, 'lt'))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'prev':
+            rows.reverse()
+            return CursorPage(rows, self, has_next=True, has_previous=has_more)
+        return CursorPage(rows, self, has_next=has_more, has_previous=direction == 'next')
+
+
+def page_links(request, page_obj, on_each_side=2):
+    """Ограниченный набор ссылок пагинации для шаблонов и JSON-ответов.
+
+    Каждая ссылка — словарь ``{'label', 'query', 'current', 'gap'}``, где ``query`` — готовая
+    строка запроса с сохранёнными фильтрами.
+    """
+    if page_obj is None:
+        return []
+
+    def link(label, current=False, gap=False, **params):
+        query = request.GET.copy()
+        for key in ('page', 'cursor'):
+            query.pop(key, None)
+        query.update({key: value for key, value in params.items() if value is not None})
+        return {'label': str(label), 'query': query.urlencode(), 'current': current, 'gap': gap}
+
+    links = []
+    if isinstance(page_obj, CursorPage):
+        if page_obj.has_previous():
+            links.append(link('« Первая'))
+            links.append(link('‹ Предыдущая', cursor=page_obj.previous_cursor))
+        if page_obj.has_next():
+            links.append(link('Следующая ›', cursor=page_obj.next_cursor))
+        return links
+
+    paginator = page_obj.paginator
+    if page_obj.has_previous():
+        links.append(link('« Предыдущая', page=page_obj.previous_page_number()))
+    for number in paginator.get_elided_page_range(page_obj.number, on_each_side=on_each_side, on_ends=1):
+        if number == paginator.ELLIPSIS:
+            links.append(link(number, gap=True))
+        else:
+            links.append(link(number, current=number == page_obj.number, page=number))
+    if page_obj.has_next():
+        links.append(link('Следующая »', page=page_obj.next_page_number()))
+    return links
+
+
+class CursorPaginationMixin:
+    """Подключает keyset-пагинацию к ListView, если ``RECIPE_PAGINATION = 'cursor'``.
+
+    Выдача, отсортированная по релевантности поиска, остаётся на обычной пагинации.
+    """
+    cursor_ordering = ('-created_at', '-id')
+
+    def use_cursor_pagination(self):
+        return settings.RECIPE_PAGINATION == 'cursor' and not self.request.GET.get('q')
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        page = paginator.page(self.request.GET.get('cursor'))
+        return paginator, page, page.object_list, True
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page_links'] = page_links(self.request, context.get('page_obj'))
+        return context
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+from .models import SEARCH_CONFIG
+
+
+def search_recipes(queryset, search_query, prefix=''):
+    """Фильтрует queryset по поисковому запросу и сортирует по релевантности.
+
+    ``prefix`` задаёт путь до рецепта, например ``'recipe__'`` для избранного.
+    """
+    if not settings.RECIPE_FULLTEXT_SEARCH:
+        return queryset.filter(**{f'{prefix}title__icontains': search_query})
+
+    query = SearchQuery(search_query, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(
+        **{f'{prefix}search_vector': query}
+    ).annotate(
+        search_rank=SearchRank(F(f'{prefix}search_vector'), query)
+    ).order_by('-search_rank', '-id')
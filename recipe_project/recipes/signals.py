@@ -1,13 +1,327 @@
-from django.db.models.signals import post_delete
+from collections import Counter, defaultdict
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.conf import settings
 from django.dispatch import receiver
-from .models import Recipe, Step
+from django.utils import timezone
+from .models import Recipe, Step, Comment, Favorite, Category, RecipeNeighbor
+from .ingredients import index_recipe_ingredients
+from .counters import change_counter, remove_counter_events
+from .facets import favorite_changed, favorites_removed, recipe_deltas, shift_counts
+from .cache import invalidate_home_cache, bump_recipe_versions
+from .conditional import touch_recipes
+from .images import image_variants_ready, schedule_variants
+from .media import image_files, tombstone_files
+
+
+@receiver(post_save, sender=Recipe)
+def update_ingredient_index(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields is not None and 'ingredients' not in update_fields):
+        return
+    index_recipe_ingredients(instance)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(instance.recipe_id, 'comment_count', 1)
+
+
+class CascadeDelete:
+    """Одно каскадное удаление: рецепты, удаляемые целиком, и события, вычитаемые из счётчиков разом.
+
+    Хранится на объекте или QuerySet, с которого началось удаление (аргумент ``origin`` сигналов).
+    """
+
+    def __init__(self):
+        self.recipe_ids = set()
+        self.events = defaultdict(lambda: defaultdict(list))
+        self.favorites = []
+
+    @classmethod
+    def of(cls, origin):
+        state = getattr(origin, '_cascade_delete', None)
+        if state is None:
+            state = origin._cascade_delete = cls()
+        return state
+
+
+def is_user_cascade(origin):
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model._meta.label == settings.AUTH_USER_MODEL
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_deleted_recipe(sender, instance, origin=None, **kwargs):
+    # pre_delete приходит для всех объектов каскада раньше, чем удаляются комментарии и избранное.
+    if origin is not None:
+        CascadeDelete.of(origin).recipe_ids.add(instance.pk)
+    if instance._loaded_status == 'approved':
+        # Счётчики категории и избранного всех, кто добавил рецепт, — пока избранное ещё в базе.
+        shift_counts(recipe_deltas([instance.pk], instance.__dict__.get('category_id'), -1))
+
+
+def remove_counter_event(instance, field, origin):
+    """Вычитает удалённый комментарий или избранное из счётчика; ``False``, если рецепт удаляется сам."""
+    if origin is None:
+        change_counter(instance.recipe_id, field, -1, instance.created_at)
+        return True
+    state = CascadeDelete.of(origin)
+    if instance.recipe_id in state.recipe_ids:
+        return False
+    if is_user_cascade(origin):
+        # Удаление пользователя: события копятся и вычитаются одним UPDATE на рецепт в конце каскада.
+        state.events[instance.recipe_id][field].append(instance.created_at)
+    else:
+        change_counter(instance.recipe_id, field, -1, instance.created_at)
+    return True
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def apply_cascade_counters(sender, instance, origin=None, **kwargs):
+    # Пользователь удаляется после своих комментариев и избранного, так что события уже собраны.
+    state = getattr(origin, '_cascade_delete', None)
+    if state is not None:
+        remove_counter_events(state.events)
+        favorites_removed(state.favorites)
+        state.events.clear()
+        state.favorites.clear()
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, origin=None, **kwargs):
+    remove_counter_event(instance, 'comment_count', origin)
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorite_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(instance.recipe_id, 'favorite_count', 1)
+        favorite_changed(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorite_count(sender, instance, origin=None, **kwargs):
+    if not remove_counter_event(instance, 'favorite_count', origin):
+        return  # счётчики избранного уже сдвинуты в pre_delete рецепта
+    if origin is not None and is_user_cascade(origin):
+        CascadeDelete.of(origin).favorites.append((instance.recipe_id, instance.user_id))
+    else:
+        favorite_changed(instance, -1)
+
+
+@receiver(post_init, sender=Recipe)
+def remember_recipe_status(sender, instance, **kwargs):
+    # Через __dict__, чтобы отложенное (.only/.defer) поле не загружалось отдельным запросом.
+    instance._loaded_status = instance.__dict__.get('status')
+    instance._loaded_title = instance.__dict__.get('title')
+    instance._loaded_facet = (instance._loaded_status == 'approved', instance.__dict__.get('category_id'))
+
+
+@receiver(post_save, sender=Recipe)
+def update_category_counts_on_recipe_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # post_init новой записи видит переданный статус, а в счётчиках её ещё нет.
+    was_approved, old_category = (False, None) if created else instance._loaded_facet
+    facet = (instance.status == 'approved', instance.category_id)
+    instance._loaded_facet = facet
+    if (was_approved, old_category) == facet:
+        return
+    deltas = Counter()
+    if was_approved:
+        deltas.update(recipe_deltas([instance.pk], old_category, -1))
+    if facet[0]:
+        deltas.update(recipe_deltas([instance.pk], instance.category_id, 1, favorites=not created))
+    shift_counts(deltas)
+
+
+@receiver(pre_save, sender=Recipe)
+def mark_approved_recipe_for_neighbors(sender, instance, raw=False, **kwargs):
+    # По этой отметке refresh_neighbors строит список похожих для только что одобренного рецепта.
+    if not raw and instance.status == 'approved' and (instance._state.adding or instance._loaded_status != 'approved'):
+        instance.favorites_changed_at = timezone.now()
+
+
+def bump_neighbor_lists(recipe_id):
+    # Название соседа выводится в закэшированном списке похожих рецептов, а снятые соседи из него выпадают.
+    bump_recipe_versions(RecipeNeighbor.objects.filter(neighbor_id=recipe_id).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def bump_neighbor_lists_on_recipe_save(sender, instance, created, raw=False, **kwargs):
+    title = instance.__dict__.get('title')
+    changed = instance.status != instance._loaded_status or title != instance._loaded_title
+    if not created and not raw and changed and 'approved' in (instance.status, instance._loaded_status):
+        bump_neighbor_lists(instance.pk)
+    instance._loaded_title = title
+
+
+@receiver(pre_delete, sender=Recipe)
+def bump_neighbor_lists_on_recipe_delete(sender, instance, **kwargs):
+    # До удаления: строки RecipeNeighbor уходят каскадом вместе с рецептом.
+    bump_neighbor_lists(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_home_on_recipe_save(sender, instance, **kwargs):
+    if 'approved' in (instance.status, instance._loaded_status):
+        invalidate_home_cache()
+    instance._loaded_status = instance.status
+
 
 @receiver(post_delete, sender=Recipe)
-def delete_recipe_image(sender, instance, **kwargs):
-    if instance.image:
-        instance.image.delete(save=False)
+def invalidate_home_on_recipe_delete(sender, instance, **kwargs):
+    if instance._loaded_status == 'approved':
+        # Счётчики категорий сдвинуты в remember_deleted_recipe.
+        invalidate_home_cache()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_home_on_category_change(sender, instance, **kwargs):
+    invalidate_home_cache()
+
+
+def refresh_category_recipes(category_id):
+    # Название категории выводится в закэшированной шапке страницы рецепта.
+    recipe_ids = list(Recipe.objects.filter(category_id=category_id).values_list('pk', flat=True))
+    touch_recipes(recipe_ids)
+    bump_recipe_versions(recipe_ids)
+
+
+@receiver(post_save, sender=Category)
+def refresh_recipes_on_category_save(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        refresh_category_recipes(instance.pk)
+
+
+@receiver(pre_delete, sender=Category)
+def refresh_recipes_on_category_delete(sender, instance, **kwargs):
+    # До удаления: SET_NULL отвязывает рецепты раньше, чем придёт post_delete.
+    refresh_category_recipes(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def bump_version_on_recipe_change(sender, instance, **kwargs):
+    bump_recipe_versions([instance.pk])
+
+
+@receiver(post_save, sender=Step)
+@receiver(post_delete, sender=Step)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_version_on_recipe_part_change(sender, instance, **kwargs):
+    bump_recipe_versions([instance.recipe_id])
+
+
+@receiver(post_save, sender=Step)
+def touch_recipe_on_step_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_recipes([instance.recipe_id])
+
 
 @receiver(post_delete, sender=Step)
-def delete_step_image(sender, instance, **kwargs):
-    if instance.image:
-        instance.image.delete(save=False)
+def touch_recipe_on_step_delete(sender, instance, origin=None, **kwargs):
+    # Пакетное удаление шагов идёт из формы рецепта, которая сохраняет и сам рецепт,
+    # а при каскадном удалении рецепта обновлять уже нечего.
+    if isinstance(origin, Step):
+        touch_recipes([instance.recipe_id])
+
+
+@receiver(post_save, sender=Comment)
+def touch_recipe_on_comment_edit(sender, instance, created, raw=False, **kwargs):
+    # Новый и удалённый комментарий сдвигают updated_at вместе со счётчиком.
+    if not created and not raw:
+        touch_recipes([instance.recipe_id])
+
+
+def bump_versions_for_users(user_ids):
+    recipe_ids = set(Recipe.objects.filter(author_id__in=user_ids).values_list('pk', flat=True))
+    recipe_ids.update(Comment.objects.filter(user_id__in=user_ids).values_list('recipe_id', flat=True))
+    bump_recipe_versions(recipe_ids)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def bump_versions_on_user_change(sender, instance, created, update_fields=None, **kwargs):
+    # Имя и аватар пользователя выводятся в закэшированных шапке и комментариях.
+    if created or (update_fields is not None and not {'username', 'avatar'} & set(update_fields)):
+        return
+    bump_versions_for_users([instance.pk])
+    # Имя автора выводится на главной и в списке рецептов: сдвигаем их версию и время изменения.
+    approved_ids = list(Recipe.objects.filter(author_id=instance.pk, status='approved').values_list('pk', flat=True))
+    if approved_ids:
+        touch_recipes(approved_ids)
+        invalidate_home_cache()
+
+
+IMAGE_FIELDS = {
+    'recipes.Recipe': ('image', 'image_variants'),
+    'recipes.Step': ('image', 'image_variants'),
+    settings.AUTH_USER_MODEL: ('avatar', 'avatar_variants'),
+}
+
+
+def image_fields(instance):
+    return IMAGE_FIELDS[instance._meta.label]
+
+
+def remember_image_name(sender, instance, **kwargs):
+    field_name, _ = image_fields(instance)
+    value = instance.__dict__.get(field_name)
+    instance._loaded_image_name = getattr(value, 'name', value)
+
+
+def reset_image_variants(sender, instance, update_fields=None, **kwargs):
+    field_name, variants_field = image_fields(instance)
+    if instance._state.adding:
+        # post_init новой записи видит уже переданный файл, а не сохранённый.
+        instance._loaded_image_name = None
+    if update_fields is not None and field_name not in update_fields:
+        instance._image_changed = False
+        return
+    instance._image_changed = getattr(instance, field_name).name != instance._loaded_image_name
+    if instance._image_changed:
+        instance._replaced_files = image_files(instance._loaded_image_name, getattr(instance, variants_field))
+        setattr(instance, variants_field, [])
+
+
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    field_name, variants_field = image_fields(instance)
+    if not raw and instance._image_changed:
+        if instance._loaded_image_name:
+            tombstone_files(instance._replaced_files)
+        if getattr(instance, field_name):
+            schedule_variants(instance, field_name, variants_field)
+    instance._loaded_image_name = getattr(instance, field_name).name
+
+
+def tombstone_deleted_image(sender, instance, **kwargs):
+    field_name, variants_field = image_fields(instance)
+    image = getattr(instance, field_name)
+    if image:
+        tombstone_files(image_files(image.name, getattr(instance, variants_field)))
+
+
+for image_sender in IMAGE_FIELDS:
+    post_init.connect(remember_image_name, sender=image_sender, dispatch_uid=f'remember_image_name:{image_sender}')
+    pre_save.connect(reset_image_variants, sender=image_sender, dispatch_uid=f'reset_image_variants:{image_sender}')
+    post_save.connect(generate_image_variants, sender=image_sender, dispatch_uid=f'generate_image_variants:{image_sender}')
+    post_delete.connect(tombstone_deleted_image, sender=image_sender, dispatch_uid=f'tombstone_deleted_image:{image_sender}')
+
+
+@receiver(image_variants_ready)
+def refresh_cache_on_image_variants(sender, pks, **kwargs):
+    if sender is Recipe:
+        touch_recipes(pks)
+        bump_recipe_versions(pks)
+        if Recipe.objects.filter(pk__in=pks, status='approved').exists():
+            invalidate_home_cache()
+    elif sender is Step:
+        recipe_ids = set(Step.objects.filter(pk__in=pks).values_list('recipe_id', flat=True))
+        touch_recipes(recipe_ids)
+        bump_recipe_versions(recipe_ids)
+    else:
+        bump_versions_for_users(pks)
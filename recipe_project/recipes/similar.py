@@ -0,0 +1,149 @@
+import heapq
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .cache import bump_recipe_versions
+from .models import Favorite, Recipe, RecipeNeighbor
+
+
+def co_favorite_counts(recipe_ids):
+    """Для одобренных рецептов из ``recipe_ids`` возвращает соседей и число общих пользователей.
+
+    Это произведение разреженной матрицы «рецепт × пользователь» на транспонированную: самосоединение
+    ``Favorite`` по пользователю с GROUP BY считается целиком в базе. Строки —
+    ``(рецепт, сосед, общих, в избранном у рецепта, в избранном у соседа)``.
+    """
+    return (
+        Favorite.objects.filter(recipe_id__in=recipe_ids, recipe__status='approved')
+        .annotate(
+            neighbor_id=F('user__favorite__recipe_id'),
+            neighbor_status=F('user__favorite__recipe__status'),
+            neighbor_favorites=F('user__favorite__recipe__favorite_count'),
+        )
+        .filter(neighbor_status='approved')
+        .exclude(neighbor_id=F('recipe_id'))
+        .values('recipe_id', 'neighbor_id', 'recipe__favorite_count', 'neighbor_favorites')
+        .annotate(common=Count('pk'))
+        .order_by()
+        .values_list('recipe_id', 'neighbor_id', 'common', 'recipe__favorite_count', 'neighbor_favorites')
+    )
+
+
+def category_candidates(category_ids, limit):
+    """Самые популярные одобренные рецепты каждой категории, по ``limit`` штук, одним запросом."""
+    rows = (
+        Recipe.objects.filter(status='approved', category_id__in=category_ids)
+        .annotate(position=Window(
+            RowNumber(),
+            partition_by=F('category_id'),
+            order_by=[F('favorite_count').desc(), F('created_at').desc(), F('pk').desc()],
+        ))
+        .filter(position__lte=limit)
+        .order_by('category_id', 'position')
+        .values_list('category_id', 'pk')
+    )
+    candidates = defaultdict(list)
+    for category_id, recipe_id in rows:
+        candidates[category_id].append(recipe_id)
+    return candidates
+
+
+def build_neighbors(recipe_ids, k=None):
+    """Пересчитывает списки похожих рецептов для ``recipe_ids``.
+
+    Сходство — косинусная мера по общему избранному. Если соседей по избранному меньше ``k``
+    (новый рецепт, «холодный старт»), список дополняется популярными рецептами той же категории.
+    Возвращает число одобренных рецептов, для которых построены списки.
+    """
+    k = k or settings.SIMILAR_RECIPES_COUNT
+    recipe_ids = list(recipe_ids)
+    recipes = dict(Recipe.objects.filter(pk__in=recipe_ids, status='approved').values_list('pk', 'category_id'))
+
+    scored = defaultdict(list)
+    for recipe_id, neighbor_id, common, recipe_favorites, neighbor_favorites in co_favorite_counts(list(recipes)):
+        # Счётчики могут отставать от таблицы, поэтому не даём мере превысить единицу.
+        norm = math.sqrt(max(recipe_favorites, common) * max(neighbor_favorites, common))
+        scored[recipe_id].append((common / norm, neighbor_id))
+
+    short = {category_id for recipe_id, category_id in recipes.items() if category_id and len(scored[recipe_id]) < k}
+    fallback = category_candidates(short, 2 * k) if short else {}
+
+    rows = []
+    for recipe_id, category_id in recipes.items():
+        top = heapq.nlargest(k, scored[recipe_id], key=lambda item: (item[0], -item[1]))
+        chosen = [(neighbor_id, score, 'favorites') for score, neighbor_id in top]
+        taken = {recipe_id, *(neighbor_id for neighbor_id, _, _ in chosen)}
+        for neighbor_id in fallback.get(category_id, []):
+            if len(chosen) >= k:
+                break
+            if neighbor_id not in taken:
+                chosen.append((neighbor_id, 0.0, 'category'))
+                taken.add(neighbor_id)
+        rows.extend(
+            RecipeNeighbor(recipe_id=recipe_id, neighbor_id=neighbor_id, rank=rank, score=score, source=source)
+            for rank, (neighbor_id, score, source) in enumerate(chosen, start=1)
+        )
+
+    with transaction.atomic():
+        RecipeNeighbor.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeNeighbor.objects.bulk_create(rows, batch_size=1000)
+        # Список похожих входит в кэшированный фрагмент страницы рецепта.
+        bump_recipe_versions(recipe_ids)
+    return len(recipes)
+
+
+def _build_in_batches(recipe_ids, k, batch_size):
+    recipe_ids = sorted(recipe_ids)
+    built = 0
+    for start in range(0, len(recipe_ids), batch_size):
+        built += build_neighbors(recipe_ids[start:start + batch_size], k)
+    return built
+
+
+def rebuild_neighbors(k=None, batch_size=500):
+    """Полный пересчёт похожих рецептов для всех одобренных рецептов."""
+    started = timezone.now()
+    RecipeNeighbor.objects.exclude(recipe__status='approved').delete()
+    recipe_ids = Recipe.objects.filter(status='approved').values_list('pk', flat=True)
+    built = _build_in_batches(recipe_ids, k, batch_size)
+    Recipe.objects.filter(favorites_changed_at__lte=started).update(favorites_changed_at=None)
+    return built
+
+
+def refresh_neighbors(k=None, batch_size=500):
+    """Инкрементальный пересчёт после изменений избранного.
+
+    Пересчитываются рецепты с отметкой ``favorites_changed_at``, рецепты, которые их пользователи
+    тоже добавили в избранное (могли появиться в списке), и рецепты, в чьих списках они уже стоят
+    (могли выпасть). Отметку ставит и одобрение рецепта, так что новые рецепты получают список
+    при ближайшем запуске, а рецепты без соседей не пересчитываются каждый раз. Отметка снимается,
+    только если избранное не менялось после начала пересчёта.
+    """
+    started = timezone.now()
+    changed = list(Recipe.objects.filter(favorites_changed_at__isnull=False).values_list('pk', flat=True))
+    affected = set(changed)
+    if changed:
+        affected.update(
+            Favorite.objects.filter(user__favorite__recipe_id__in=changed)
+            .order_by().values_list('recipe_id', flat=True).distinct()
+        )
+        affected.update(RecipeNeighbor.objects.filter(neighbor_id__in=changed).values_list('recipe_id', flat=True))
+    _build_in_batches(affected, k, batch_size)
+    Recipe.objects.filter(pk__in=changed, favorites_changed_at__lte=started).update(favorites_changed_at=None)
+    return len(affected)
+
+
+def similar_recipes(recipe_id, limit=None):
+    """Похожие рецепты одним запросом по индексу ``(recipe_id, rank)``; элементы — ``RecipeNeighbor``."""
+    return (
+        RecipeNeighbor.objects.filter(recipe_id=recipe_id, neighbor__status='approved')
+        .select_related('neighbor')
+        .defer('neighbor__search_vector')
+        .order_by('rank')[:limit or settings.SIMILAR_RECIPES_COUNT]
+    )
@@ -0,0 +1,121 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery
+from django.db.models import BooleanField, Case, Q, Value, When
+from django.urls import reverse
+
+from .cache import home_cache_version
+from .facets import categories_with_counts
+from .models import SEARCH_CONFIG, Recipe
+
+WORD_RE = re.compile(r'\w+')
+
+
+class PrefixCache:
+    """LRU-кэш подсказок в памяти процесса; записи живут не дольше ``ttl`` секунд."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+suggestion_cache = PrefixCache(settings.SUGGEST_CACHE_SIZE, settings.SUGGEST_CACHE_SECONDS)
+
+
+def normalize_prefix(value):
+    return ' '.join(value.lower().split())[:settings.SUGGEST_MAX_LENGTH]
+
+
+def word_prefix_query(prefix):
+    """Запрос ``слово:*A & ...``: начала слов в названии по GIN-индексу ``search_vector``."""
+    words = WORD_RE.findall(prefix)
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f'{word}:*A' for word in words), config=SEARCH_CONFIG, search_type='raw')
+
+
+def recipe_suggestions(prefix, limit):
+    """Одобренные рецепты, чьё название начинается с ``prefix`` или содержит слова с этими началами.
+
+    Начало названия ищется по индексу ``recipe_title_prefix_idx``, начала слов — по GIN-индексу
+    полнотекстового поиска; база объединяет оба индекса в одном запросе. Совпадения с начала
+    названия идут первыми, дальше — по числу добавлений в избранное.
+    """
+    title_match = Q(title__istartswith=prefix)
+    condition = title_match
+    query = word_prefix_query(prefix) if settings.RECIPE_FULLTEXT_SEARCH else None
+    if query is not None:
+        condition |= Q(search_vector=query)
+    return (
+        Recipe.objects.filter(condition, status='approved')
+        .annotate(title_match=Case(When(title_match, then=Value(True)), default=Value(False),
+                                   output_field=BooleanField()))
+        .order_by('-title_match', '-favorite_count', '-id')
+        .values_list('id', 'title')[:limit]
+    )
+
+
+def category_suggestions(prefix, limit):
+    return (
+        categories_with_counts().filter(name__istartswith=prefix, recipe_count__gt=0)
+        .order_by('-recipe_count', 'name').values_list('id', 'name', 'recipe_count')[:limit]
+    )
+
+
+def suggest(value):
+    """Подсказки для строки поиска: рецепты и категории, с адресами страниц.
+
+    Ответы для горячих префиксов берутся из ``suggestion_cache``. Ключ включает версию данных
+    главной страницы, которая меняется при одобрении и снятии рецептов, поэтому подсказки
+    обновляются вместе с ней, а не только по истечении ``SUGGEST_CACHE_SECONDS``.
+    """
+    prefix = normalize_prefix(value)
+    if len(prefix) < settings.SUGGEST_MIN_LENGTH:
+        return {'query': prefix, 'recipes': [], 'categories': []}
+    key = (home_cache_version(), prefix)
+    data = suggestion_cache.get(key)
+    if data is None:
+        limit = settings.SUGGEST_LIMIT
+        recipe_list_url = reverse('recipe_list')
+        data = {
+            'query': prefix,
+            'recipes': [
+                {'id': pk, 'title': title, 'url': reverse('recipe_detail', kwargs={'pk': pk})}
+                for pk, title in recipe_suggestions(prefix, limit)
+            ],
+            'categories': [
+                {'id': pk, 'name': name, 'recipe_count': count, 'url': f'{recipe_list_url}?category={pk}'}
+                for pk, name, count in category_suggestions(prefix, limit)
+            ],
+        }
+        suggestion_cache.set(key, data)
+    return data
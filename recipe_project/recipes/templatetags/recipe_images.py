@@ -0,0 +1,35 @@
+from django import template
+from django.utils.html import format_html
+
+from recipes.images import variant_name
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, variants=None, alt='', sizes='100vw', css_class='', width=None):
+    """Выводит ``<picture>`` с WebP/JPEG-вариантами изображения и ленивой загрузкой.
+
+    Пока варианты не созданы, выводится исходный файл.
+    """
+    if not image:
+        return ''
+    attrs = format_html(' class="{}"', css_class) if css_class else ''
+    if width:
+        attrs += format_html(' width="{}"', width)
+    if not variants:
+        return format_html('<img src="{}" alt="{}"{} loading="lazy" decoding="async">', image.url, alt, attrs)
+
+    def srcset(extension):
+        return ', '.join(
+            f'{image.storage.url(variant_name(image.name, variant, extension))} {variant}w' for variant in variants
+        )
+
+    fallback = image.storage.url(variant_name(image.name, variants[-1], 'jpg'))
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}"{} loading="lazy" decoding="async">'
+        '</picture>',
+        srcset('webp'), sizes, fallback, srcset('jpg'), sizes, alt, attrs,
+    )
@@ -1,3 +1,1396 @@
-from django.test import TestCase
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+
+from accounts.roles import get_roles
+from recipe_project.db_metrics import connection_metrics
+from recipe_project.db_router import PrimaryReplicaRouter, routing_scope, use_primary
+from recipe_project.middleware import QueryBudgetExceeded, normalize_sql
+from recipe_project.urls import urlpatterns as root_urlpatterns
+from .admin import RecipeAdmin
+from .benchmark import resolve_users, sample_kwargs
+from .cache import get_home_data, home_cache_version, recipe_cache_version, recipe_commenter_ids
+from .counters import change_counter, reconcile_counters
+from .explain import check_url, explain, full_scans, view_urls
+from .images import generate_variants, variant_names
+from .facets import categories_with_counts, rebuild_counts
+from .ingredients import normalize_ingredient, parse_ingredients, rank_by_ingredients
+from .media import find_orphans, iter_media_chunks, sweep_tombstones, tombstone_files
+from .models import Category, CategoryCount, Comment, Favorite, MediaTombstone, Recipe, RecipeNeighbor, Step
+from .moderation import claim_batch, decide_batch, release_claims
+from .pagination import CURSOR_SALT, CursorPaginator, page_links
+from .search import search_recipes
+from .similar import rebuild_neighbors, refresh_neighbors
+from .suggest import suggestion_cache
+from .transfer import import_ndjson
+from .trending import decay_scores, flush_views, rebuild_scores, record_view, trending_recipes, view_key
+from .views import AsyncRecipeDetailView, AsyncRecipeListView, async_home
+
+User = get_user_model()
+
+
+class RecipeDetailQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'pass')
+        category = Category.objects.create(name='Супы')
+        cls.recipe = Recipe.objects.create(
+            title='Борщ', description='Красный суп', ingredients='свёкла\nкапуста',
+            category=category, author=cls.author, status='approved',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def add_steps_and_comments(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            Step.objects.bulk_create(
+                Step(recipe=self.recipe, step_number=i, instruction=f'Шаг {i}') for i in range(1, count + 1)
+            )
+            for i in range(count):
+                user = User.objects.create_user(f'commenter{Comment.objects.count()}')
+                Comment.objects.create(recipe=self.recipe, user=user, text=f'Комментарий {i}')
+
+    def get_detail(self):
+        return self.client.get(reverse('recipe_detail', kwargs={'pk': self.recipe.pk}))
+
+    def test_anonymous_query_count_is_constant(self):
+        # валидатор, рецепт с автором и категорией, шаги, похожие рецепты, комментарии с пользователями
+        # (холодный кэш)
+        self.add_steps_and_comments(1)
+        with self.assertNumQueries(5):
+            self.get_detail()
+        self.add_steps_and_comments(10)
+        with self.assertNumQueries(5):
+            response = self.get_detail()
+        self.assertContains(response, 'Комментарий 9')
+
+    def test_cached_fragments_skip_steps_and_comments(self):
+        self.add_steps_and_comments(5)
+        self.get_detail()
+        with self.assertNumQueries(2):
+            response = self.get_detail()
+        self.assertContains(response, 'Комментарий 4')
+
+    def test_comment_delete_links_follow_viewer(self):
+        self.add_steps_and_comments(1)
+        comment = Comment.objects.get()
+        delete_url = reverse('comment_delete', kwargs={'pk': comment.pk})
+        self.assertNotContains(self.get_detail(), delete_url)
+        self.client.force_login(self.reader)
+        self.assertNotContains(self.get_detail(), delete_url)
+        self.client.force_login(comment.user)
+        self.assertContains(self.get_detail(), delete_url)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertContains(self.get_detail(), delete_url)
+
+    def test_authenticated_query_count_is_constant(self):
+        self.client.force_login(self.reader)
+        get_roles(self.reader)
+        # + сессия, пользователь, проверка избранного и авторы комментариев; роли берутся из кэша
+        self.add_steps_and_comments(1)
+        with self.assertNumQueries(9):
+            self.get_detail()
+        self.add_steps_and_comments(10)
+        with self.assertNumQueries(9):
+            self.get_detail()
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'recipe_project.middleware.QueryInstrumentationMiddleware'})
+@override_settings(QUERY_INSTRUMENTATION_LOG='')
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', 'author@example.com', 'pass')
+        category = Category.objects.create(name='Супы')
+        Recipe.objects.bulk_create(
+            Recipe(title=f'Суп {i}', description='Суп', ingredients='вода', category=category,
+                   author=author, status='approved')
+            for i in range(5)
+        )
+
+    @override_settings(QUERY_BUDGETS={'recipe_list': 4}, QUERY_BUDGET_STRICT=True)
+    def test_list_fits_budget(self):
+        self.assertEqual(self.client.get(reverse('recipe_list')).status_code, 200)
+
+    @override_settings(QUERY_BUDGETS={'recipe_list': 1}, QUERY_BUDGET_STRICT=True)
+    def test_strict_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('recipe_list'))
+
+    @override_settings(QUERY_BUDGETS={'recipe_list': 1}, QUERY_BUDGET_STRICT=False)
+    def test_budget_overrun_is_logged(self):
+        with self.assertLogs('recipe_project.middleware', 'WARNING') as logs:
+            self.client.get(reverse('recipe_list'))
+        self.assertIn('recipe_list', logs.output[0])
+
+    @override_settings(QUERY_BUDGETS={'recipe_list': 1}, QUERY_BUDGET_STRICT=True)
+    async def test_async_view_queries_are_counted(self):
+        with self.settings(ROOT_URLCONF=AsyncUrlconf):
+            with self.assertRaises(QueryBudgetExceeded):
+                await self.async_client.get(reverse('recipe_list'))
+
+    def test_normalize_sql_groups_literals(self):
+        self.assertEqual(
+            normalize_sql('SELECT "id" FROM "recipes_recipe" WHERE "id" IN (1, 2, 3) AND "title" = \'Борщ\''),
+            'SELECT "id" FROM "recipes_recipe" WHERE "id" IN (...) AND "title" = ?',
+        )
+
+
+class SeedAndBenchmarkTests(TestCase):
+    def test_seed_then_benchmark(self):
+        call_command(
+            'seed_data', users=5, moderators=1, recipes=20, comments=40, favorites=30, images=0, stdout=StringIO(),
+        )
+        self.assertEqual(Recipe.objects.count(), 20)
+        recipe = Recipe.objects.filter(comment_count__gt=0).first()
+        self.assertEqual(recipe.comment_count, recipe.comments.count())
+        self.assertEqual(recipe.favorite_count, Favorite.objects.filter(recipe=recipe).count())
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'run.json'
+            call_command(
+                'benchmark', iterations=2, warmup=0, urls=['home', 'recipe_detail'], output=str(output),
+                stdout=StringIO(),
+            )
+            results = json.loads(output.read_text(encoding='utf-8'))['results']
+        self.assertEqual(
+            {(row['role'], row['name'], row['status']) for row in results},
+            {(role, name, 200) for role in ('anonymous', 'user', 'moderator') for name in ('home', 'recipe_detail')},
+        )
+        self.assertTrue(all(row['p50'] <= row['p95'] <= row['p99'] for row in results))
+
+
+class StepFormSetSaveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        cls.category = Category.objects.create(name='Супы')
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def post_recipe(self, url, instructions, existing=(), deleted=()):
+        data = {
+            'title': 'Борщ', 'description': 'Красный суп', 'ingredients': 'свёкла', 'category': self.category.pk,
+            'steps-TOTAL_FORMS': len(existing) + len(instructions), 'steps-INITIAL_FORMS': len(existing),
+            'steps-MIN_NUM_FORMS': 0, 'steps-MAX_NUM_FORMS': 1000,
+        }
+        for i, step in enumerate(existing):
+            data.update({f'steps-{i}-id': step.pk, f'steps-{i}-instruction': step.instruction})
+            if step.pk in deleted:
+                data[f'steps-{i}-DELETE'] = 'on'
+        for i, text in enumerate(instructions, start=len(existing)):
+            data[f'steps-{i}-instruction'] = text
+        return self.client.post(url, data)
+
+    def create_recipe(self, count):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_recipe(reverse('recipe_add'), [f'Шаг {i}' for i in range(count)])
+        self.assertRedirects(response, reverse('recipe_list'), fetch_redirect_response=False)
+        return Recipe.objects.latest('id'), len(queries)
+
+    def test_create_uses_constant_queries(self):
+        recipe, few = self.create_recipe(2)
+        self.assertEqual(list(recipe.steps.values_list('step_number', 'instruction')), [(1, 'Шаг 0'), (2, 'Шаг 1')])
+        _, many = self.create_recipe(15)
+        self.assertEqual(few, many)
+
+    def test_update_renumbers_after_delete(self):
+        recipe, _ = self.create_recipe(4)
+        steps = list(recipe.steps.all())
+        steps[0].instruction = 'Первый шаг'
+        response = self.post_recipe(
+            reverse('recipe_edit', kwargs={'pk': recipe.pk}), ['Новый шаг', ''],
+            existing=steps, deleted={steps[1].pk},
+        )
+        self.assertRedirects(response, reverse('recipe_list'), fetch_redirect_response=False)
+        self.assertEqual(
+            list(recipe.steps.values_list('step_number', 'instruction')),
+            [(1, 'Первый шаг'), (2, 'Шаг 2'), (3, 'Шаг 3'), (4, 'Новый шаг')],
+        )
+
+
+class RecipeTransferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        category = Category.objects.create(name='Супы')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                title=f'Суп {i}', description='Суп', ingredients='вода\nсоль', category=category,
+                author=cls.author, status='approved', image=f'recipes/soup_{i}.jpg',
+            )
+            Step.objects.bulk_create(
+                Step(recipe=recipe, step_number=n, instruction=f'Шаг {n}') for n in (1, 2)
+            )
+        Recipe.objects.create(title='Черновик', description='-', ingredients='-', author=cls.author)
+
+    def export(self):
+        output = StringIO()
+        call_command('export_recipes', chunk_size=2, stdout=output)
+        return output.getvalue()
+
+    def test_export_streams_approved_recipes_with_steps(self):
+        with self.assertNumQueries(3):
+            # серверный курсор по рецептам (с автором и категорией) и запрос шагов на каждую пачку
+            lines = self.export().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([record['title'] for record in records], ['Суп 0', 'Суп 1', 'Суп 2'])
+        self.assertEqual(records[0]['author'], 'author')
+        self.assertEqual(records[0]['category'], 'Супы')
+        self.assertEqual(records[0]['image'], 'recipes/soup_0.jpg')
+        self.assertEqual([step['instruction'] for step in records[0]['steps']], ['Шаг 1', 'Шаг 2'])
+
+    def test_import_round_trip(self):
+        dump = self.export()
+        Recipe.objects.filter(status='approved').delete()
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', encoding='utf-8', delete=False) as file:
+            file.write(dump + '{"title": "без автора", "author": "nobody"}\nне json\n')
+        self.addCleanup(Path(file.name).unlink)
+
+        output, errors = StringIO(), StringIO()
+        call_command('import_recipes', file.name, batch_size=2, stdout=output, stderr=errors)
+
+        self.assertIn('Загружено рецептов: 3, пропущено строк: 2', output.getvalue(), errors.getvalue())
+        imported = Recipe.objects.filter(status='approved').order_by('title')
+        self.assertEqual([recipe.title for recipe in imported], ['Суп 0', 'Суп 1', 'Суп 2'])
+        self.assertEqual(imported[0].steps.count(), 2)
+        self.assertEqual(imported[0].image.name, 'recipes/soup_0.jpg')
+        self.assertEqual(set(imported[0].ingredient_index.values_list('name', flat=True)), {'вода', 'соль'})
+
+        def without_ids(text):
+            return [{**json.loads(line), 'id': None} for line in text.splitlines()]
+        self.assertEqual(without_ids(self.export()), without_ids(dump))
+
+    def test_import_skips_records_the_database_would_reject(self):
+        valid = {'title': 'Борщ', 'description': 'Суп', 'ingredients': 'свёкла', 'author': 'author'}
+        lines = [json.dumps({**valid, **changes}) for changes in (
+            {'title': 'Б' * 101}, {'category': 'К' * 51}, {'title': None},
+            {'steps': [{'instruction': ''}]}, {'category': 'Первое'},
+        )]
+
+        result = import_ndjson(lines, batch_size=2)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(sorted(line_number for line_number, _ in result.skipped), [1, 2, 3, 4])
+        self.assertTrue(all(reason.startswith('некорректная запись') for _, reason in result.skipped))
+        self.assertFalse(Category.objects.filter(name='К' * 51).exists())
+        self.assertEqual(Recipe.objects.get(title='Борщ').category.name, 'Первое')
+
+    def test_export_endpoint_is_staff_only(self):
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(reverse('recipe_export')).status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get(reverse('recipe_export'))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 3)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'pass')
+        cls.category = Category.objects.create(name='Супы')
+        cls.recipe = Recipe.objects.create(
+            title='Борщ', description='Красный суп', ingredients='свёкла', category=cls.category,
+            author=cls.author, status='approved',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('recipe_detail', kwargs={'pk': self.recipe.pk})
+
+    def test_detail_revalidates_with_304(self):
+        self.client.get(self.url)  # первая страница выдаёт CSRF-cookie, от которой зависит ETag
+        response = self.client.get(self.url)
+        self.assertIn('no-cache', response['Cache-Control'])
+        with self.assertNumQueries(1):
+            repeat = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        repeat = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_step_and_comment_changes_update_validator(self):
+        etag = self.client.get(self.url)['ETag']
+        Recipe.objects.filter(pk=self.recipe.pk).update(updated_at=self.recipe.updated_at - timedelta(minutes=1))
+        etag = self.client.get(self.url)['ETag']
+
+        step = Step.objects.create(recipe=self.recipe, step_number=1, instruction='Сварить')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(self.url)['ETag']
+        Recipe.objects.filter(pk=self.recipe.pk).update(updated_at=self.recipe.updated_at - timedelta(minutes=1))
+        etag = self.client.get(self.url)['ETag']
+
+        step.delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(self.url)['ETag']
+
+        Comment.objects.create(recipe=self.recipe, user=self.reader, text='Вкусно')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_category_rename_and_delete_refresh_recipe_page(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(updated_at=self.recipe.updated_at - timedelta(minutes=1))
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Первые блюда'
+            self.category.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Первые блюда')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Первые блюда')
+
+    def test_validators_vary_by_user(self):
+        anonymous = self.client.get(self.url)
+        self.client.force_login(self.reader)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_list_and_home_revalidate(self):
+        for url in (reverse('home'), reverse('recipe_list')):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        list_url = reverse('recipe_list')
+        etag = self.client.get(list_url)['ETag']
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        self.assertEqual(self.client.get(list_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_author_rename_updates_list_and_home(self):
+        urls = (reverse('home'), reverse('recipe_list'))
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'chef'
+            self.author.save()
+        for url in urls:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertContains(response, 'chef')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Реплика имитируется вторым подключением к той же тестовой базе.
+
+    Подключение добавляется в setUpClass, поэтому ``databases`` — ``'__all__'``: исполнитель тестов
+    не должен создавать для него отдельную базу.
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        default = connections['default'].settings_dict
+        connections.settings['replica'] = {**default, 'TEST': {**default['TEST'], 'MIRROR': 'default'}}
+        cls.addClassCleanup(cls.remove_replica)
+        super().setUpClass()
+
+    @classmethod
+    def remove_replica(cls):
+        connections['replica'].close()
+        connections['replica'].close_pool()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', 'reader@example.com', 'pass')
+        self.recipe = Recipe.objects.create(
+            title='Борщ', description='Красный суп', ingredients='свёкла', author=self.user, status='approved',
+        )
+        self.url = reverse('recipe_detail', kwargs={'pk': self.recipe.pk})
+
+    def get_by_alias(self, *args, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(*args, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return len(primary), len(replica)
+
+    def test_reads_go_to_replica(self):
+        # Первый запрос заполняет фрагменты страницы, поэтому читает с основной базы.
+        primary, replica = self.get_by_alias(self.url)
+        self.assertGreater(primary, 0)
+        primary, replica = self.get_by_alias(self.url)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_cache_fills_read_from_primary(self):
+        with routing_scope(), CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            get_home_data(home_cache_version())
+            recipe_commenter_ids(self.recipe.pk, recipe_cache_version(self.recipe.pk))
+            get_roles(self.user)
+        self.assertEqual(len(replica), 0)
+        self.assertEqual(len(primary), 5)
+
+    def test_session_is_pinned_to_primary_after_write(self):
+        self.client.force_login(self.user)
+        response = self.client.post(self.url, {'text': 'Вкусно'})
+        self.assertIn('primary_pin', response.cookies)
+
+        primary, replica = self.get_by_alias(self.url)
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+        self.client.cookies['primary_pin'] = '0'
+        primary, replica = self.get_by_alias(self.url)
+        self.assertGreater(replica, 0)
+
+    def test_router_outside_request_and_in_transactions(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Recipe), 'default')
+        with routing_scope():
+            self.assertEqual(router.db_for_read(Recipe), 'replica')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Recipe), 'default')
+            router.db_for_write(Recipe)
+            self.assertEqual(router.db_for_read(Recipe), 'default')
+        with routing_scope():
+            with use_primary():
+                self.assertEqual(router.db_for_read(Recipe), 'default')
+                router.db_for_write(Recipe)
+            # Запись внутри блока закрепляет основную базу и после выхода из него.
+            self.assertEqual(router.db_for_read(Recipe), 'default')
+        with override_settings(DATABASE_REPLICAS=['replica', 'replica_2']), routing_scope():
+            self.assertEqual(len({router.db_for_read(Recipe) for _ in range(20)}), 1)
+        self.assertFalse(router.allow_migrate('replica', 'recipes'))
+
+
+class ConnectionMetricsTests(TestCase):
+    def test_new_connections_are_timed(self):
+        before = connection_metrics()['default']['checkouts']
+        raw = connection.get_new_connection(connection.get_connection_params())
+        raw.close()
+        metrics = connection_metrics()['default']
+        self.assertEqual(metrics['checkouts'], before + 1)
+        self.assertEqual(metrics['mode'], 'pool' if connection.pool else 'persistent')
+        self.assertGreater(metrics['max_ms'], 0)
+
+    def test_pooled_connections_are_reused(self):
+        # Отдельное подключение к той же тестовой базе с пулом, как при DB_POOL=True.
+        connections.settings['pooled'] = {
+            **connection.settings_dict,
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {**connection.settings_dict['OPTIONS'], 'pool': {'min_size': 1, 'max_size': 2}},
+        }
+        pooled = connections['pooled']
+
+        def remove_pooled():
+            pooled.close_pool()
+            del connections['pooled']
+            del connections.settings['pooled']
+
+        self.addCleanup(remove_pooled)
+        # Ждём первое соединение пула, иначе параллельно с ним может открыться второе.
+        pooled.pool.open(wait=True)
+        for _ in range(2):
+            raw = pooled.get_new_connection(pooled.get_connection_params())
+            raw.execute('SELECT 1')
+            pooled.pool.putconn(raw)
+        metrics = connection_metrics()['pooled']
+        self.assertEqual(metrics['mode'], 'pool')
+        self.assertEqual(metrics['checkouts'], 2)
+        self.assertEqual(metrics['pool']['requests_num'], 2)
+        self.assertEqual(metrics['pool']['connections_num'], 1)
+
+    def test_endpoint_is_for_staff_only(self):
+        url = reverse('db_metrics')
+        user = User.objects.create_user('plain', 'plain@example.com', 'pass')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        staff = User.objects.create_user('staff', 'staff@example.com', 'pass', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('default', response.json()['databases'])
+
+
+# Конфигурация адресов как при RECIPE_ASYNC_VIEWS=True: асинхронные маршруты идут первыми.
+class AsyncUrlconf:
+    urlpatterns = [
+        path('', async_home, name='home'),
+        path('recipes/', AsyncRecipeListView.as_view(), name='recipe_list'),
+        path('<int:pk>/', AsyncRecipeDetailView.as_view(), name='recipe_detail'),
+        *root_urlpatterns,
+    ]
+
+
+@override_settings(ROOT_URLCONF=AsyncUrlconf)
+class AsyncReadViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'pass')
+        cls.category = Category.objects.create(name='Супы')
+        cls.recipe = Recipe.objects.create(
+            title='Борщ', description='Красный суп', ingredients='свёкла', category=cls.category,
+            author=cls.author, status='approved',
+        )
+        Step.objects.create(recipe=cls.recipe, step_number=1, instruction='Сварить бульон')
+        Comment.objects.create(recipe=cls.recipe, user=cls.reader, text='Очень вкусно')
+        Favorite.objects.create(user=cls.reader, recipe=cls.recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('recipe_detail', kwargs={'pk': self.recipe.pk})
+
+    async def test_pages_render_through_async_views(self):
+        for name, view_class in (('home', None), ('recipe_list', AsyncRecipeListView)):
+            response = await self.async_client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'Борщ')
+            if view_class:
+                self.assertIs(response.resolver_match.func.view_class, view_class)
+
+        await self.async_client.aforce_login(self.reader)
+        response = await self.async_client.get(self.url)
+        self.assertIs(response.resolver_match.func.view_class, AsyncRecipeDetailView)
+        self.assertContains(response, 'Сварить бульон')
+        self.assertContains(response, 'Очень вкусно')
+        self.assertTrue(response.context['is_favorite'])
+        self.assertIn('private', response['Cache-Control'])
+
+        # Второй раз шаги и комментарии берутся из кэша фрагментов.
+        response = await self.async_client.get(self.url)
+        self.assertContains(response, 'Сварить бульон')
+        self.assertIsInstance(response.context['steps'], type(self.recipe.steps.all()))
+        repeat = await self.async_client.get(self.url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(repeat.status_code, 304)
+
+    async def test_hidden_recipe_is_not_found(self):
+        hidden = await Recipe.objects.acreate(
+            title='Черновик', description='-', ingredients='-', author=self.author, status='pending',
+        )
+        response = await self.async_client.get(reverse('recipe_detail', kwargs={'pk': hidden.pk}))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_comment_is_posted_through_sync_view(self):
+        await self.async_client.aforce_login(self.reader)
+        response = await self.async_client.post(self.url, {'text': 'Добавлю чеснок'})
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        self.assertTrue(await Comment.objects.filter(recipe=self.recipe, text='Добавлю чеснок').aexists())
+
+
+class SimilarRecipesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        soups = Category.objects.create(name='Супы')
+        cls.recipes = {
+            title: Recipe.objects.create(
+                title=title, description='-', ingredients='-', category=soups, author=cls.author, status=status,
+            )
+            for title, status in (('Борщ', 'approved'), ('Щи', 'approved'), ('Уха', 'approved'),
+                                  ('Солянка', 'approved'), ('Черновик', 'pending'))
+        }
+        cls.users = [User.objects.create_user(f'user{i}') for i in range(3)]
+        for user, titles in zip(cls.users, (('Борщ', 'Щи'), ('Борщ', 'Щи', 'Уха'), ('Уха', 'Солянка'))):
+            for title in titles:
+                Favorite.objects.create(user=user, recipe=cls.recipes[title])
+
+    def setUp(self):
+        # Рецепты общие для всех тестов класса, а кэш страниц между тестами не сбрасывается.
+        cache.clear()
+
+    def neighbors(self, title):
+        return [
+            (item.neighbor.title, item.source)
+            for item in RecipeNeighbor.objects.filter(recipe=self.recipes[title]).select_related('neighbor')
+        ]
+
+    def test_rebuild_ranks_by_co_favorites_and_falls_back_to_category(self):
+        rebuild_neighbors(k=3)
+        self.assertEqual(self.neighbors('Борщ'), [('Щи', 'favorites'), ('Уха', 'favorites'), ('Солянка', 'category')])
+        self.assertEqual(self.neighbors('Солянка')[0], ('Уха', 'favorites'))
+        self.assertFalse(RecipeNeighbor.objects.filter(neighbor=self.recipes['Черновик']).exists())
+        self.assertFalse(RecipeNeighbor.objects.filter(recipe=self.recipes['Черновик']).exists())
+        self.assertFalse(Recipe.objects.filter(favorites_changed_at__isnull=False).exists())
+
+        response = self.client.get(reverse('recipe_detail', kwargs={'pk': self.recipes['Солянка'].pk}))
+        self.assertContains(response, 'Похожие рецепты')
+        self.assertContains(response, reverse('recipe_detail', kwargs={'pk': self.recipes['Уха'].pk}))
+
+    def test_refresh_updates_recipes_touched_by_changed_favorites(self):
+        rebuild_neighbors(k=1)
+        self.assertEqual(self.neighbors('Солянка'), [('Уха', 'favorites')])
+
+        Favorite.objects.create(user=self.users[0], recipe=self.recipes['Солянка'])
+        Favorite.objects.create(user=self.users[1], recipe=self.recipes['Солянка'])
+        # Солянка, её новые соседи по избранному и Уха, в чьём списке она уже стояла.
+        self.assertEqual(refresh_neighbors(k=1), 4)
+        self.assertEqual(self.neighbors('Солянка'), [('Борщ', 'favorites')])
+        self.assertFalse(Recipe.objects.filter(favorites_changed_at__isnull=False).exists())
+
+    def test_refresh_builds_new_recipes_once(self):
+        rebuild_neighbors(k=1)
+        Recipe.objects.create(title='Кисель', description='-', ingredients='-', author=self.author, status='approved')
+        # У нового рецепта нет ни избранного, ни категории: список остаётся пустым и больше не пересчитывается.
+        self.assertEqual(refresh_neighbors(k=1), 1)
+        self.assertEqual(refresh_neighbors(k=1), 0)
+
+    def test_neighbor_changes_refresh_cached_lists(self):
+        rebuild_neighbors(k=1)
+        url = reverse('recipe_detail', kwargs={'pk': self.recipes['Солянка'].pk})
+        self.assertContains(self.client.get(url), 'Уха')
+
+        ukha = Recipe.objects.get(pk=self.recipes['Уха'].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            ukha.title = 'Уха по-фински'
+            ukha.save()
+        self.assertContains(self.client.get(url), 'Уха по-фински')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ukha.delete()
+        self.assertNotContains(self.client.get(url), 'Уха по-фински')
+
+
+@override_settings(TRENDING_HALF_LIFE_HOURS=24, TRENDING_WEIGHTS={'favorite': 3.0, 'comment': 2.0, 'view': 0.5})
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'pass')
+        cls.borsch, cls.shchi, cls.ukha = (
+            Recipe.objects.create(title=title, description='-', ingredients='-', author=cls.author, status='approved')
+            for title in ('Борщ', 'Щи', 'Уха')
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def score(self, recipe):
+        return Recipe.objects.values_list('trending_score', flat=True).get(pk=recipe.pk)
+
+    def test_events_update_score_incrementally(self):
+        favorite = Favorite.objects.create(user=self.reader, recipe=self.borsch)
+        Comment.objects.create(recipe=self.borsch, user=self.reader, text='Вкусно')
+        Favorite.objects.create(user=self.reader, recipe=self.shchi)
+        self.assertAlmostEqual(self.score(self.borsch), 5.0, places=3)
+        self.assertEqual(
+            list(trending_recipes().values_list('title', flat=True)), ['Борщ', 'Щи', 'Уха'],
+        )
+
+        favorite.delete()
+        self.assertAlmostEqual(self.score(self.borsch), 2.0, places=3)
+
+        rebuilt = {recipe.pk: recipe.trending_score for recipe in Recipe.objects.all()}
+        rebuild_scores()
+        for recipe in Recipe.objects.all():
+            self.assertAlmostEqual(recipe.trending_score, rebuilt[recipe.pk], places=3)
+
+    def test_views_are_buffered_and_scores_decay(self):
+        for _ in range(3):
+            record_view(self.ukha.pk)
+        self.assertEqual(self.score(self.ukha), 0)
+        self.assertEqual(flush_views(), 3)
+        self.assertAlmostEqual(self.score(self.ukha), 1.5, places=3)
+        self.assertEqual(flush_views(), 0)
+
+        decay_scores(now=timezone.now() + timedelta(hours=24))
+        self.assertAlmostEqual(self.score(self.ukha), 0.75, places=3)
+
+    def test_flush_reads_only_viewed_recipes(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(flush_views(), 0)
+        record_view(self.ukha.pk)
+        record_view(self.ukha.pk)
+        with self.assertNumQueries(1), mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            self.assertEqual(flush_views(batch_size=1), 2)
+        self.assertEqual(get_many.call_args.args[0], {view_key(self.ukha.pk): self.ukha.pk})
+
+        # После переноса рецепт снова попадает в журнал при следующем просмотре.
+        record_view(self.shchi.pk)
+        record_view(self.ukha.pk)
+        self.assertEqual(flush_views(), 2)
+        self.assertEqual(flush_views(), 0)
+        self.assertAlmostEqual(self.score(self.ukha), 1.5, places=3)
+
+    def test_detail_view_is_counted_and_list_sorts_by_trending(self):
+        self.client.get(reverse('recipe_detail', kwargs={'pk': self.ukha.pk}))
+        Favorite.objects.create(user=self.reader, recipe=self.shchi)
+        flush_views()
+
+        response = self.client.get(reverse('recipe_list'), {'sort': 'trending'})
+        self.assertEqual([recipe.title for recipe in response.context['recipes']], ['Щи', 'Уха', 'Борщ'])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('update_trending', stdout=StringIO())
+        response = self.client.get(reverse('home'))
+        self.assertEqual([recipe.title for recipe in response.context['trending_recipes']], ['Щи', 'Уха'])
+
+
+class CategoryFacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        cls.reader = User.objects.create_user('reader', 'reader@example.com', 'pass')
+        cls.soups = Category.objects.create(name='Супы')
+        cls.salads = Category.objects.create(name='Салаты')
+        cls.borsch = Recipe.objects.create(
+            title='Борщ', description='-', ingredients='-', author=cls.author, category=cls.soups, status='approved',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self, user=None):
+        return {category.name: category.recipe_count for category in categories_with_counts(user)}
+
+    def assertMatchesRebuild(self):
+        stored = set(CategoryCount.objects.filter(count__gt=0).values_list('category_id', 'user_id', 'count'))
+        rebuild_counts()
+        self.assertEqual(stored, set(CategoryCount.objects.values_list('category_id', 'user_id', 'count')))
+
+    def test_status_category_and_favorite_changes(self):
+        Favorite.objects.create(user=self.reader, recipe=self.borsch)
+        self.assertEqual(self.counts(), {'Салаты': 0, 'Супы': 1})
+        self.assertEqual(self.counts(self.reader), {'Салаты': 0, 'Супы': 1})
+
+        self.borsch.category = self.salads
+        self.borsch.save()
+        self.assertEqual(self.counts(), {'Салаты': 1, 'Супы': 0})
+        self.assertEqual(self.counts(self.reader), {'Салаты': 1, 'Супы': 0})
+
+        self.borsch.status = 'pending'
+        self.borsch.save()
+        self.assertEqual(self.counts(), {'Салаты': 0, 'Супы': 0})
+        self.assertEqual(self.counts(self.reader), {'Салаты': 0, 'Супы': 0})
+
+        moderator = User.objects.create_user('moderator', 'moderator@example.com', 'pass')
+        claim_batch(moderator)
+        self.assertEqual(decide_batch(moderator, [self.borsch.pk], 'approve'), 1)
+        self.assertEqual(self.counts(self.reader), {'Салаты': 1, 'Супы': 0})
+        self.assertMatchesRebuild()
+
+    def test_recipe_delete_and_sidebars(self):
+        shchi = Recipe.objects.create(
+            title='Щи', description='-', ingredients='-', author=self.author, category=self.soups, status='approved',
+        )
+        Favorite.objects.create(user=self.reader, recipe=shchi)
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('favorite_list'))
+        self.assertContains(response, 'Супы (1)')
+        response = self.client.get(reverse('recipe_list'))
+        self.assertContains(response, 'Супы (2)')
+
+        Recipe.objects.get(pk=shchi.pk).delete()
+        self.assertEqual(self.counts(), {'Салаты': 0, 'Супы': 1})
+        self.assertEqual(self.counts(self.reader), {'Салаты': 0, 'Супы': 0})
+        self.assertMatchesRebuild()
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual(
+            [(category.name, category.recipe_count) for category in response.context['categories']], [('Супы', 1)],
+        )
+
+    def test_admin_bulk_actions_lock_rows_and_shift_counts(self):
+        shchi, ukha = (
+            Recipe.objects.create(title=title, description='-', ingredients='-', author=self.author,
+                                  category=self.soups, status='pending')
+            for title in ('Щи', 'Уха')
+        )
+        Recipe.objects.filter(pk=ukha.pk).update(status='rejected')
+        model_admin = RecipeAdmin(Recipe, admin.site)
+        request = RequestFactory().post('/')
+        request.user = self.author
+        selected = Recipe.objects.filter(pk__in=[shchi.pk, ukha.pk])
+
+        with mock.patch.object(RecipeAdmin, 'message_user'), CaptureQueriesContext(connection) as queries:
+            model_admin.approve_recipes(request, selected)
+            model_admin.reject_recipes(request, selected)
+        self.assertTrue(any(query['sql'].endswith('FOR UPDATE') for query in queries))
+        self.assertEqual(Recipe.objects.get(pk=shchi.pk).status, 'approved')
+        self.assertEqual(Recipe.objects.get(pk=ukha.pk).status, 'rejected')
+        self.assertEqual(self.counts(), {'Салаты': 0, 'Супы': 2})
+        self.assertMatchesRebuild()
+
+    def test_cascade_deletes_shift_counts_in_batches(self):
+        shchi = Recipe.objects.create(
+            title='Щи', description='-', ingredients='-', author=self.author, category=self.soups, status='approved',
+        )
+        fans = [User.objects.create_user(f'fan{number}') for number in range(5)]
+        for fan in fans:
+            Favorite.objects.create(user=fan, recipe=self.borsch)
+            Favorite.objects.create(user=fan, recipe=shchi)
+
+        def count_updates(queries):
+            return [query for query in queries if query['sql'].startswith('UPDATE "recipes_categorycount"')]
+
+        with CaptureQueriesContext(connection) as queries:
+            Recipe.objects.get(pk=shchi.pk).delete()
+        self.assertEqual(len(count_updates(queries)), 1)
+        self.assertEqual(self.counts(fans[1]), {'Салаты': 0, 'Супы': 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            User.objects.filter(pk__in=[fan.pk for fan in fans[:3]]).delete()
+        self.assertEqual(len(count_updates(queries)), 1)
+        self.assertMatchesRebuild()
+
+
+class SuggestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        soups = Category.objects.create(name='Супы')
+        for title, status, favorites in (
+            ('Суп гороховый', 'approved', 1), ('Борщ со сметаной', 'approved', 5),
+            ('Сырники', 'approved', 9), ('Суп-пюре', 'pending', 0),
+        ):
+            Recipe.objects.create(
+                title=title, description='-', ingredients='-', author=cls.author, category=soups, status=status,
+                favorite_count=favorites,
+            )
+
+    def setUp(self):
+        cache.clear()
+        suggestion_cache.clear()
+
+    def test_title_prefix_first_then_word_prefix(self):
+        response = self.client.get(reverse('recipe_suggest'), {'q': '  Суп '})
+        data = response.json()
+        self.assertEqual(data['query'], 'суп')
+        self.assertEqual([recipe['title'] for recipe in data['recipes']], ['Суп гороховый'])
+        self.assertEqual(data['categories'][0]['name'], 'Супы')
+        self.assertIn('max-age', response['Cache-Control'])
+
+        data = self.client.get(reverse('recipe_suggest'), {'q': 'смет'}).json()
+        self.assertEqual([recipe['title'] for recipe in data['recipes']], ['Борщ со сметаной'])
+
+        data = self.client.get(reverse('recipe_suggest'), {'q': 'с'}).json()
+        self.assertEqual(data['recipes'], [])
+
+    def test_hot_prefixes_are_served_from_memory(self):
+        self.client.get(reverse('recipe_suggest'), {'q': 'сы'})
+        with self.assertNumQueries(0):
+            data = self.client.get(reverse('recipe_suggest'), {'q': 'СЫ'}).json()
+        self.assertEqual([recipe['title'] for recipe in data['recipes']], ['Сырники'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(title='Сырный суп', description='-', ingredients='-', author=self.author,
+                                  status='approved', favorite_count=20)
+        data = self.client.get(reverse('recipe_suggest'), {'q': 'сы'}).json()
+        self.assertEqual([recipe['title'] for recipe in data['recipes']], ['Сырный суп', 'Сырники'])
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_data', users=5, moderators=1, recipes=40, comments=60, favorites=60, images=0, stdout=StringIO(),
+        )
+
+    def setUp(self):
+        # Страницы из кэша не выполняют запросов, и их планы остались бы непроверенными.
+        cache.clear()
+
+    def test_detects_full_scans(self):
+        plan = explain('default', 'SELECT id FROM recipes_comment WHERE text = %s', ['-'])
+        self.assertEqual(full_scans(plan), ['recipes_comment'])
+        # С выключенным Seq Scan фильтр по полю без индекса превращается в обход первичного ключа.
+        plan = explain('default', 'SELECT id FROM recipes_comment WHERE text = %s ORDER BY id', ['-'])
+        self.assertEqual(full_scans(plan), ['recipes_comment'])
+        plan = explain('default', 'SELECT id FROM recipes_comment WHERE id = %s', [1])
+        self.assertEqual(full_scans(plan), [])
+
+    def test_view_queries_use_indexes(self):
+        users = resolve_users()
+        samples = sample_kwargs(users['user'])
+        problems, urls = [], set()
+        for role in ('anonymous', 'user', 'moderator'):
+            if role != 'anonymous':
+                self.client.force_login(users[role])
+            for name, url in view_urls(samples):
+                urls.add(url)
+                problems += [f'{role} {url}: {", ".join(tables)}\n{sql}' for sql, tables in check_url(self.client, url)]
+        self.assertIn(reverse('favorite_list') + f'?category={samples["category"]}', urls)
+        self.assertNotIn(reverse('resend_activation_email'), urls)
+        self.assertEqual(problems, [], '\n\n'.join(problems))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        for title, description, ingredients in (
+            ('Пирог с яблоками', 'Осенняя выпечка', 'мука, яблоки'),
+            ('Шарлотка', 'Бисквит с яблоком', 'яйца, сахар'),
+            ('Салат из капусты', 'Хрустящий салат', 'капуста, яблоко'),
+        ):
+            Recipe.objects.create(title=title, description=description, ingredients=ingredients,
+                                  author=cls.author, status='approved')
+
+    def titles(self, queryset):
+        return [recipe.title for recipe in queryset]
+
+    def test_fulltext_search_stems_and_ranks_title_first(self):
+        results = search_recipes(Recipe.objects.all(), 'яблоко')
+        self.assertEqual(self.titles(results), ['Пирог с яблоками', 'Шарлотка', 'Салат из капусты'])
+        self.assertEqual(self.titles(search_recipes(Recipe.objects.all(), 'капуста -яблоко')), [])
+
+    def test_prefix_searches_related_recipe(self):
+        reader = User.objects.create_user('reader', 'reader@example.com', 'pass')
+        for recipe in Recipe.objects.all():
+            Favorite.objects.create(user=reader, recipe=recipe)
+        favorites = search_recipes(Favorite.objects.filter(user=reader), 'салат', prefix='recipe__')
+        self.assertEqual([favorite.recipe.title for favorite in favorites], ['Салат из капусты'])
+
+    @override_settings(RECIPE_FULLTEXT_SEARCH=False)
+    def test_fallback_matches_title_substring(self):
+        self.assertEqual(self.titles(search_recipes(Recipe.objects.all(), 'ШАРЛ')), ['Шарлотка'])
+        self.assertEqual(self.titles(search_recipes(Recipe.objects.all(), 'бисквит')), [])
+
+
+class IngredientTests(TestCase):
+    def test_normalization_drops_quantities_units_and_notes(self):
+        self.assertEqual(normalize_ingredient('Картофель — 3 шт.'), 'картофель')
+        self.assertEqual(normalize_ingredient('Мука пшеничная (высший сорт): 200 г'), 'мука пшеничная')
+        self.assertEqual(normalize_ingredient('Соль по вкусу'), 'соль')
+        self.assertEqual(normalize_ingredient('Свёкла 2 шт'), 'свекла')
+        self.assertEqual(
+            parse_ingredients('- Картофель — 3 шт.\n• Соль по вкусу; морковь, 2 ст.л\n\n'),
+            {'картофель', 'соль', 'морковь'},
+        )
+        self.assertEqual(parse_ingredients(None), set())
+
+    def test_ranking_by_matched_ingredients(self):
+        author = User.objects.create_user('author', 'author@example.com', 'pass')
+        for title, ingredients in (
+            ('Пюре', 'Картофель 1 кг\nМолоко 200 мл\nСоль'),
+            ('Картофель фри', 'Картофель\nМасло'),
+            ('Блины', 'Молоко, мука, яйца'),
+        ):
+            Recipe.objects.create(title=title, description='-', ingredients=ingredients, author=author,
+                                  status='approved')
+
+        ranked = rank_by_ingredients(Recipe.objects.all(), {'картофель', 'молоко', 'соль'})
+        self.assertEqual(
+            [(recipe.title, recipe.matched_ingredients) for recipe in ranked],
+            [('Пюре', 3), ('Блины', 1), ('Картофель фри', 1)],
+        )
+
+        response = self.client.get(reverse('recipes_by_ingredients'), {'ingredients': 'Картофель, соль'})
+        data = response.json()
+        self.assertEqual(data['ingredients'], ['картофель', 'соль'])
+        self.assertEqual([row['title'] for row in data['results']], ['Пюре', 'Картофель фри'])
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', 'author@example.com', 'pass')
+        Recipe.objects.bulk_create(
+            Recipe(title=f'Рецепт {i}', description='-', ingredients='-', author=author, status='approved')
+            for i in range(7)
+        )
+        # Половина рецептов с одинаковой датой: порядок между ними задаёт id.
+        moment = timezone.now()
+        ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+        Recipe.objects.filter(id__in=ids[:4]).update(created_at=moment - timedelta(hours=1))
+        Recipe.objects.filter(id__in=ids[4:]).update(created_at=moment)
+        cls.expected = ids[4:][::-1] + ids[:4][::-1]
+
+    def paginator(self):
+        return CursorPaginator(Recipe.objects.all(), 3)
+
+    def ids(self, page):
+        return [recipe.pk for recipe in page]
+
+    def test_next_and_previous_pages_with_ties(self):
+        paginator = self.paginator()
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertEqual(self.ids(first) + self.ids(second) + self.ids(third), self.expected)
+        self.assertEqual((first.has_previous(), first.has_next()), (False, True))
+        self.assertEqual((third.has_previous(), third.has_next()), (True, False))
+        self.assertIsNone(third.next_cursor)
+
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual(self.ids(back), self.ids(second))
+        self.assertEqual((back.has_previous(), back.has_next()), (True, True))
+        start = paginator.page(back.previous_cursor)
+        self.assertEqual(self.ids(start), self.ids(first))
+        self.assertFalse(start.has_previous())
+
+    def test_tampered_or_mismatched_cursor_falls_back_to_first_page(self):
+        paginator = self.paginator()
+        first = self.ids(paginator.page())
+        cursor = paginator.page().next_cursor
+        for bad in (cursor[:-2] + 'xx', 'garbage', signing.dumps(['next', [1]], salt=CURSOR_SALT),
+                    signing.dumps(['sideways', ['2020-01-01T00:00:00+00:00', 1]], salt=CURSOR_SALT)):
+            self.assertEqual(self.ids(paginator.page(bad)), first)
+        with self.assertRaises(ValueError):
+            CursorPaginator(Recipe.objects.all(), 3, ordering=('created_at', 'id'))
+
+    def test_page_links_keep_filters(self):
+        request = RequestFactory().get('/recipes/', {'category': '5', 'cursor': 'old', 'page': '2'})
+        paginator = self.paginator()
+        page = paginator.page(paginator.page().next_cursor)
+        links = page_links(request, page)
+        self.assertEqual([link['label'] for link in links], ['« Первая', '‹ Предыдущая', 'Следующая ›'])
+        self.assertEqual(links[0]['query'], 'category=5')
+        self.assertIn('category=5&cursor=', links[2]['query'])
+
+        page = Paginator(list(range(100)), 5).page(10)
+        labels = [link['label'] for link in page_links(request, page, on_each_side=1)]
+        self.assertEqual(labels, ['« Предыдущая', '1', '…', '9', '10', '11', '…', '20', 'Следующая »'])
+        self.assertEqual(page_links(request, None), [])
+
+    @override_settings(RECIPE_PAGINATION='cursor')
+    def test_list_view_uses_cursor(self):
+        response = self.client.get(reverse('recipe_list'))
+        self.assertEqual([recipe.pk for recipe in response.context['recipes']], self.expected)
+        self.assertEqual(response.context['page_links'], [])
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        cls.recipe = Recipe.objects.create(title='Борщ', description='-', ingredients='-', author=cls.author)
+
+    def counts(self):
+        return Recipe.objects.values_list('comment_count', 'favorite_count').get(pk=self.recipe.pk)
+
+    def test_signals_keep_counters_and_clamp_at_zero(self):
+        comment = Comment.objects.create(recipe=self.recipe, user=self.author, text='Вкусно')
+        Favorite.objects.create(recipe=self.recipe, user=self.author)
+        self.assertEqual(self.counts(), (1, 1))
+        comment.delete()
+        self.assertEqual(self.counts(), (0, 1))
+
+        change_counter(self.recipe.pk, 'comment_count', -1)
+        change_counter(self.recipe.pk, 'comment_count', -1)
+        self.assertEqual(self.counts(), (0, 1))
+
+    def test_reconcile_fixes_drifted_counters(self):
+        Comment.objects.create(recipe=self.recipe, user=self.author, text='Вкусно')
+        other = Recipe.objects.create(title='Щи', description='-', ingredients='-', author=self.author)
+        Recipe.objects.filter(pk=self.recipe.pk).update(comment_count=5, favorite_count=2)
+
+        with self.assertNumQueries(2):
+            drifted = reconcile_counters(Recipe.objects.filter(pk__in=[self.recipe.pk, other.pk]))
+        self.assertEqual([recipe.pk for recipe in drifted], [self.recipe.pk])
+        self.assertEqual(self.counts(), (1, 0))
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('исправлено: 0', out.getvalue())
+
+    def test_cascade_deletes_update_each_recipe_once(self):
+        reader = User.objects.create_user('reader', 'reader@example.com', 'pass')
+        other = Recipe.objects.create(title='Щи', description='-', ingredients='-', author=self.author)
+        for recipe in (self.recipe, other):
+            for _ in range(3):
+                Comment.objects.create(recipe=recipe, user=reader, text='Вкусно')
+            Favorite.objects.create(recipe=recipe, user=reader)
+        Comment.objects.create(recipe=self.recipe, user=self.author, text='Спасибо')
+
+        def counter_updates(queries):
+            return [query for query in queries
+                    if query['sql'].startswith('UPDATE') and '"trending_score"' in query['sql']]
+
+        with CaptureQueriesContext(connection) as queries:
+            reader.delete()
+        self.assertEqual(len(counter_updates(queries)), 2)
+        self.assertEqual(self.counts(), (1, 0))
+        self.assertEqual(Recipe.objects.values_list('comment_count', 'favorite_count').get(pk=other.pk), (0, 0))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.recipe.delete()
+        self.assertEqual(counter_updates(queries), [])
+
+
+class HomeCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        cls.soups = Category.objects.create(name='Супы')
+        cls.borsch = Recipe.objects.create(title='Борщ', description='-', ingredients='-', author=cls.author,
+                                           category=cls.soups, status='approved')
+
+    def setUp(self):
+        cache.clear()
+
+    def titles(self):
+        return [recipe.title for recipe in get_home_data(home_cache_version())['latest_recipes']]
+
+    def test_data_is_cached_under_version(self):
+        version = home_cache_version()
+        data = get_home_data(version)
+        self.assertEqual([category.name for category in data['categories']], ['Супы'])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_home_data(version), data)
+
+    def test_invalidated_after_commit_only(self):
+        self.assertEqual(self.titles(), ['Борщ'])
+        shchi = Recipe.objects.create(title='Щи', description='-', ingredients='-', author=self.author,
+                                      status='pending')
+        with self.captureOnCommitCallbacks() as callbacks:
+            shchi.status = 'approved'
+            shchi.save()
+            # До фиксации транзакции версия прежняя, главная отдаётся из кэша.
+            self.assertEqual(self.titles(), ['Борщ'])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.titles(), ['Щи', 'Борщ'])
+
+    def test_rolled_back_and_unrelated_changes_keep_cache(self):
+        version = home_cache_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.borsch.status = 'rejected'
+                    self.borsch.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            Recipe.objects.create(title='Черновик', description='-', ingredients='-', author=self.author,
+                                  status='pending')
+        self.assertEqual(home_cache_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.soups.name = 'Первые блюда'
+            self.soups.save()
+        self.assertNotEqual(home_cache_version(), version)
+
+    def test_author_rename_invalidates(self):
+        version = home_cache_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user('reader', 'reader@example.com', 'pass')
+            self.author.last_login = timezone.now()
+            self.author.save(update_fields=['last_login'])
+        self.assertEqual(home_cache_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'chef'
+            self.author.save()
+        self.assertNotEqual(home_cache_version(), version)
+        self.assertEqual(get_home_data(home_cache_version())['latest_recipes'][0].author.username, 'chef')
+
+
+def image_upload(name='photo.png', size=(600, 400), mode='RGB'):
+    buffer = BytesIO()
+    Image.new(mode, size, 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(IMAGE_VARIANTS_ASYNC=False, IMAGE_VARIANT_WIDTHS=[160, 480, 1200])
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+
+    def setUp(self):
+        self.media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+
+    def create_recipe(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(title='Борщ', description='-', ingredients='-', author=self.author, **kwargs)
+
+    def test_generate_variants_never_upscales(self):
+        name = default_storage.save('recipes/large.png', image_upload(size=(600, 400), mode='RGBA'))
+        self.assertEqual(generate_variants(name), [160, 480])
+        self.assertTrue(all(default_storage.exists(variant) for variant in variant_names(name, [160, 480])))
+        name = default_storage.save('recipes/small.png', image_upload(size=(100, 80)))
+        self.assertEqual(generate_variants(name), [100])
+
+    def test_new_recipe_and_avatar_get_variants(self):
+        recipe = self.create_recipe(image=image_upload())
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, [160, 480])
+        self.assertTrue(default_storage.exists(variant_names(recipe.image.name, [160])[0]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user('reader', 'reader@example.com', 'pass', avatar=image_upload('me.png'))
+        user.refresh_from_db()
+        self.assertEqual(user.avatar_variants, [160, 480])
+
+    def test_only_image_changes_reschedule(self):
+        recipe = self.create_recipe(image=image_upload())
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        with mock.patch('recipes.signals.schedule_variants') as schedule:
+            recipe.title = 'Щи'
+            recipe.save()
+            self.assertFalse(schedule.called)
+            recipe.image = image_upload('new.png', size=(300, 200))
+            recipe.save()
+            self.assertEqual(schedule.call_count, 1)
+
+    def test_backfill_command_refreshes_caches(self):
+        recipe = self.create_recipe(status='approved')
+        name = default_storage.save('recipes/old.png', image_upload(size=(600, 400)))
+        Recipe.objects.filter(pk=recipe.pk).update(image=name, updated_at=timezone.now() - timedelta(days=1))
+        recipe.refresh_from_db()
+        home_version, recipe_version = home_cache_version(), recipe_cache_version(recipe.pk)
+
+        command = 'recipes.management.commands.generate_image_variants'
+        # Пул процессов заменён потоками, а соединения не закрываются, чтобы не выйти из транзакции теста.
+        with mock.patch(f'{command}.ProcessPoolExecutor', ThreadPoolExecutor), mock.patch(f'{command}.connections'):
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('generate_image_variants', stdout=StringIO())
+
+        self.assertEqual(Recipe.objects.get(pk=recipe.pk).image_variants, [160, 480])
+        self.assertGreater(Recipe.objects.get(pk=recipe.pk).updated_at, recipe.updated_at)
+        self.assertNotEqual(recipe_cache_version(recipe.pk), recipe_version)
+        self.assertNotEqual(home_cache_version(), home_version)
+
+    def test_deferred_image_is_not_loaded(self):
+        self.create_recipe(image=image_upload())
+        with self.assertNumQueries(1):
+            recipes = list(Recipe.objects.only('title'))
+        self.assertEqual(recipes[0]._loaded_image_name, None)
+
+
+class MediaTombstoneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+
+    def setUp(self):
+        self.media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+
+    def store(self, name):
+        return default_storage.save(name, ContentFile(b'image'))
+
+    def backdate(self, age):
+        MediaTombstone.objects.update(created_at=timezone.now() - age)
+
+    def test_delete_tombstones_files_and_sweep_respects_grace(self):
+        image = self.store('recipes/borsch.jpg')
+        variant = self.store('recipes/borsch_160w.webp')
+        recipe = Recipe.objects.create(title='Борщ', description='-', ingredients='-', author=self.author)
+        Recipe.objects.filter(pk=recipe.pk).update(image=image, image_variants=[160])
+
+        try:
+            with transaction.atomic():
+                Recipe.objects.get(pk=recipe.pk).delete()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(MediaTombstone.objects.exists())
+
+        Recipe.objects.get(pk=recipe.pk).delete()
+        self.assertEqual(
+            set(MediaTombstone.objects.values_list('path', flat=True)),
+            {image, variant, 'recipes/borsch_160w.jpg'},
+        )
+        self.assertEqual(sweep_tombstones(), 0)
+        self.assertTrue(default_storage.exists(image))
+
+        self.backdate(timedelta(minutes=10))
+        self.assertEqual(sweep_tombstones(batch_size=2), 2)
+        self.assertEqual(sweep_tombstones(batch_size=2), 1)
+        self.assertFalse(default_storage.exists(image) or default_storage.exists(variant))
+        self.assertFalse(MediaTombstone.objects.exists())
+
+    def test_sweep_keeps_file_referenced_again(self):
+        image = self.store('recipes/shared.jpg')
+        Recipe.objects.create(title='Щи', description='-', ingredients='-', author=self.author, image=image)
+        tombstone_files([image])
+        self.backdate(timedelta(hours=1))
+        self.assertEqual(sweep_tombstones(), 1)
+        self.assertTrue(default_storage.exists(image))
+        self.assertFalse(MediaTombstone.objects.exists())
+
+    def test_find_orphans_matches_variants_by_original(self):
+        used = self.store('recipes/used.jpg')
+        Recipe.objects.create(title='Щи', description='-', ingredients='-', author=self.author, image=used)
+        chunk = [used, 'recipes/used_480w.webp', 'recipes/gone.jpg', 'recipes/gone_160w.jpg', 'recipes/notes.txt']
+        self.assertEqual(find_orphans(chunk, Recipe, 'image'),
+                         ['recipes/gone.jpg', 'recipes/gone_160w.jpg', 'recipes/notes.txt'])
+
+        fresh = self.store('recipes/fresh.jpg')
+        self.assertEqual(list(iter_media_chunks('recipes', 10, timedelta(hours=1))), [])
+        chunks = list(iter_media_chunks('recipes', 1, timedelta(0)))
+        self.assertEqual(sorted(path for chunk in chunks for path in chunk), [fresh, used])
+        self.assertEqual({len(chunk) for chunk in chunks}, {1})
+
+        call_command('scan_media_orphans', min_age_hours=0, stdout=StringIO())
+        self.assertEqual(list(MediaTombstone.objects.values_list('path', flat=True)), [fresh])
+
+
+@override_settings(MODERATION_BATCH_SIZE=2, MODERATION_LEASE_MINUTES=15)
+class ModerationQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        cls.first = User.objects.create_user('first', 'first@example.com', 'pass')
+        cls.second = User.objects.create_user('second', 'second@example.com', 'pass')
+        cls.recipes = [
+            Recipe.objects.create(title=f'Рецепт {i}', description='-', ingredients='-', author=cls.author,
+                                  status='pending')
+            for i in range(3)
+        ]
+
+    def ids(self, queryset):
+        return [recipe.pk for recipe in queryset]
+
+    def expire(self, moderator):
+        Recipe.objects.filter(claimed_by=moderator).update(claim_expires_at=timezone.now() - timedelta(minutes=1))
+
+    def test_moderators_get_disjoint_batches(self):
+        first = self.ids(claim_batch(self.first))
+        self.assertEqual(first, [recipe.pk for recipe in self.recipes[:2]])
+        self.assertEqual(self.ids(claim_batch(self.first)), first)
+        self.assertEqual(self.ids(claim_batch(self.second)), [self.recipes[2].pk])
+
+        self.assertEqual(release_claims(self.first), 2)
+        self.assertEqual(self.ids(claim_batch(self.second)), [self.recipes[0].pk, self.recipes[2].pk])
+        self.assertEqual(len(claim_batch(self.second, size=3)), 3)
+
+    def test_expired_lease_can_be_reclaimed(self):
+        claim_batch(self.first)
+        self.expire(self.first)
+        reclaimed = self.ids(claim_batch(self.second, size=3))
+        self.assertEqual(reclaimed, [recipe.pk for recipe in self.recipes])
+        # Просроченная бронь не даёт решать: рецепты уже у другого модератора.
+        self.assertEqual(decide_batch(self.first, reclaimed, 'approve'), 0)
+
+    def test_decisions_need_a_live_claim(self):
+        claimed = self.ids(claim_batch(self.first))
+        unclaimed = self.recipes[2].pk
+        self.assertEqual(decide_batch(self.second, claimed, 'approve'), 0)
+        self.assertEqual(decide_batch(self.first, [*claimed, unclaimed], 'reject', 'Нет фото'), 2)
+        self.assertEqual(
+            set(Recipe.objects.filter(pk__in=claimed).values_list('status', 'moderator_comment', 'claimed_by')),
+            {('rejected', 'Нет фото', None)},
+        )
+        self.assertEqual(Recipe.objects.get(pk=unclaimed).status, 'pending')
+
+        claim_batch(self.second)
+        self.expire(self.second)
+        self.assertEqual(decide_batch(self.second, [unclaimed], 'approve'), 0)
@@ -0,0 +1,194 @@
+import json
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import invalidate_home_cache
+from .facets import shift_counts
+from .ingredients import index_recipes
+from .models import Category, Recipe, Step
+
+
+def export_queryset():
+    return (
+        Recipe.objects.filter(status='approved')
+        .select_related('category', 'author')
+        .prefetch_related(Prefetch('steps', queryset=Step.objects.order_by('step_number')))
+        .defer('search_vector')
+        .order_by('pk')
+    )
+
+
+def serialize_recipe(recipe):
+    return {
+        'id': recipe.pk,
+        'title': recipe.title,
+        'description': recipe.description,
+        'ingredients': recipe.ingredients,
+        'category': recipe.category.name if recipe.category else None,
+        'author': recipe.author.username,
+        'created_at': recipe.created_at.isoformat(),
+        'image': recipe.image.name or None,
+        'steps': [
+            {'step_number': step.step_number, 'instruction': step.instruction, 'image': step.image.name or None}
+            for step in recipe.steps.all()
+        ],
+    }
+
+
+def iter_ndjson(queryset=None, chunk_size=500):
+    """Построчно отдаёт рецепты в NDJSON; в памяти одновременно не больше ``chunk_size`` рецептов.
+
+    Шаги подгружаются одним запросом на каждую пачку из ``iterator()``.
+    """
+    if queryset is None:
+        queryset = export_queryset()
+    for recipe in queryset.iterator(chunk_size=chunk_size):
+        yield json.dumps(serialize_recipe(recipe), ensure_ascii=False) + '\n'
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.skipped = []
+
+    def skip(self, line_number, reason):
+        self.skipped.append((line_number, reason))
+
+
+def import_ndjson(lines, batch_size=500, default_author=None, status='approved'):
+    """Загружает рецепты из NDJSON пачками через bulk_create.
+
+    Авторы ищутся по имени пользователя; если автора нет, используется ``default_author``, иначе
+    строка пропускается. Недостающие категории создаются. Уменьшенные копии изображений потом
+    создаёт ``manage.py generate_image_variants``.
+    """
+    result = ImportResult()
+    categories = {}
+    rows = ((line_number, line) for line_number, line in enumerate(lines, start=1) if line.strip())
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        batch = []
+        for line_number, line in chunk:
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                result.skip(line_number, f'некорректный JSON: {exc}')
+                continue
+            if not isinstance(record, dict):
+                result.skip(line_number, 'ожидался объект JSON')
+                continue
+            batch.append((line_number, record))
+        with transaction.atomic():
+            _import_batch(batch, result, categories, default_author, status)
+    if result.created and status == 'approved':
+        invalidate_home_cache()
+    return result
+
+
+def field_errors(instance, fields):
+    """Описание ошибок в полях ``fields`` (обязательность, max_length, тип) или ``None``.
+
+    bulk_create не вызывает валидацию модели, а ошибка базы откатила бы всю пачку.
+    """
+    try:
+        instance.clean_fields(exclude=[field.name for field in instance._meta.fields if field.name not in fields])
+    except ValidationError as exc:
+        return '; '.join(f'{name}: {" ".join(messages)}' for name, messages in exc.message_dict.items())
+    return None
+
+
+def _category_errors(name):
+    if name is None:
+        return None
+    if not isinstance(name, str):
+        return 'category: ожидалась строка'
+    return field_errors(Category(name=name), ['name'])
+
+
+def _import_batch(batch, result, categories, default_author, status):
+    # Категории создаются до разбора рецептов, поэтому строки с неподходящим названием отсеиваем заранее.
+    valid = []
+    for line_number, record in batch:
+        problem = _category_errors(record.get('category'))
+        if problem:
+            result.skip(line_number, f'некорректная запись: {problem}')
+            continue
+        valid.append((line_number, record))
+    batch = valid
+
+    User = get_user_model()
+    usernames = {record.get('author') for _, record in batch if isinstance(record.get('author'), str)}
+    authors = {user.username: user for user in User.objects.filter(username__in=usernames)}
+
+    missing = {record.get('category') for _, record in batch} - set(categories) - {None}
+    if missing:
+        existing = {category.name: category for category in Category.objects.filter(name__in=missing)}
+        created = Category.objects.bulk_create(Category(name=name) for name in missing if name not in existing)
+        categories.update(existing)
+        categories.update((category.name, category) for category in created)
+
+    # Одобренные рецепты отмечаются для ближайшего инкрементального пересчёта похожих рецептов.
+    marked_at = timezone.now() if status == 'approved' else None
+    recipes, records, steps = [], [], []
+    for line_number, record in batch:
+        author = authors.get(record.get('author')) if isinstance(record.get('author'), str) else None
+        author = author or default_author
+        if author is None:
+            result.skip(line_number, f'автор «{record.get("author")}» не найден')
+            continue
+        try:
+            recipe = Recipe(
+                title=record['title'],
+                description=record['description'],
+                ingredients=record['ingredients'],
+                category=categories.get(record.get('category')),
+                author=author,
+                status=status,
+                image=record.get('image') or None,
+                favorites_changed_at=marked_at,
+            )
+            recipe_steps = [
+                Step(recipe=recipe, step_number=step.get('step_number') or number,
+                     instruction=step['instruction'], image=step.get('image') or None)
+                for number, step in enumerate(record.get('steps') or [], start=1)
+            ]
+        except (KeyError, TypeError, AttributeError) as exc:
+            result.skip(line_number, f'некорректная запись: {exc!r}')
+            continue
+        problem = field_errors(recipe, ['title', 'description', 'ingredients', 'image'])
+        for step in recipe_steps:
+            problem = problem or field_errors(step, ['step_number', 'instruction', 'image'])
+        if problem:
+            result.skip(line_number, f'некорректная запись: {problem}')
+            continue
+        recipes.append(recipe)
+        records.append(record)
+        steps.extend(recipe_steps)
+    if not recipes:
+        return
+
+    recipes = Recipe.objects.bulk_create(recipes)
+    # auto_now_add проставляет текущее время; возвращаем исходные даты публикации.
+    dated = []
+    for recipe, record in zip(recipes, records):
+        created_at = parse_datetime(record.get('created_at') or '')
+        if created_at:
+            recipe.created_at = created_at
+            dated.append(recipe)
+    if dated:
+        Recipe.objects.bulk_update(dated, ['created_at'])
+    # Шаги ссылаются на те же объекты рецептов, поэтому recipe_id уже проставлен после bulk_create.
+    Step.objects.bulk_create(steps)
+    index_recipes(recipes)
+    if status == 'approved':
+        shift_counts(Counter((recipe.category_id, None) for recipe in recipes))
+    result.created += len(recipes)
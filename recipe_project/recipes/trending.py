@@ -0,0 +1,175 @@
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.expressions import ExpressionWrapper
+from django.db.models.functions import Coalesce, Exp, Extract, Greatest
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .models import Comment, Favorite, Recipe
+
+# Событие, которое стоит за каждым счётчиком рецепта.
+COUNTER_EVENTS = {'favorite_count': 'favorite', 'comment_count': 'comment'}
+
+
+def decay_rate():
+    """Коэффициент λ экспоненциального затухания, 1/с: вклад события падает вдвое за период полураспада."""
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def decay(since, now):
+    """SQL-выражение ``exp(-λ·(now - since))`` для поля-даты ``since``."""
+    age = Extract(Value(now) - since, 'epoch')
+    return Exp(ExpressionWrapper(age * Value(-decay_rate()), output_field=FloatField()))
+
+
+def event_weight(event, delta, happened_at, now):
+    """Вклад события в оценку к моменту ``now``: вес, затухший с момента ``happened_at``."""
+    weight = settings.TRENDING_WEIGHTS[event] * delta
+    return weight * math.exp(-decay_rate() * max((now - happened_at).total_seconds(), 0))
+
+
+def score_changes(contribution, now):
+    """Поля для UPDATE рецепта: оценка приводится к ``now``, затем к ней прибавляется ``contribution``."""
+    return {
+        'trending_score': Greatest(F('trending_score') * decay(F('trending_at'), now) + contribution, 0.0),
+        'trending_at': now,
+    }
+
+
+def event_changes(event, delta, happened_at, now):
+    """Поля для UPDATE рецепта, которые добавляют (или при ``delta < 0`` убирают) вклад события.
+
+    Накопленная оценка сначала приводится к ``now``, затем прибавляется вес события, затухший с
+    момента ``happened_at``. Так удаление старого избранного вычитает ровно то, что от него осталось.
+    """
+    return score_changes(event_weight(event, delta, happened_at, now), now)
+
+
+# Журнал рецептов с непереносёнными просмотрами: номер последней записи и номер уже перенесённой.
+DIRTY_LAST_KEY = 'recipes:trending:dirty:last'
+DIRTY_FLUSHED_KEY = 'recipes:trending:dirty:flushed'
+# Запись журнала и отметка рецепта живут сутки: если запись потерялась (вытеснена из кэша или
+# появилась уже после переноса), следующий просмотр после истечения отметки снова внесёт рецепт.
+DIRTY_TIMEOUT = 24 * 3600
+
+
+def view_key(recipe_id):
+    return f'recipes:trending:views:{recipe_id}'
+
+
+def dirty_mark_key(recipe_id):
+    return f'recipes:trending:dirty:mark:{recipe_id}'
+
+
+def dirty_entry_key(number):
+    return f'recipes:trending:dirty:{number}'
+
+
+def record_view(recipe_id):
+    """Учитывает просмотр в кэше, без записи в базу; в оценку просмотры переносит ``flush_views``.
+
+    Несколько процессов делят счётчики, только если кэш общий (Redis, Memcached).
+    """
+    key = view_key(recipe_id)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+    if cache.add(dirty_mark_key(recipe_id), 1, DIRTY_TIMEOUT):
+        cache.add(DIRTY_LAST_KEY, 0, None)
+        cache.set(dirty_entry_key(cache.incr(DIRTY_LAST_KEY)), recipe_id, DIRTY_TIMEOUT)
+
+
+async def arecord_view(recipe_id):
+    key = view_key(recipe_id)
+    if not await cache.aadd(key, 1, None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            pass
+    if await cache.aadd(dirty_mark_key(recipe_id), 1, DIRTY_TIMEOUT):
+        await cache.aadd(DIRTY_LAST_KEY, 0, None)
+        await cache.aset(dirty_entry_key(await cache.aincr(DIRTY_LAST_KEY)), recipe_id, DIRTY_TIMEOUT)
+
+
+def flush_views(batch_size=500, now=None):
+    """Переносит накопленные просмотры в оценки: один UPDATE на пачку рецептов из журнала.
+
+    Читаются только рецепты, которые смотрели после прошлого переноса, а не все одобренные.
+    """
+    now = now or timezone.now()
+    weight = settings.TRENDING_WEIGHTS['view']
+    last = cache.get(DIRTY_LAST_KEY, 0)
+    flushed = 0
+    for start in range(cache.get(DIRTY_FLUSHED_KEY, 0) + 1, last + 1, batch_size):
+        entries = [dirty_entry_key(number) for number in range(start, min(start + batch_size, last + 1))]
+        recipe_ids = set(cache.get_many(entries).values())
+        # Отметки снимаются до чтения счётчиков: новый просмотр снова внесёт рецепт в журнал.
+        cache.delete_many([dirty_mark_key(recipe_id) for recipe_id in recipe_ids])
+        keys = {view_key(recipe_id): recipe_id for recipe_id in recipe_ids}
+        counts = {keys[key]: count for key, count in cache.get_many(keys).items() if count}
+        if counts:
+            added = Case(
+                *(When(pk=recipe_id, then=Value(count * weight)) for recipe_id, count in counts.items()),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+            Recipe.objects.filter(pk__in=counts, status='approved').update(
+                trending_score=F('trending_score') * decay(F('trending_at'), now) + added,
+                trending_at=now,
+            )
+            # Уменьшаем, а не удаляем: просмотры, пришедшие во время переноса, не теряются.
+            for recipe_id, count in counts.items():
+                try:
+                    cache.decr(view_key(recipe_id), count)
+                except ValueError:
+                    pass
+            flushed += sum(counts.values())
+        cache.delete_many(entries)
+        cache.set(DIRTY_FLUSHED_KEY, start + len(entries) - 1, None)
+    return flushed
+
+
+def decay_scores(now=None):
+    """Приводит все оценки к одному моменту одним UPDATE; совсем малые оценки обнуляются.
+
+    Между запусками оценки рецептов без новых событий не затухают, поэтому команду
+    ``update_trending`` нужно запускать заметно чаще, чем период полураспада.
+    """
+    now = now or timezone.now()
+    decayed = F('trending_score') * decay(F('trending_at'), now)
+    return Recipe.objects.filter(trending_score__gt=0).update(
+        trending_score=Case(
+            When(GreaterThan(decayed, settings.TRENDING_MIN_SCORE), then=decayed),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        trending_at=now,
+    )
+
+
+def _decayed_sum(model, event, now):
+    total = (
+        model.objects.filter(recipe=OuterRef('pk')).order_by().values('recipe')
+        .annotate(total=Sum(decay(F('created_at'), now))).values('total')
+    )
+    return Coalesce(Subquery(total, output_field=FloatField()), Value(0.0)) * settings.TRENDING_WEIGHTS[event]
+
+
+def rebuild_scores(now=None):
+    """Пересчитывает оценки с нуля по избранному и комментариям (накопленные просмотры не учитываются)."""
+    now = now or timezone.now()
+    Recipe.objects.exclude(status='approved').filter(trending_score__gt=0).update(trending_score=0.0, trending_at=now)
+    return Recipe.objects.filter(status='approved').update(
+        trending_score=_decayed_sum(Favorite, 'favorite', now) + _decayed_sum(Comment, 'comment', now),
+        trending_at=now,
+    )
+
+
+def trending_recipes():
+    """Одобренные рецепты по убыванию оценки; первые N читаются по индексу ``recipe_trending_idx``."""
+    return Recipe.objects.filter(status='approved').order_by('-trending_score', '-id')
@@ -1,16 +1,28 @@
+from django.conf import settings
 from django.urls import path
 from .views import home, RecipeListView, RecipeDetailView, RecipeCreateView, RecipeUpdateView, RecipeDeleteView, \
-    CommentDeleteView, favorite_toggle, FavoriteListView
+    CommentDeleteView, favorite_toggle, FavoriteListView, recipes_by_ingredients, ModerationQueueView, \
+    ModerationStatsView, recipe_export, recipe_suggest, async_home, AsyncRecipeListView, AsyncRecipeDetailView
+
+if settings.RECIPE_ASYNC_VIEWS:
+    home_view, list_view, detail_view = async_home, AsyncRecipeListView.as_view(), AsyncRecipeDetailView.as_view()
+else:
+    home_view, list_view, detail_view = home, RecipeListView.as_view(), RecipeDetailView.as_view()
 
 urlpatterns = [
-    path('', home, name='home'),
-    path('recipes/', RecipeListView.as_view(), name='recipe_list'),
-    path('<int:pk>/', RecipeDetailView.as_view(), name='recipe_detail'),
+    path('', home_view, name='home'),
+    path('recipes/', list_view, name='recipe_list'),
+    path('<int:pk>/', detail_view, name='recipe_detail'),
     path('add/', RecipeCreateView.as_view(), name='recipe_add'),
     path('<int:pk>/edit/', RecipeUpdateView.as_view(), name='recipe_edit'),
     path('<int:pk>/delete/', RecipeDeleteView.as_view(), name='recipe_delete'),
     path('comment/<int:pk>/delete/', CommentDeleteView.as_view(), name='comment_delete'),
     path('<int:recipe_id>/favorite/', favorite_toggle, name='favorite_toggle'),
     path('favorites/', FavoriteListView.as_view(), name='favorite_list'),
+    path('recipes/by-ingredients/', recipes_by_ingredients, name='recipes_by_ingredients'),
+    path('recipes/suggest/', recipe_suggest, name='recipe_suggest'),
+    path('recipes/export/', recipe_export, name='recipe_export'),
+    path('moderation/', ModerationQueueView.as_view(), name='moderation_queue'),
+    path('moderation/stats/', ModerationStatsView.as_view(), name='moderation_stats'),
 
 ]
\ No newline at end of file
@@ -1,79 +1,217 @@
+import asyncio
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from .models import Recipe, Category, Comment, Favorite
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, View
+from accounts.roles import is_moderator
+from recipe_project.db_router import use_primary
+from .models import Recipe, Comment, Favorite
 from .forms import RecipeForm, CommentForm, StepFormSet
+from .search import search_recipes
+from .ingredients import parse_ingredients, rank_by_ingredients
+from .pagination import CursorPaginationMixin
+from .moderation import claim_batch, claimed_recipes, decide_batch, queue_stats, release_claims
+from .transfer import iter_ndjson
+from .similar import similar_recipes
+from .facets import categories_with_counts
+from .suggest import suggest
+from .trending import arecord_view, record_view
+from .conditional import aresolve_user, conditional_page, version_time
+from .cache import home_cache_version, get_home_data, recipe_cache_version, recipe_commenter_ids, alist, \
+    ahome_cache_version, aget_home_data, arecipe_cache_version, arecipe_commenter_ids
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.urls import reverse_lazy, reverse
-from django.http import Http404
-from django.db.models import Count, Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.template.response import TemplateResponse
+from django.db.models import Max, Q
 from django.db import transaction
 
 
-def home(request):
-    popular_categories = Category.objects.annotate(
-        recipe_count=Count('recipe', filter=Q(recipe__status='approved'))
-    ).filter(
-        recipe_count__gt=0
-    ).order_by('-recipe_count')[:5]
+def visible_recipes(user):
+    """Рецепты, страницы которых может открыть пользователь."""
+    qs = Recipe.objects.all()
+    if user.is_authenticated:
+        return qs.filter(
+            Q(status='approved') |
+            Q(author=user) |
+            (Q(status__in=['pending', 'rejected']) & Q(moderator=user))
+        )
+    return qs.filter(status='approved')
+
+
+def home_state(request):
+    version = home_cache_version()
+    return version, version_time(version)
+
+
+def recipe_list_state(request):
+    # Максимум по индексу (status, updated_at) ловит правки, счётчики и переименования авторов (сигнал
+    # сдвигает updated_at их рецептов), версия главной — удаления, смену статуса и категории.
+    last_update = Recipe.objects.filter(status='approved').aggregate(last=Max('updated_at'))['last']
+    version = home_cache_version()
+    modified = version_time(version)
+    if last_update and last_update > modified:
+        modified = last_update
+    return f'{version}:{last_update}', modified
+
 
-    latest_recipes = Recipe.objects.filter(status='approved').order_by('-created_at')[:6]
+def recipe_detail_state(request, pk):
+    updated_at = visible_recipes(request.user).filter(pk=pk).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    version = recipe_cache_version(pk)
+    return f'{updated_at.isoformat()}:{version}', max(updated_at, version_time(version))
 
+
+@conditional_page(home_state)
+def home(request):
+    version = home_cache_version()
+    data = get_home_data(version)
     return render(request, 'home.html', {
-        'categories': popular_categories,
-        'latest_recipes': latest_recipes,
+        'categories': data['categories'],
+        'latest_recipes': data['latest_recipes'],
+        'trending_recipes': data['trending_recipes'],
+        'home_cache_version': version,
     })
 
 
-class RecipeListView(ListView):
+@conditional_page(home_state)
+async def async_home(request):
+    version = await ahome_cache_version()
+    data = await aget_home_data(version)
+    return TemplateResponse(request, 'home.html', {
+        'categories': data['categories'],
+        'latest_recipes': data['latest_recipes'],
+        'trending_recipes': data['trending_recipes'],
+        'home_cache_version': version,
+    })
+
+
+@method_decorator(conditional_page(recipe_list_state), name='get')
+class RecipeListView(CursorPaginationMixin, ListView):
     model = Recipe
     template_name = 'recipes/recipe_list.html'
     context_object_name = 'recipes'
     paginate_by = 9
+    # Сортировки для параметра ?sort=; порядок нужен и keyset-пагинации.
+    sort_orderings = {
+        'new': ('-created_at', '-id'),
+        'trending': ('-trending_score', '-id'),
+    }
+
+    def get_sort(self):
+        sort = self.request.GET.get('sort')
+        return sort if sort in self.sort_orderings else 'new'
+
+    @property
+    def cursor_ordering(self):
+        return self.sort_orderings[self.get_sort()]
 
     def get_queryset(self):
         qs = super().get_queryset()
-        qs = qs.filter(status='approved')
+        qs = qs.filter(status='approved').select_related('author').order_by(*self.cursor_ordering)
         category_id = self.request.GET.get('category')
         if category_id:
             qs = qs.filter(category_id=category_id)
         search_query = self.request.GET.get('q')
         if search_query:
-            qs = qs.filter(title__icontains=search_query)
+            qs = search_recipes(qs, search_query)
         return qs
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = categories_with_counts()
         context['selected_category'] = self.request.GET.get('category')
         context['search_query'] = self.request.GET.get('q', '')
+        context['sort'] = self.get_sort()
         return context
 
 
+@method_decorator(conditional_page(recipe_list_state), name='get')
+class AsyncRecipeListView(RecipeListView):
+    """Список рецептов для ASGI.
+
+    Асинхронный ORM выполняет запросы через ``sync_to_async`` в общем потоке, поэтому страница
+    выдачи и категории загружаются по очереди; цикл событий при этом не блокируется.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        context, categories = await asyncio.gather(
+            sync_to_async(self.get_context_data)(),
+            alist(categories_with_counts()),
+        )
+        context['categories'] = categories
+        return self.render_to_response(context)
+
+
+def recipe_fragment_keys(recipe_id, version, comment_viewer):
+    """Ключи кэшированных фрагментов ``recipe_detail.html``: основной части и комментариев."""
+    return (
+        make_template_fragment_key('recipe_body', [recipe_id, version]),
+        make_template_fragment_key('recipe_comments', [recipe_id, version, comment_viewer]),
+    )
+
+
+@method_decorator(conditional_page(recipe_detail_state), name='get')
 class RecipeDetailView(DetailView):
     model = Recipe
     template_name = 'recipes/recipe_detail.html'
     context_object_name = 'recipe'
 
     def get_queryset(self):
-        qs = super().get_queryset()
+        return visible_recipes(self.request.user).defer('search_vector').select_related('author', 'category')
+
+    def get(self, request, *args, **kwargs):
+        self.cache_state = self.get_cache_state(kwargs['pk'])
+        keys = recipe_fragment_keys(kwargs['pk'], *self.cache_state)
+        if len(cache.get_many(keys)) == len(keys):
+            response = super().get(request, *args, **kwargs)
+        else:
+            # Фрагменты хранятся без срока, поэтому страница для них читается и отрисовывается
+            # с основной базы: отстающая реплика закрепила бы под новой версией старые данные.
+            with use_primary():
+                response = super().get(request, *args, **kwargs).render()
+        if self.object.status == 'approved':
+            record_view(self.object.pk)
+        return response
+
+    def get_cache_state(self, recipe_id):
+        """Версия кэша рецепта и вариант блока комментариев для посетителя."""
+        version = recipe_cache_version(recipe_id)
+        return version, self.get_comment_viewer(recipe_id, version)
+
+    def get_comment_viewer(self, recipe_id, version):
+        """Ключ варианта блока комментариев: от него зависят только ссылки на удаление."""
         user = self.request.user
-        if user.is_authenticated:
-            is_moderator = user.is_superuser or user.groups.filter(name='Moderators').exists()
-            return qs.filter(
-                Q(status='approved') |
-                Q(author=user) |
-                (Q(status__in=['draft', 'pending', 'rejected']) & Q(author=user)) |
-                (Q(status__in=['pending', 'rejected']) & Q(moderator=user))
-            ).distinct()
-        return qs.filter(status='approved')
+        if not user.is_authenticated:
+            return 'guest'
+        if user.is_staff:
+            return 'staff'
+        if user.pk in recipe_commenter_ids(recipe_id, version):
+            return user.pk
+        return 'guest'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        recipe = self.get_object()
+        recipe = self.object
         user = self.request.user
+        version, comment_viewer = getattr(self, 'cache_state', None) or self.get_cache_state(recipe.pk)
+        context['recipe_cache_version'] = version
+        context['comment_viewer'] = comment_viewer
+        # Ленивые querysets: выполняются, только если фрагмент не найден в кэше.
+        context['steps'] = recipe.steps.all()
+        context['similar_recipes'] = similar_recipes(recipe.pk)
+        context['comments'] = recipe.comments.select_related('user').order_by('created_at', 'pk')
         if 'comment_form' not in kwargs:
             context['comment_form'] = CommentForm()
         context['is_favorite'] = False
@@ -98,6 +236,72 @@ class RecipeDetailView(DetailView):
         return self.render_to_response(context)
 
 
+@method_decorator(conditional_page(recipe_detail_state), name='get')
+class AsyncRecipeDetailView(RecipeDetailView):
+    """Страница рецепта для ASGI.
+
+    Рецепт и отметка избранного загружаются без блокировки цикла событий (запросы ORM идут по
+    очереди в общем потоке ``sync_to_async``); шаги, похожие рецепты и комментарии загружаются,
+    только если их фрагментов нет в кэше, и тогда всё читается с основной базы. Отправка
+    комментария выполняется синхронным представлением в потоке.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        pk = kwargs['pk']
+        user = await aresolve_user(request)
+        version = await arecipe_cache_version(pk)
+        comment_viewer = await self.aget_comment_viewer(pk, version)
+        body_key, comments_key = recipe_fragment_keys(pk, version, comment_viewer)
+        cached = await cache.aget_many([body_key, comments_key])
+        fragments = {'steps': body_key, 'similar_recipes': body_key, 'comments': comments_key}
+        missing = [name for name, key in fragments.items() if key not in cached]
+
+        with use_primary() if missing else nullcontext():
+            recipe, is_favorite = await asyncio.gather(
+                self.get_queryset().filter(pk=pk).afirst(),
+                self.ais_favorite(user, pk),
+            )
+            if recipe is None:
+                raise Http404('Рецепт не найден.')
+            self.object = recipe
+            sections = {
+                'steps': recipe.steps.all(),
+                'similar_recipes': similar_recipes(pk),
+                'comments': recipe.comments.select_related('user').order_by('created_at', 'pk'),
+            }
+            loaded = await asyncio.gather(*(alist(sections[name]) for name in missing))
+        sections.update(zip(missing, loaded))
+
+        context = super(RecipeDetailView, self).get_context_data(
+            recipe_cache_version=version,
+            comment_viewer=comment_viewer,
+            comment_form=CommentForm(),
+            is_favorite=is_favorite,
+            **sections,
+        )
+        if recipe.status == 'approved':
+            await arecord_view(pk)
+        return self.render_to_response(context)
+
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(RecipeDetailView.as_view())(request, *args, **kwargs)
+
+    async def ais_favorite(self, user, recipe_id):
+        if not user.is_authenticated:
+            return False
+        return await Favorite.objects.filter(user=user, recipe_id=recipe_id).aexists()
+
+    async def aget_comment_viewer(self, recipe_id, version):
+        user = self.request.user
+        if not user.is_authenticated:
+            return 'guest'
+        if user.is_staff:
+            return 'staff'
+        if user.pk in await arecipe_commenter_ids(recipe_id, version):
+            return user.pk
+        return 'guest'
+
+
 @method_decorator(login_required, name='dispatch')
 class RecipeCreateView(CreateView):
     model = Recipe
@@ -123,14 +327,7 @@ class RecipeCreateView(CreateView):
             messages.info(self.request, "Ваш рецепт отправлен на проверку. Вы увидите его после одобрения модератором.")
             if step_formset.is_valid():
                 step_formset.instance = self.object
-                steps = step_formset.save(commit=False)
-                for i, step in enumerate(steps):
-                    if not step.pk or step.pk and step_formset.forms[i] not in step_formset.deleted_forms:
-                        step.step_number = i + 1
-                        step.save()
-                for step_form in step_formset.deleted_forms:
-                    if step_form.instance.pk:
-                        step_form.instance.delete()
+                step_formset.save_steps()
                 return redirect(self.get_success_url())
             else:
                 return self.form_invalid(form)
@@ -169,14 +366,7 @@ class RecipeUpdateView(UpdateView):
             self.object = form.save()
             if step_formset.is_valid():
                 step_formset.instance = self.object
-                steps = step_formset.save(commit=False)
-                for i, step in enumerate(steps):
-                    if not step.pk or step.pk and step_formset.forms[i] not in step_formset.deleted_forms:
-                        step.step_number = i + 1
-                        step.save()
-                for step_form in step_formset.deleted_forms:
-                    if step_form.instance.pk:
-                        step_form.instance.delete()
+                step_formset.save_steps()
                 return redirect(self.get_success_url())
             else:
                 return self.form_invalid(form)
@@ -223,11 +413,40 @@ def favorite_toggle(request, recipe_id):
     return redirect('recipe_detail', pk=recipe_id)
 
 
-class FavoriteListView(LoginRequiredMixin, ListView):
+def recipes_by_ingredients(request):
+    names = parse_ingredients(','.join(request.GET.getlist('ingredients')))
+    try:
+        limit = min(int(request.GET.get('limit', 20)), 50)
+    except ValueError:
+        limit = 20
+    results = []
+    if names:
+        recipes = rank_by_ingredients(Recipe.objects.filter(status='approved'), names)[:limit]
+        results = [
+            {
+                'id': recipe.pk,
+                'title': recipe.title,
+                'url': reverse('recipe_detail', kwargs={'pk': recipe.pk}),
+                'matched_ingredients': recipe.matched_ingredients,
+            }
+            for recipe in recipes.only('id', 'title')
+        ]
+    return JsonResponse({'ingredients': sorted(names), 'results': results})
+
+
+def recipe_suggest(request):
+    response = JsonResponse(suggest(request.GET.get('q', '')))
+    # Повторные нажатия тех же клавиш браузер обслужит сам.
+    patch_cache_control(response, max_age=settings.SUGGEST_CACHE_SECONDS)
+    return response
+
+
+class FavoriteListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Favorite
     template_name = 'recipes/favorite_list.html'
     context_object_name = 'favorites'
     paginate_by = 9
+    cursor_ordering = ('-id',)
 
     def get_queryset(self):
         user = self.request.user
@@ -235,15 +454,62 @@ class FavoriteListView(LoginRequiredMixin, ListView):
         queryset = queryset.filter(recipe__status='approved')
         search_query = self.request.GET.get('q')
         category_id = self.request.GET.get('category')
-        if search_query:
-            queryset = queryset.filter(recipe__title__icontains=search_query)
         if category_id:
             queryset = queryset.filter(recipe__category_id=category_id)
+        if search_query:
+            return search_recipes(queryset, search_query, prefix='recipe__')
         return queryset.order_by('-id')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = categories_with_counts(self.request.user)
         context['selected_category'] = self.request.GET.get('category', '')
         context['search_query'] = self.request.GET.get('q', '')
         return context
+
+
+@staff_member_required
+def recipe_export(request):
+    response = StreamingHttpResponse(iter_ndjson(), content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="recipes.ndjson"'
+    return response
+
+
+class ModeratorRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
+    def test_func(self):
+        return is_moderator(self.request.user)
+
+
+class ModerationQueueView(ModeratorRequiredMixin, ListView):
+    template_name = 'recipes/moderation_queue.html'
+    context_object_name = 'recipes'
+
+    def get_queryset(self):
+        return claimed_recipes(self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['stats'] = queue_stats()
+        return context
+
+    def post(self, request, *args, **kwargs):
+        action = request.POST.get('action')
+        if action == 'claim':
+            claimed = claim_batch(request.user).count()
+            messages.info(request, f"В работе рецептов: {claimed}.")
+        elif action == 'release':
+            released = release_claims(request.user)
+            messages.info(request, f"Освобождено рецептов: {released}.")
+        elif action in ('approve', 'reject'):
+            recipe_ids = [pk for pk in request.POST.getlist('recipe') if pk.isdigit()]
+            updated = decide_batch(request.user, recipe_ids, action, request.POST.get('moderator_comment', '').strip())
+            if action == 'approve':
+                messages.success(request, f"{updated} рецептов успешно одобрено.")
+            else:
+                messages.warning(request, f"{updated} рецептов успешно отклонено.")
+        return redirect('moderation_queue')
+
+
+class ModerationStatsView(ModeratorRequiredMixin, View):
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(queue_stats())
@@ -0,0 +1,53 @@
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[data-suggest-url]').forEach(input => {
+        const list = document.createElement('ul');
+        list.className = 'search-suggestions';
+        list.hidden = true;
+        input.parentNode.style.position = 'relative';
+        input.insertAdjacentElement('afterend', list);
+
+        let timer = null;
+        let controller = null;
+
+        function render(data) {
+            list.innerHTML = '';
+            const items = data.categories.map(category => ({
+                url: category.url, text: `${category.name} (${category.recipe_count})`, kind: 'category',
+            })).concat(data.recipes.map(recipe => ({url: recipe.url, text: recipe.title, kind: 'recipe'})));
+            items.forEach(item => {
+                const li = document.createElement('li');
+                const link = document.createElement('a');
+                link.href = item.url;
+                link.textContent = item.text;
+                link.className = `suggestion-${item.kind}`;
+                li.appendChild(link);
+                list.appendChild(li);
+            });
+            list.hidden = items.length === 0;
+        }
+
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (query.length < 2) {
+                list.hidden = true;
+                return;
+            }
+            timer = setTimeout(() => {
+                if (controller) controller.abort();
+                controller = new AbortController();
+                fetch(`${input.dataset.suggestUrl}?q=${encodeURIComponent(query)}`, {signal: controller.signal})
+                    .then(response => response.json())
+                    .then(render)
+                    .catch(() => {});
+            }, 150);
+        });
+
+        input.addEventListener('keydown', event => {
+            if (event.key === 'Escape') list.hidden = true;
+        });
+        document.addEventListener('click', event => {
+            if (!list.contains(event.target) && event.target !== input) list.hidden = true;
+        });
+    });
+});